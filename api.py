@@ -0,0 +1,370 @@
+"""Local JSON API over the expense service, for scripts and other tools.
+
+Every endpoint works on one group, picked with ?group=<name> (the default
+group otherwise). Amounts are integer minor units, such as paise. The write
+endpoints take whole batches, which the writer thread commits together, so
+one request can add thousands of expenses. Run from the repository root:
+
+    python api.py --port 8600
+
+    GET  /groups                      every group
+    GET  /persons                     everyone in the group
+    POST /persons                     {"names": [...]}
+    GET  /expenses                    one page, newest first; ?limit, ?after_date & ?after_id, filters
+    POST /expenses                    {"expenses": [{description, amount, date, paid_by, splits, ...}]}
+    POST /expenses/delete             {"ids": [...]}
+    GET  /balances                    every balance, or at the end of ?as_of
+    GET  /settlements                 the settlement plan; ?mode picks the algorithm
+"""
+import argparse
+import json
+import sqlite3
+from datetime import datetime
+from contextlib import ExitStack
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import currencies
+import settlement
+from groups import CATALOG_FILE, DEFAULT_GROUP, GroupCatalog
+from service import ExpenseService
+from splits import split_minor
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8600
+
+# Largest request body accepted, and most items in one batch
+MAX_BODY_BYTES = 16 * 1024 * 1024
+MAX_BATCH = 10000
+
+# Rows per page of GET /expenses, by default and at most
+EXPENSES_PAGE_SIZE = 50
+MAX_EXPENSES_PAGE_SIZE = 1000
+
+# Largest amount, share, id or integer parameter; SQLite stores 64-bit integers
+MAX_INTEGER = 2 ** 63 - 1
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        """An error answered with `status` and a JSON body holding `message`."""
+        super().__init__(message)
+        self.status = status
+
+
+class ApiService(ExpenseService):
+    def report_error(self, message):
+        """Fail the request instead of answering with an empty result."""
+        raise ApiError(500, message)
+
+
+def error_result(error):
+    """Turn the exception a batch item failed with into its JSON result."""
+    return {"error": str(error)}
+
+
+def parse_expense(item, person_names, category_names, rates):
+    """Validate one expense of a POST /expenses batch and return add_expense's arguments.
+
+    `splits` is either {person id: share} or a list of person ids to split
+    the amount between equally. Raises ValueError if anything is off.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("expected an object")
+    description = item.get("description")
+    if not isinstance(description, str) or not description.strip():
+        raise ValueError("missing description")
+    amount = item.get("amount")
+    if not isinstance(amount, int) or isinstance(amount, bool) or amount <= 0:
+        raise ValueError("amount must be a positive integer of minor units")
+    if amount > MAX_INTEGER:
+        raise ValueError(f"amount must be at most {MAX_INTEGER}")
+    date = datetime.strptime(str(item.get("date")), "%Y-%m-%d").strftime("%Y-%m-%d")
+    paid_by = item.get("paid_by")
+    if paid_by not in person_names:
+        raise ValueError(f"unknown person {paid_by}")
+    category_id = item.get("category_id")
+    if category_id is not None and category_id not in category_names:
+        raise ValueError(f"unknown category {category_id}")
+    currency = item.get("currency", currencies.BASE_CURRENCY)
+    if currency not in rates:
+        raise ValueError(f"no exchange rate for {currency}")
+
+    value = item.get("splits")
+    if isinstance(value, list):
+        if not value:
+            raise ValueError("no one to split with")
+        shares = {}
+        for person_id, share in zip(value, split_minor(amount, count=len(value)).tolist()):
+            shares[person_id] = shares.get(person_id, 0) + share
+    elif isinstance(value, dict):
+        # JSON object keys are always strings
+        shares = {int(person_id): share for person_id, share in value.items()}
+        if any(not isinstance(share, int) or isinstance(share, bool) or share < 0 for share in shares.values()):
+            raise ValueError("shares must be non-negative integers of minor units")
+        if any(share > MAX_INTEGER for share in shares.values()):
+            raise ValueError(f"shares must be at most {MAX_INTEGER}")
+        if sum(shares.values()) != amount:
+            raise ValueError("split amounts do not add up to the expense amount")
+    else:
+        raise ValueError("splits must be an object of shares or a list of person ids")
+    for person_id in shares:
+        if person_id not in person_names:
+            raise ValueError(f"unknown person {person_id}")
+    return description.strip(), amount, date, paid_by, category_id, shares, currency
+
+
+class ExpenseApiHandler(BaseHTTPRequestHandler):
+    # Keep connections open between requests; every response has a Content-Length
+    protocol_version = "HTTP/1.1"
+
+    ROUTES = {
+        ("GET", "/groups"): "list_groups",
+        ("GET", "/persons"): "list_persons",
+        ("POST", "/persons"): "add_persons",
+        ("GET", "/expenses"): "list_expenses",
+        ("POST", "/expenses"): "add_expenses",
+        ("POST", "/expenses/delete"): "delete_expenses",
+        ("GET", "/balances"): "balances",
+        ("GET", "/settlements"): "settlements",
+    }
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def dispatch(self, method):
+        """Route a request to its endpoint and write the JSON response."""
+        url = urlparse(self.path)
+        self.query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            endpoint = self.ROUTES.get((method, url.path.rstrip("/") or "/"))
+            if endpoint is None:
+                raise ApiError(404, f"no endpoint {method} {url.path}")
+            # Shards used by the request stay open until it is answered
+            with ExitStack() as self.leases:
+                status, body = 200, getattr(self, endpoint)()
+        except ApiError as e:
+            status, body = e.status, {"error": str(e)}
+        except ValueError as e:
+            # Raised by the service for requests it cannot answer, such as a date in archived history
+            status, body = 400, {"error": str(e)}
+        except sqlite3.Error as e:
+            status, body = 500, {"error": f"Database error: {e}"}
+        except Exception as e:
+            # Every request gets a JSON answer, even for a bug
+            self.log_error("%s %s failed: %r", method, url.path, e)
+            status, body = 500, {"error": f"Internal error: {e}"}
+
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        """Log requests only with --verbose; at thousands of requests a second the log is the bottleneck."""
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def read_json(self):
+        """Read the request body as a JSON object."""
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            # The body is left unread, so the connection cannot be reused
+            self.close_connection = True
+            raise ApiError(413, f"request body is over {MAX_BODY_BYTES} bytes")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            raise ApiError(400, f"invalid JSON: {e}")
+        if not isinstance(body, dict):
+            raise ApiError(400, "expected a JSON object")
+        return body
+
+    def read_batch(self, key):
+        """Read the list under `key` of the request body, checking its size."""
+        items = self.read_json().get(key)
+        if not isinstance(items, list):
+            raise ApiError(400, f"expected a list under '{key}'")
+        if len(items) > MAX_BATCH:
+            raise ApiError(413, f"at most {MAX_BATCH} items per request")
+        return items
+
+    def int_param(self, name, default=None):
+        """Read an integer query parameter."""
+        value = self.query.get(name)
+        if value is None:
+            return default
+        try:
+            number = int(value)
+        except ValueError:
+            raise ApiError(400, f"{name} must be an integer")
+        if abs(number) > MAX_INTEGER:
+            raise ApiError(400, f"{name} must be between {-MAX_INTEGER} and {MAX_INTEGER}")
+        return number
+
+    def date_param(self, name):
+        """Read a YYYY-MM-DD query parameter."""
+        value = self.query.get(name)
+        if value is None:
+            return None
+        try:
+            return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+        except ValueError:
+            raise ApiError(400, f"{name} must be a date as YYYY-MM-DD")
+
+    def service(self):
+        """Return the service of the group named by ?group, the default group if there is none."""
+        catalog = self.server.catalog
+        name = self.query.get("group", DEFAULT_GROUP)
+        group_id = catalog.group_id(name)
+        if group_id is None:
+            raise ApiError(404, f"no group called '{name}'")
+        return ApiService(self.leases.enter_context(catalog.lease(group_id)))
+
+    def list_groups(self):
+        return {"groups": [{"id": group_id, "name": name} for group_id, name in self.server.catalog.list_groups()]}
+
+    def list_persons(self):
+        return {"persons": [{"id": person_id, "name": name} for person_id, name in self.service().get_all_persons()]}
+
+    def add_persons(self):
+        names = self.read_batch("names")
+        service = self.service()
+        results = [None] * len(names)
+        valid = []
+        for i, name in enumerate(names):
+            if isinstance(name, str) and name.strip():
+                valid.append((i, name.strip()))
+            else:
+                results[i] = error_result("missing name")
+        for (i, _), result in zip(valid, service.add_persons([name for _, name in valid])):
+            if isinstance(result, sqlite3.IntegrityError):
+                results[i] = error_result("a person with that name already exists")
+            elif isinstance(result, Exception):
+                results[i] = error_result(result)
+            else:
+                results[i] = {"id": result}
+        return {"results": results}
+
+    def list_expenses(self):
+        limit = self.int_param("limit", EXPENSES_PAGE_SIZE)
+        if limit < 1:
+            raise ApiError(400, "limit must be at least 1")
+        limit = min(limit, MAX_EXPENSES_PAGE_SIZE)
+        after = None
+        if "after_date" in self.query:
+            after = (self.date_param("after_date"), self.int_param("after_id", 0))
+        # One extra row tells whether there is a next page
+        rows = self.service().get_expenses(
+            person_id=self.int_param("person_id"),
+            category_id=self.int_param("category_id"),
+            date_from=self.date_param("date_from"),
+            date_to=self.date_param("date_to"),
+            after=after,
+            limit=limit + 1,
+            search=self.query.get("search"),
+        )
+        page = rows[:limit]
+        columns = ["id", "description", "amount", "date", "paid_by", "category", "currency"]
+        return {
+            "expenses": [dict(zip(columns, row)) for row in page],
+            "next": {"after_date": page[-1][3], "after_id": page[-1][0]} if len(rows) > limit else None,
+        }
+
+    def add_expenses(self):
+        items = self.read_batch("expenses")
+        service = self.service()
+        person_names = service.person_names()
+        category_names = service.category_names()
+        rates = service.db.rates()
+
+        results = [None] * len(items)
+        valid = []
+        for i, item in enumerate(items):
+            try:
+                valid.append((i, parse_expense(item, person_names, category_names, rates)))
+            except (ValueError, TypeError) as e:
+                results[i] = error_result(e)
+        for (i, _), result in zip(valid, service.add_expenses([expense for _, expense in valid])):
+            results[i] = error_result(result) if isinstance(result, Exception) else {"id": result}
+        return {"results": results}
+
+    def delete_expenses(self):
+        expense_ids = self.read_batch("ids")
+        if not all(isinstance(expense_id, int) for expense_id in expense_ids):
+            raise ApiError(400, "ids must be integers")
+        if any(abs(expense_id) > MAX_INTEGER for expense_id in expense_ids):
+            raise ApiError(400, f"ids must be between {-MAX_INTEGER} and {MAX_INTEGER}")
+        results = self.service().delete_expenses(expense_ids)
+        return {
+            "results": [
+                error_result(result) if isinstance(result, Exception) else {"deleted": result}
+                for result in results
+            ]
+        }
+
+    def balances(self):
+        balances = self.service().calculate_balances(self.date_param("as_of"))
+        return {
+            "currency": currencies.BASE_CURRENCY,
+            "balances": [
+                {"id": person_id, "name": data["name"], "balance": data["balance"]}
+                for person_id, data in balances.items()
+            ],
+        }
+
+    def settlements(self):
+        mode = self.query.get("mode", settlement.AUTO)
+        if mode not in settlement.SETTLEMENT_MODES:
+            raise ApiError(400, f"mode must be one of {', '.join(settlement.SETTLEMENT_MODES)}")
+        service = self.service()
+        try:
+            transactions = service.calculate_settlements(service.calculate_balances(), mode)
+        except ValueError as e:
+            raise ApiError(400, str(e))
+        return {
+            "currency": currencies.BASE_CURRENCY,
+            "settlements": [
+                {"from": debtor, "to": creditor, "amount": amount} for debtor, creditor, amount in transactions
+            ],
+        }
+
+
+class ExpenseApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, catalog, verbose=False):
+        """Serve the API for every group in `catalog` on `address`, one thread per connection."""
+        super().__init__(address, ExpenseApiHandler)
+        self.catalog = catalog
+        self.verbose = verbose
+
+
+def main(argv=None):
+    """Serve the JSON API until interrupted."""
+    parser = argparse.ArgumentParser(description="Expense Splitter JSON API")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on")
+    parser.add_argument("--catalog", default=CATALOG_FILE, help="path to the group catalog database")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    catalog = GroupCatalog(args.catalog)
+    server = ExpenseApiServer((args.host, args.port), catalog, verbose=args.verbose)
+    print(f"Serving the Expense Splitter API on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
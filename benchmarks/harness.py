@@ -0,0 +1,215 @@
+"""Headless performance benchmark of the core app operations.
+
+Generates synthetic datasets in a temporary database and times the data
+operations of ExpenseService without starting Streamlit. Run from the
+repository root:
+
+    python -m benchmarks.harness --sizes 1000 10000 100000 --out bench.json
+    python -m benchmarks.harness --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import tempfile
+import time
+from datetime import date, timedelta
+
+from database import Database
+from service import ExpenseService
+from splits import split_minor
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# Inserts per transaction while generating a dataset
+GENERATE_BATCH = 5000
+
+
+def generate_dataset(db, persons, expenses, fanout, rng):
+    """Fill an empty database with `persons` people and `expenses` expenses split `fanout` ways."""
+    cursor = db.conn.cursor()
+    cursor.executemany('INSERT INTO person (name) VALUES (?)', [(f"Friend {i}",) for i in range(1, persons + 1)])
+    cursor.execute('SELECT id FROM category')
+    category_ids = [row[0] for row in cursor.fetchall()]
+    db.conn.commit()
+
+    person_ids = list(range(1, persons + 1))
+    first_day = date(2020, 1, 1)
+    fanout = min(fanout, persons)
+    for start in range(0, expenses, GENERATE_BATCH):
+        rows = []
+        splits = []
+        for expense_id in range(start + 1, min(start + GENERATE_BATCH, expenses) + 1):
+            # Amounts are in paise, so the payer is owed the amount itself
+            amount = rng.randint(100, 500000)
+            involved = rng.sample(person_ids, fanout)
+            day = first_day + timedelta(days=rng.randint(0, 5 * 365))
+            rows.append((expense_id, f"Expense {expense_id}", amount, amount, day.isoformat(), involved[0],
+                         rng.choice(category_ids)))
+            splits.extend(zip([expense_id] * fanout, involved, split_minor(amount, count=fanout).tolist()))
+        cursor.executemany('''
+            INSERT INTO expense (id, description, amount, base_amount, date, paid_by, category_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        cursor.executemany('INSERT INTO expense_split (expense_id, person_id, share_amount) VALUES (?, ?, ?)', splits)
+        db.conn.commit()
+
+    db.rebuild_balances()
+    db.rebuild_spending_rollup()
+    db.rebuild_pair_debts()
+
+
+def summarize(op, timings, **extra):
+    """Turn a list of durations in seconds into a result record in milliseconds."""
+    timings = sorted(timings)
+    return dict(
+        extra,
+        op=op,
+        runs=len(timings),
+        mean_ms=sum(timings) / len(timings) * 1000,
+        p50_ms=timings[len(timings) // 2] * 1000,
+        p95_ms=timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+        max_ms=timings[-1] * 1000,
+    )
+
+
+def timed(func, *args, **kwargs):
+    """Call func and return (result, seconds)."""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def benchmark_size(persons, expenses, fanout, writes, reads, rng):
+    """Generate one dataset and time every operation on it."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+        app = ExpenseService(db)
+        try:
+            _, generate_seconds = timed(generate_dataset, db, persons, expenses, fanout, rng)
+            labels = {"persons": persons, "expenses": expenses, "fanout": fanout}
+            results = []
+
+            # Writes
+            person_ids = list(range(1, persons + 1))
+            timings = []
+            for _ in range(writes):
+                involved = rng.sample(person_ids, min(fanout, persons))
+                amount = rng.randint(100, 500000)
+                splits = dict(zip(involved, split_minor(amount, count=len(involved)).tolist()))
+                _, seconds = timed(app.add_expense, "Benchmark", amount, "2025-01-01", involved[0], 1, splits)
+                timings.append(seconds)
+            results.append(summarize("add_expense", timings, **labels))
+
+            # Reads; the read cache is emptied first so every run hits the database
+            def time_read(op, func, *args):
+                timings = []
+                for _ in range(reads):
+                    db.bump_data_version()
+                    result, seconds = timed(func, *args)
+                    timings.append(seconds)
+                results.append(summarize(op, timings, **labels))
+                return result
+
+            time_read("get_all_expenses", app.get_all_expenses)
+            time_read("get_expenses_page", app.get_expenses)
+            balances = time_read("calculate_balances", app.calculate_balances)
+
+            timings = []
+            for _ in range(reads):
+                _, seconds = timed(app.calculate_settlements, balances)
+                timings.append(seconds)
+            results.append(summarize("calculate_settlements", timings, **labels))
+
+            # Delete the expenses added above
+            cursor = db.conn.cursor()
+            cursor.execute('SELECT id FROM expense WHERE description = ?', ("Benchmark",))
+            timings = []
+            for (expense_id,) in cursor.fetchall():
+                _, seconds = timed(app.delete_expense, expense_id)
+                timings.append(seconds)
+            results.append(summarize("delete_expense", timings, **labels))
+
+            for result in results:
+                result["generate_seconds"] = generate_seconds
+            return results
+        finally:
+            db.close()
+
+
+def git_commit():
+    """Return the current git commit, if there is one."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_report, new_report):
+    """Print the mean time of every operation in both reports and their ratio."""
+    def key(result):
+        return (result["persons"], result["expenses"], result["fanout"], result["op"])
+
+    old = {key(result): result for result in old_report["results"]}
+    print(f"{'expenses':>9} {'op':>22} {'old ms':>10} {'new ms':>10} {'ratio':>7}")
+    for result in new_report["results"]:
+        before = old.get(key(result))
+        if before is None:
+            continue
+        ratio = result["mean_ms"] / before["mean_ms"] if before["mean_ms"] else float("inf")
+        print(
+            f"{result['expenses']:>9} {result['op']:>22} {before['mean_ms']:>10.3f} "
+            f"{result['mean_ms']:>10.3f} {ratio:>6.2f}x"
+        )
+
+
+def main(argv=None):
+    """Run the benchmark, print a table and optionally save or compare the results."""
+    parser = argparse.ArgumentParser(description="Benchmark the Expense Splitter data operations")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="expense counts to test")
+    parser.add_argument("--persons", type=int, default=50, help="people in each dataset")
+    parser.add_argument("--fanout", type=int, default=4, help="people each expense is split between")
+    parser.add_argument("--writes", type=int, default=100, help="expenses added and deleted per size")
+    parser.add_argument("--reads", type=int, default=20, help="runs of each read operation per size")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for the synthetic data")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare against the results in this JSON file")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    results = []
+    for size in args.sizes:
+        results.extend(benchmark_size(args.persons, size, args.fanout, args.writes, args.reads, rng))
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "params": vars(args),
+        "results": results,
+    }
+
+    print(f"{'expenses':>9} {'op':>22} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10}")
+    for result in results:
+        print(
+            f"{result['expenses']:>9} {result['op']:>22} {result['mean_ms']:>10.3f} "
+            f"{result['p50_ms']:>10.3f} {result['p95_ms']:>10.3f}"
+        )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print()
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
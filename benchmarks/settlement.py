@@ -0,0 +1,92 @@
+"""Benchmark the settlement algorithms on random balance vectors.
+
+Run from the repository root:
+
+    python -m benchmarks.settlement --sizes 8 12 15 100 1000 5000
+"""
+import argparse
+import json
+import random
+import time
+
+import settlement
+
+DEFAULT_SIZES = [4, 8, 12, 15, 50, 200, 1000, 5000]
+
+
+def random_balances(size, rng):
+    """Return id -> paise balances for `size` people that sum to zero.
+
+    Amounts are drawn from round figures, like real bills, so zero-sum
+    subgroups show up the way they do in practice.
+    """
+    balances = {person_id: 0 for person_id in range(1, size + 1)}
+    for _ in range(size * 2):
+        payer, friend = rng.sample(range(1, size + 1), 2)
+        amount = rng.choice([50, 100, 150, 200, 250, 500, 1000]) * 100
+        balances[payer] += amount
+        balances[friend] -= amount
+    return balances
+
+
+def check_transfers(balances, transfers):
+    """Raise if the transfers do not bring every balance to zero."""
+    remaining = dict(balances)
+    for debtor_id, creditor_id, amount in transfers:
+        remaining[debtor_id] += amount
+        remaining[creditor_id] -= amount
+    if any(remaining.values()):
+        raise AssertionError("transfers do not settle every balance")
+
+
+def run(sizes, repeat, seed):
+    """Time every algorithm on every size and return one result dict per run."""
+    rng = random.Random(seed)
+    results = []
+    for size in sizes:
+        balances = random_balances(size, rng)
+        people_with_balance = sum(1 for balance in balances.values() if balance)
+        for mode, algorithm in settlement.SETTLEMENT_ALGORITHMS.items():
+            if mode == settlement.EXACT and people_with_balance > settlement.EXACT_MAX_PEOPLE:
+                continue
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                transfers = algorithm(balances)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            check_transfers(balances, transfers)
+            results.append({
+                "size": size,
+                "people_with_balance": people_with_balance,
+                "algorithm": mode,
+                "transfers": len(transfers),
+                "seconds": best,
+            })
+    return results
+
+
+def main(argv=None):
+    """Print a table of transfer counts and runtimes, optionally saving them as JSON."""
+    parser = argparse.ArgumentParser(description="Benchmark the settlement algorithms")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="group sizes to test")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the fastest is kept")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for the balance vectors")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat, args.seed)
+    print(f"{'size':>6} {'with balance':>12} {'algorithm':>10} {'transfers':>9} {'ms':>10}")
+    for result in results:
+        print(
+            f"{result['size']:>6} {result['people_with_balance']:>12} {result['algorithm']:>10} "
+            f"{result['transfers']:>9} {result['seconds'] * 1000:>10.3f}"
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Cold start benchmark of the Streamlit app.
+
+Every run starts a fresh interpreter on an empty database and measures how
+long `import app` takes, and how long the first script run takes to render
+the default page. Pass --baseline to measure a git revision the same way
+and compare. Run from the repository root:
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --baseline HEAD~1 --out startup.json
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+# Each snippet runs in a fresh interpreter and prints the seconds it measured
+IMPORT_SNIPPET = '''
+import time
+started = time.perf_counter()
+import app
+print(time.perf_counter() - started)
+'''
+
+RENDER_SNIPPET = '''
+import time
+from streamlit.testing.v1 import AppTest
+started = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=60).run()
+seconds = time.perf_counter() - started
+if at.exception:
+    raise SystemExit(at.exception[0].message)
+print(seconds)
+'''
+
+
+def prepare_tree(dest, revision=None):
+    """Copy the working tree, or a git revision, into `dest` without any database files."""
+    if revision is None:
+        files = subprocess.run(
+            ["git", "ls-files", "--cached", "--others", "--exclude-standard"],
+            capture_output=True, text=True, check=True,
+        ).stdout.splitlines()
+        for path in files:
+            if os.path.isfile(path):
+                os.makedirs(os.path.join(dest, os.path.dirname(path)), exist_ok=True)
+                shutil.copy2(path, os.path.join(dest, path))
+    else:
+        archive = subprocess.run(["git", "archive", "--format=tar", revision], capture_output=True, check=True).stdout
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            tar.extractall(dest)
+    remove_databases(dest)
+
+
+def remove_databases(tree):
+    """Delete the SQLite database and its WAL files so the next run starts empty."""
+    for name in os.listdir(tree):
+        if ".db" in name:
+            os.remove(os.path.join(tree, name))
+
+
+def run_snippet(tree, snippet):
+    """Run a snippet in a fresh interpreter inside `tree` and return the seconds it printed."""
+    result = subprocess.run(
+        [sys.executable, "-c", snippet], cwd=tree, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"benchmark run failed in {tree}:\n{result.stderr}")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure(tree, runs):
+    """Return median import and first render times of a tree in milliseconds."""
+    # One untimed run first, so both trees are measured with compiled bytecode on disk
+    run_snippet(tree, RENDER_SNIPPET)
+
+    imports = []
+    renders = []
+    for _ in range(runs):
+        remove_databases(tree)
+        imports.append(run_snippet(tree, IMPORT_SNIPPET))
+        remove_databases(tree)
+        renders.append(run_snippet(tree, RENDER_SNIPPET))
+    return {
+        "import_ms": statistics.median(imports) * 1000,
+        "first_render_ms": statistics.median(renders) * 1000,
+        "import_min_ms": min(imports) * 1000,
+        "first_render_min_ms": min(renders) * 1000,
+    }
+
+
+def main(argv=None):
+    """Measure the working tree, and optionally a baseline revision, and print a table."""
+    parser = argparse.ArgumentParser(description="Benchmark the Expense Splitter cold start")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters started per measurement")
+    parser.add_argument("--baseline", help="git revision to measure for comparison, e.g. HEAD~1")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    trees = [("baseline", args.baseline), ("current", None)] if args.baseline else [("current", None)]
+    report = {"python": sys.version.split()[0], "params": vars(args), "results": {}}
+    for label, revision in trees:
+        with tempfile.TemporaryDirectory() as tmp:
+            prepare_tree(tmp, revision)
+            report["results"][label] = measure(tmp, args.runs)
+
+    print(f"{'tree':>9} {'import ms':>10} {'first render ms':>16}")
+    for label, result in report["results"].items():
+        print(f"{label:>9} {result['import_ms']:>10.1f} {result['first_render_ms']:>16.1f}")
+    if args.baseline:
+        before = report["results"]["baseline"]
+        after = report["results"]["current"]
+        print(
+            f"{'ratio':>9} {after['import_ms'] / before['import_ms']:>9.2f}x "
+            f"{after['first_render_ms'] / before['first_render_ms']:>15.2f}x"
+        )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
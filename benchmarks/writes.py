@@ -0,0 +1,116 @@
+"""Concurrent write benchmark: per-operation commits against the writer queue.
+
+Several threads, standing in for Streamlit sessions, add expenses at the
+same time. In "direct" mode each thread commits every expense on its own
+connection, as the app used to. In "queue" mode every expense goes through
+the writer thread, which group-commits them. Run from the repository root:
+
+    python -m benchmarks.writes --threads 8 --ops 200
+    python -m benchmarks.writes --synchronous FULL
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+import database
+from database import Database
+from service import ExpenseService
+
+PERSONS = 50
+
+
+def write_direct(app, rng, ops, latencies, errors):
+    """Add expenses one transaction and commit at a time on this thread's own connection."""
+    conn = app.db.conn
+    for _ in range(ops):
+        involved = rng.sample(range(1, PERSONS + 1), 4)
+        splits = {person_id: 2500 for person_id in involved}
+        started = time.perf_counter()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            app._insert_expense(conn.cursor(), "Benchmark", 10000, "2025-01-01", involved[0], 1, splits)
+            conn.commit()
+        except sqlite3.OperationalError:
+            conn.rollback()
+            errors.append(1)
+        latencies.append(time.perf_counter() - started)
+
+
+def write_queued(app, rng, ops, latencies, errors):
+    """Add expenses through the writer queue, waiting for each to commit like the UI does."""
+    for _ in range(ops):
+        involved = rng.sample(range(1, PERSONS + 1), 4)
+        splits = {person_id: 2500 for person_id in involved}
+        started = time.perf_counter()
+        try:
+            app.add_expense("Benchmark", 10000, "2025-01-01", involved[0], 1, splits, wait=False).result()
+        except sqlite3.OperationalError:
+            errors.append(1)
+        latencies.append(time.perf_counter() - started)
+
+
+def run(mode, threads, ops, seed):
+    """Run one mode on a fresh database and return its throughput, latencies and error count."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+        app = ExpenseService(db)
+        try:
+            db.conn.executemany('INSERT INTO person (name) VALUES (?)', [(f"Friend {i}",) for i in range(1, PERSONS + 1)])
+            db.conn.commit()
+
+            target = write_direct if mode == "direct" else write_queued
+            latencies = []
+            errors = []
+            workers = [
+                threading.Thread(target=target, args=(app, random.Random(seed + i), ops, latencies, errors))
+                for i in range(threads)
+            ]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            seconds = time.perf_counter() - started
+
+            latencies.sort()
+            return {
+                "mode": mode,
+                "writes_per_sec": len(latencies) / seconds,
+                "p50_ms": latencies[len(latencies) // 2] * 1000,
+                "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+                "errors": len(errors),
+                "drifts": len(db.verify_balances()),
+            }
+        finally:
+            db.close()
+
+
+def main(argv=None):
+    """Run both modes and print a table."""
+    parser = argparse.ArgumentParser(description="Benchmark concurrent Expense Splitter writes")
+    parser.add_argument("--threads", type=int, default=8, help="concurrent writers")
+    parser.add_argument("--ops", type=int, default=200, help="expenses added by each writer")
+    parser.add_argument("--synchronous", default="NORMAL", choices=["OFF", "NORMAL", "FULL"],
+                        help="PRAGMA synchronous for every connection, FULL syncs on every commit")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    args = parser.parse_args(argv)
+
+    database.CONNECTION_PRAGMAS = [
+        pragma for pragma in database.CONNECTION_PRAGMAS if not pragma.startswith('PRAGMA synchronous')
+    ] + [f'PRAGMA synchronous = {args.synchronous}']
+
+    print(f"{'mode':>7} {'writes/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7} {'drifts':>7}")
+    for mode in ("direct", "queue"):
+        result = run(mode, args.threads, args.ops, args.seed)
+        print(
+            f"{result['mode']:>7} {result['writes_per_sec']:>10.0f} {result['p50_ms']:>8.2f} "
+            f"{result['p95_ms']:>8.2f} {result['errors']:>7} {result['drifts']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import csv
+import os
+
+# Currency every balance, rollup and settlement plan is kept in
+BASE_CURRENCY = "INR"
+
+# Local exchange rates: a CSV of currency,rate rows, rate being units of BASE_CURRENCY per unit
+RATES_FILE = "exchange_rates.csv"
+
+# Digits of each currency's minor unit; any currency not listed has 2
+MINOR_DIGITS = {"JPY": 0, "KRW": 0, "VND": 0, "BHD": 3, "KWD": 3, "OMR": 3}
+
+SYMBOLS = {"INR": "₹", "USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥"}
+
+# Rates are stored as integers: base minor units per RATE_SCALE minor units of the currency.
+# With integer rates the conversion rounds the same way in Python and in SQL.
+RATE_SCALE = 1_000_000
+
+# Rates already read, by path, with the file modification time they were read at
+_rates_cache = {}
+
+
+def minor_digits(currency):
+    """Return how many digits a currency's minor unit has."""
+    return MINOR_DIGITS.get(currency, 2)
+
+
+def to_minor(amount, currency=BASE_CURRENCY):
+    """Convert an amount in major units, such as rupees, to integer minor units, such as paise."""
+    return int(round(amount * 10 ** minor_digits(currency)))
+
+
+def from_minor(minor, currency=BASE_CURRENCY):
+    """Convert integer minor units back to major units, for display and charts only."""
+    return minor / 10 ** minor_digits(currency)
+
+
+def format_amount(minor, currency=BASE_CURRENCY):
+    """Format minor units for display, e.g. ₹1,234.50 or 12.00 CHF."""
+    digits = minor_digits(currency)
+    text = f"{abs(minor) / 10 ** digits:,.{digits}f}"
+    sign = "-" if minor < 0 else ""
+    if currency in SYMBOLS:
+        return f"{sign}{SYMBOLS[currency]}{text}"
+    return f"{sign}{text} {currency}"
+
+
+def scaled_rate(rate, currency):
+    """Turn base units per unit of `currency` into the integer rate stored in the database."""
+    shift = minor_digits(BASE_CURRENCY) - minor_digits(currency)
+    return int(round(rate * 10 ** shift * RATE_SCALE))
+
+
+def convert(minor, rate):
+    """Convert minor units with an integer rate, rounding halves away from zero like the SQL views do."""
+    if minor < 0:
+        return -convert(-minor, rate)
+    return (minor * rate + RATE_SCALE // 2) // RATE_SCALE
+
+
+def convert_shares(shares, rate):
+    """Convert person_id -> minor units with an integer rate, one share at a time."""
+    return {person_id: convert(share, rate) for person_id, share in shares.items()}
+
+
+def load_rates(path=RATES_FILE):
+    """Return currency -> integer rate from a rates file, re-reading it only after it changes.
+
+    The base currency is always present. A missing file means no other currency.
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {BASE_CURRENCY: RATE_SCALE}
+    cached = _rates_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    rates = {BASE_CURRENCY: RATE_SCALE}
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for line_number, row in enumerate(csv.DictReader(f), start=2):
+            code = (row.get("currency") or "").strip().upper()
+            try:
+                rate = float(row.get("rate") or 0)
+            except ValueError:
+                rate = 0
+            if len(code) != 3 or rate <= 0:
+                raise ValueError(f"{path}, line {line_number}: expected a currency code and a positive rate")
+            if code != BASE_CURRENCY:
+                rates[code] = scaled_rate(rate, code)
+    _rates_cache[path] = (mtime, rates)
+    return rates
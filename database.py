@@ -0,0 +1,1545 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+import currencies
+import recurring
+
+from instrumentation import InstrumentedConnection
+from writer import WriteQueue
+
+# Per-connection settings: WAL-friendly durability, a 64 MB page cache and 256 MB of memory-mapped I/O
+CONNECTION_PRAGMAS = [
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -65536',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA temp_store = MEMORY',
+]
+
+# Most query results kept in the read cache between writes
+READ_CACHE_SIZE = 256
+
+# Days between automatic balance checkpoints
+CHECKPOINT_INTERVAL_DAYS = 30
+
+# Balance change of every person from rows dated in (?, ?]; the pair of dates repeats for each part.
+# Amounts come from the views that convert to base-currency minor units. The payer is owed the
+# expense's base_amount, which for new expenses is the sum of the converted shares, so their
+# changes add up to exactly zero.
+BALANCE_CHANGES_SQL = '''
+    SELECT person_id, SUM(delta)
+    FROM (
+        SELECT paid_by AS person_id, base_amount AS delta FROM expense WHERE date > ? AND date <= ?
+        UNION ALL
+        SELECT person_id, -amount AS delta FROM expense_share_base WHERE date > ? AND date <= ?
+        UNION ALL
+        SELECT payer_id AS person_id, amount AS delta FROM settlement_base WHERE date > ? AND date <= ?
+        UNION ALL
+        SELECT payee_id AS person_id, -amount AS delta FROM settlement_base WHERE date > ? AND date <= ?
+    )
+    GROUP BY person_id
+'''
+
+# Change of what each person owes each other person from rows dated in (?, ?], in both
+# directions; the pair of dates repeats for each part. Nobody owes themselves.
+PAIR_DEBT_CHANGES_SQL = '''
+    SELECT person_id, other_id, SUM(amount)
+    FROM (
+        SELECT person_id, paid_by AS other_id, amount
+        FROM expense_share_base
+        WHERE date > ? AND date <= ? AND person_id != paid_by
+        UNION ALL
+        SELECT paid_by AS person_id, person_id AS other_id, -amount
+        FROM expense_share_base
+        WHERE date > ? AND date <= ? AND person_id != paid_by
+        UNION ALL
+        SELECT payer_id AS person_id, payee_id AS other_id, -amount FROM settlement_base WHERE date > ? AND date <= ?
+        UNION ALL
+        SELECT payee_id AS person_id, payer_id AS other_id, amount FROM settlement_base WHERE date > ? AND date <= ?
+    )
+    WHERE person_id != other_id
+    GROUP BY person_id, other_id
+'''
+
+
+def _rebuild_table(cursor, table, create_sql, copy_sql):
+    """Replace a table with a new definition, copying its rows with `copy_sql` and keeping its
+    indexes, triggers and AUTOINCREMENT sequence.
+
+    `create_sql` creates {table}_new; `copy_sql` selects the new columns from {table}.
+    """
+    cursor.execute('''
+        SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    ''', (table,))
+    extras = [row[0] for row in cursor.fetchall()]
+    cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,))
+    sequence = cursor.fetchone()
+
+    cursor.execute(create_sql)
+    cursor.execute(f'INSERT INTO {table}_new {copy_sql}')
+    cursor.execute(f'DROP TABLE {table}')
+    cursor.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    for sql in extras:
+        cursor.execute(sql)
+    if sequence:
+        # Ids of deleted rows are never handed out again
+        cursor.execute('UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = ?', (sequence[0], table))
+
+
+class Database:
+    def __init__(self, db_file="expense_splitter.db", instrumentation=None, rates_file=currencies.RATES_FILE):
+        """Set up the connection manager, bring the schema up to date once and load the exchange rates."""
+        self.db_file = db_file
+        # Optional Instrumentation that records every query on every connection
+        self.instrumentation = instrumentation
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Connection in use by each live thread, and connections freed by finished threads
+        self._owners = {}
+        self._idle = []
+        
+        # Reads cached per data version; every write bumps the version and empties the cache
+        self.data_version = 0
+        self._read_cache = OrderedDict()
+        # Connection that only polls PRAGMA data_version, which changes when any other
+        # connection commits, so writes from other processes empty the cache too
+        self._watch = None
+        self._file_version = None
+        
+        # Started on the first queued write
+        self._writer = None
+        
+        # Lets archiving give pages back to the file system; only takes effect on a new, empty file
+        self.conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        # WAL lets readers keep reading while another connection writes; it is stored in the file
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.create_tables()
+        self.sync_rates(currencies.load_rates(rates_file))
+    
+    @property
+    def conn(self):
+        """Return the calling thread's connection, taking one from the pool on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.connect()
+        return conn
+    
+    def connect(self):
+        """Give the calling thread a connection, reusing one left behind by a finished thread."""
+        with self._lock:
+            for thread, conn in list(self._owners.items()):
+                if not thread.is_alive():
+                    del self._owners[thread]
+                    self._idle.append(conn)
+            
+            if self._idle:
+                conn = self._idle.pop()
+                # Drop anything the previous owner left uncommitted
+                conn.rollback()
+            else:
+                # Connections move between threads, but only one thread uses each at a time
+                if self.instrumentation:
+                    conn = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False, factory=InstrumentedConnection)
+                    self.instrumentation.attach(conn)
+                else:
+                    conn = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False)
+                for pragma in CONNECTION_PRAGMAS:
+                    conn.execute(pragma)
+            self._owners[threading.current_thread()] = conn
+        
+        self._local.conn = conn
+        return conn
+        
+    def create_tables(self):
+        """Bring the schema up to date by running every migration newer than PRAGMA user_version."""
+        cursor = self.conn.cursor()
+        cursor.execute('PRAGMA user_version')
+        version = cursor.fetchone()[0]
+
+        for number, migration in enumerate(self.MIGRATIONS, start=1):
+            if number <= version:
+                continue
+            # Each migration and its version bump commit together or not at all
+            cursor.execute('BEGIN')
+            try:
+                migration(self, cursor)
+                cursor.execute(f'PRAGMA user_version = {number}')
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()
+                raise
+
+    def schema_version(self):
+        """Return the number of the latest migration applied to the database."""
+        cursor = self.conn.cursor()
+        cursor.execute('PRAGMA user_version')
+        return cursor.fetchone()[0]
+
+    def _migrate_base_schema(self, cursor):
+        """Migration 1: person, category, expense and expense_split tables."""
+        # Create Person table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS person (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE
+            )
+        ''')
+        
+        # Create Category table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS category (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE
+            )
+        ''')
+        
+        # Create Expense table with category
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS expense (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                description TEXT NOT NULL,
+                amount REAL NOT NULL,
+                date TEXT NOT NULL,
+                paid_by INTEGER NOT NULL,
+                category_id INTEGER,
+                FOREIGN KEY (paid_by) REFERENCES person(id),
+                FOREIGN KEY (category_id) REFERENCES category(id)
+            )
+        ''')
+        
+        # Create ExpenseSplit table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS expense_split (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                expense_id INTEGER NOT NULL,
+                person_id INTEGER NOT NULL,
+                share_amount REAL NOT NULL,
+                FOREIGN KEY (expense_id) REFERENCES expense(id) ON DELETE CASCADE,
+                FOREIGN KEY (person_id) REFERENCES person(id)
+            )
+        ''')
+        
+        # Insert default categories if not exists
+        default_categories = ["Food", "Shopping", "Beauty", "Travel", "Entertainment", "Other"]
+        for category in default_categories:
+            cursor.execute('INSERT OR IGNORE INTO category (name) VALUES (?)', (category,))
+        
+        # Check if the category_id column exists in the expense table
+        cursor.execute("PRAGMA table_info(expense)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        # If migrating from an older version without category_id, ensure all tables match the schema
+        if "category_id" not in columns:
+            # Backup existing data
+            cursor.execute("ALTER TABLE expense RENAME TO expense_old")
+            
+            # Create new table with correct schema
+            cursor.execute('''
+                CREATE TABLE expense (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    description TEXT NOT NULL,
+                    amount REAL NOT NULL,
+                    date TEXT NOT NULL,
+                    paid_by INTEGER NOT NULL,
+                    category_id INTEGER,
+                    FOREIGN KEY (paid_by) REFERENCES person(id),
+                    FOREIGN KEY (category_id) REFERENCES category(id)
+                )
+            ''')
+            
+            # Migrate data (using default category 6 for "Other")
+            cursor.execute('''
+                INSERT INTO expense (id, description, amount, date, paid_by, category_id)
+                SELECT id, description, amount, date, paid_by, 6 FROM expense_old
+            ''')
+            
+            # Drop old table
+            cursor.execute("DROP TABLE expense_old")
+
+    def _migrate_balance_ledger(self, cursor):
+        """Migration 2: person_balance ledger, populated from the existing history."""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS person_balance (
+                person_id INTEGER PRIMARY KEY,
+                balance REAL NOT NULL DEFAULT 0,
+                FOREIGN KEY (person_id) REFERENCES person(id)
+            )
+        ''')
+        cursor.execute('DELETE FROM person_balance')
+        # Written against the schema of this migration, not compute_balances_from_history
+        cursor.execute('''
+            INSERT INTO person_balance (person_id, balance)
+            SELECT person_id, SUM(delta)
+            FROM (
+                SELECT paid_by AS person_id, amount AS delta FROM expense
+                UNION ALL
+                SELECT person_id, -share_amount AS delta FROM expense_split
+            )
+            GROUP BY person_id
+        ''')
+
+    def _migrate_indexes(self, cursor):
+        """Migration 3: secondary indexes for split lookups, per-person sums and date ordering."""
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_expense_split_expense ON expense_split(expense_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_expense_split_person ON expense_split(person_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_expense_paid_by ON expense(paid_by)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_expense_date ON expense(date)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_expense_category ON expense(category_id)')
+
+    def _migrate_keyset_indexes(self, cursor):
+        """Migration 4: (filter, date) indexes so filtered expense pages are read in order from an index."""
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_expense_paid_by_date ON expense(paid_by, date)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_expense_category_date ON expense(category_id, date)')
+        # Both are prefixes of the new indexes
+        cursor.execute('DROP INDEX IF EXISTS idx_expense_paid_by')
+        cursor.execute('DROP INDEX IF EXISTS idx_expense_category')
+
+    def _migrate_settlements(self, cursor):
+        """Migration 5: append-only settlement payments and checkpointed balance snapshots."""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS settlement (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payer_id INTEGER NOT NULL,
+                payee_id INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                date TEXT NOT NULL,
+                FOREIGN KEY (payer_id) REFERENCES person(id),
+                FOREIGN KEY (payee_id) REFERENCES person(id)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_settlement_date ON settlement(date)')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS balance_checkpoint (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                as_of TEXT NOT NULL UNIQUE
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS balance_checkpoint_entry (
+                checkpoint_id INTEGER NOT NULL,
+                person_id INTEGER NOT NULL,
+                balance REAL NOT NULL,
+                PRIMARY KEY (checkpoint_id, person_id),
+                FOREIGN KEY (checkpoint_id) REFERENCES balance_checkpoint(id) ON DELETE CASCADE,
+                FOREIGN KEY (person_id) REFERENCES person(id)
+            ) WITHOUT ROWID
+        ''')
+
+    def _migrate_expense_search(self, cursor):
+        """Migration 6: FTS5 index over expense descriptions, kept in sync by triggers."""
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS expense_fts USING fts5(
+                description,
+                content='expense',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3'
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS expense_fts_insert AFTER INSERT ON expense BEGIN
+                INSERT INTO expense_fts (rowid, description) VALUES (new.id, new.description);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS expense_fts_delete AFTER DELETE ON expense BEGIN
+                INSERT INTO expense_fts (expense_fts, rowid, description) VALUES ('delete', old.id, old.description);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS expense_fts_update AFTER UPDATE OF description ON expense BEGIN
+                INSERT INTO expense_fts (expense_fts, rowid, description) VALUES ('delete', old.id, old.description);
+                INSERT INTO expense_fts (rowid, description) VALUES (new.id, new.description);
+            END
+        ''')
+        # Index the descriptions that already exist
+        cursor.execute("INSERT INTO expense_fts (expense_fts) VALUES ('rebuild')")
+
+    def _migrate_archive(self, cursor):
+        """Migration 7: opening balances carried forward from history moved to an archive database."""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS opening_balance (
+                person_id INTEGER PRIMARY KEY,
+                balance REAL NOT NULL,
+                FOREIGN KEY (person_id) REFERENCES person(id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS archive_run (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                archived_through TEXT NOT NULL,
+                archive_file TEXT NOT NULL,
+                expenses INTEGER NOT NULL,
+                settlements INTEGER NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        ''')
+
+    def _migrate_spending_rollup(self, cursor):
+        """Migration 8: spending totals per month, category and payer, populated from the existing history."""
+        # Uncategorized expenses roll up under category 0, since a primary key can't hold NULL here
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS spending_rollup (
+                month TEXT NOT NULL,
+                category_id INTEGER NOT NULL,
+                paid_by INTEGER NOT NULL,
+                total REAL NOT NULL,
+                expenses INTEGER NOT NULL,
+                PRIMARY KEY (month, category_id, paid_by)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            INSERT INTO spending_rollup (month, category_id, paid_by, total, expenses)
+            SELECT substr(date, 1, 7), COALESCE(category_id, 0), paid_by, SUM(amount), COUNT(*)
+            FROM expense
+            GROUP BY 1, 2, 3
+        ''')
+
+    def _migrate_pair_debts(self, cursor):
+        """Migration 9: what each person owes each other person, populated from the existing history.
+
+        History archived before this migration only survives in the per-person opening balances.
+        """
+        # Every pair is stored in both directions so either person's debts are a primary key range
+        for table in ("pair_debt", "opening_pair_debt"):
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    person_id INTEGER NOT NULL,
+                    other_id INTEGER NOT NULL,
+                    amount REAL NOT NULL,
+                    PRIMARY KEY (person_id, other_id),
+                    FOREIGN KEY (person_id) REFERENCES person(id),
+                    FOREIGN KEY (other_id) REFERENCES person(id)
+                ) WITHOUT ROWID
+            ''')
+        cursor.execute('''
+            INSERT INTO pair_debt (person_id, other_id, amount)
+            SELECT person_id, other_id, SUM(amount)
+            FROM (
+                SELECT s.person_id, e.paid_by AS other_id, s.share_amount AS amount
+                FROM expense e JOIN expense_split s ON s.expense_id = e.id
+                UNION ALL
+                SELECT e.paid_by, s.person_id, -s.share_amount
+                FROM expense e JOIN expense_split s ON s.expense_id = e.id
+                UNION ALL
+                SELECT payer_id, payee_id, -amount FROM settlement
+                UNION ALL
+                SELECT payee_id, payer_id, amount FROM settlement
+            )
+            WHERE person_id != other_id
+            GROUP BY person_id, other_id
+        ''')
+
+    def _migrate_recurring(self, cursor):
+        """Migration 10: recurring expense templates and the occurrences stored as real expenses."""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recurring_expense (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                description TEXT NOT NULL,
+                amount REAL NOT NULL,
+                paid_by INTEGER NOT NULL,
+                category_id INTEGER,
+                cadence TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                end_date TEXT,
+                FOREIGN KEY (paid_by) REFERENCES person(id),
+                FOREIGN KEY (category_id) REFERENCES category(id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recurring_split (
+                recurring_id INTEGER NOT NULL,
+                person_id INTEGER NOT NULL,
+                share_amount REAL NOT NULL,
+                PRIMARY KEY (recurring_id, person_id),
+                FOREIGN KEY (recurring_id) REFERENCES recurring_expense(id),
+                FOREIGN KEY (person_id) REFERENCES person(id)
+            ) WITHOUT ROWID
+        ''')
+        # Only occurrences that were edited, archived or skipped get a row; a NULL expense_id means skipped
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recurring_occurrence (
+                recurring_id INTEGER NOT NULL,
+                occurrence INTEGER NOT NULL,
+                expense_id INTEGER,
+                PRIMARY KEY (recurring_id, occurrence),
+                FOREIGN KEY (recurring_id) REFERENCES recurring_expense(id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_recurring_occurrence_expense ON recurring_occurrence(expense_id)')
+
+    def _migrate_minor_units(self, cursor):
+        """Migration 11: integer minor-unit amounts with a currency code, and exchange rates to convert them in SQL.
+
+        Every existing amount is in rupees. Balances, pair debts and rollups
+        become integer paise, the base currency's minor unit. Each expense,
+        settlement and recurring expense keeps the rate it was written at.
+        Expenses and recurring expenses also keep base_amount, what the payer is
+        owed in paise, so an expense whose shares never added up to its amount
+        affects balances and rollups exactly as before.
+        """
+        # Rates new rows are written at: base minor units per 1,000,000 minor units of the currency
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS currency_rate (
+                currency TEXT PRIMARY KEY,
+                rate INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO currency_rate (currency, rate) VALUES ('INR', 1000000)")
+
+        # REAL columns turn integers back into floats, so each table is rebuilt with INTEGER columns
+        _rebuild_table(cursor, 'expense', '''
+            CREATE TABLE expense_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                description TEXT NOT NULL,
+                amount INTEGER NOT NULL,
+                currency TEXT NOT NULL DEFAULT 'INR',
+                rate INTEGER NOT NULL DEFAULT 1000000,
+                base_amount INTEGER NOT NULL,
+                date TEXT NOT NULL,
+                paid_by INTEGER NOT NULL,
+                category_id INTEGER,
+                FOREIGN KEY (paid_by) REFERENCES person(id),
+                FOREIGN KEY (category_id) REFERENCES category(id)
+            )
+        ''', '''
+            SELECT id, description, CAST(round(amount * 100) AS INTEGER), 'INR', 1000000,
+                   CAST(round(amount * 100) AS INTEGER), date, paid_by, category_id
+            FROM expense
+        ''')
+        _rebuild_table(cursor, 'expense_split', '''
+            CREATE TABLE expense_split_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                expense_id INTEGER NOT NULL,
+                person_id INTEGER NOT NULL,
+                share_amount INTEGER NOT NULL,
+                FOREIGN KEY (expense_id) REFERENCES expense(id) ON DELETE CASCADE,
+                FOREIGN KEY (person_id) REFERENCES person(id)
+            )
+        ''', 'SELECT id, expense_id, person_id, CAST(round(share_amount * 100) AS INTEGER) FROM expense_split')
+        _rebuild_table(cursor, 'settlement', '''
+            CREATE TABLE settlement_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payer_id INTEGER NOT NULL,
+                payee_id INTEGER NOT NULL,
+                amount INTEGER NOT NULL,
+                currency TEXT NOT NULL DEFAULT 'INR',
+                rate INTEGER NOT NULL DEFAULT 1000000,
+                date TEXT NOT NULL,
+                FOREIGN KEY (payer_id) REFERENCES person(id),
+                FOREIGN KEY (payee_id) REFERENCES person(id)
+            )
+        ''', "SELECT id, payer_id, payee_id, CAST(round(amount * 100) AS INTEGER), 'INR', 1000000, date FROM settlement")
+        _rebuild_table(cursor, 'recurring_expense', '''
+            CREATE TABLE recurring_expense_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                description TEXT NOT NULL,
+                amount INTEGER NOT NULL,
+                currency TEXT NOT NULL DEFAULT 'INR',
+                rate INTEGER NOT NULL DEFAULT 1000000,
+                base_amount INTEGER NOT NULL,
+                paid_by INTEGER NOT NULL,
+                category_id INTEGER,
+                cadence TEXT NOT NULL,
+                start_date TEXT NOT NULL,
+                end_date TEXT,
+                FOREIGN KEY (paid_by) REFERENCES person(id),
+                FOREIGN KEY (category_id) REFERENCES category(id)
+            )
+        ''', '''
+            SELECT id, description, CAST(round(amount * 100) AS INTEGER), 'INR', 1000000,
+                   CAST(round(amount * 100) AS INTEGER), paid_by, category_id, cadence, start_date, end_date
+            FROM recurring_expense
+        ''')
+        _rebuild_table(cursor, 'recurring_split', '''
+            CREATE TABLE recurring_split_new (
+                recurring_id INTEGER NOT NULL,
+                person_id INTEGER NOT NULL,
+                share_amount INTEGER NOT NULL,
+                PRIMARY KEY (recurring_id, person_id),
+                FOREIGN KEY (recurring_id) REFERENCES recurring_expense(id),
+                FOREIGN KEY (person_id) REFERENCES person(id)
+            ) WITHOUT ROWID
+        ''', 'SELECT recurring_id, person_id, CAST(round(share_amount * 100) AS INTEGER) FROM recurring_split')
+
+        # Shares rounded one by one can miss the rounded total by a paisa or two; the first share absorbs that.
+        # Larger differences are left alone: base_amount keeps what the payer was owed either way.
+        cursor.execute('''
+            SELECT MIN(s.id), e.amount - SUM(s.share_amount)
+            FROM expense e
+            JOIN expense_split s ON s.expense_id = e.id
+            GROUP BY e.id
+            HAVING SUM(s.share_amount) != e.amount AND abs(e.amount - SUM(s.share_amount)) <= COUNT(*)
+        ''')
+        cursor.executemany(
+            'UPDATE expense_split SET share_amount = share_amount + ? WHERE id = ?',
+            [(residual, split_id) for split_id, residual in cursor.fetchall()],
+        )
+
+        # Shares and payments converted to base minor units at each row's own rate, rounding halves up
+        cursor.execute('''
+            CREATE VIEW IF NOT EXISTS expense_share_base AS
+            SELECT e.id AS expense_id, e.date, e.paid_by, e.category_id, s.person_id,
+                   (s.share_amount * e.rate + 500000) / 1000000 AS amount
+            FROM expense e
+            JOIN expense_split s ON s.expense_id = e.id
+        ''')
+        cursor.execute('''
+            CREATE VIEW IF NOT EXISTS settlement_base AS
+            SELECT id, date, payer_id, payee_id, (amount * rate + 500000) / 1000000 AS amount
+            FROM settlement
+        ''')
+
+        # Derived tables: archived amounts are converted, the rest is recomputed from the converted history
+        _rebuild_table(cursor, 'opening_balance', '''
+            CREATE TABLE opening_balance_new (
+                person_id INTEGER PRIMARY KEY,
+                balance INTEGER NOT NULL,
+                FOREIGN KEY (person_id) REFERENCES person(id)
+            )
+        ''', 'SELECT person_id, CAST(round(balance * 100) AS INTEGER) FROM opening_balance')
+        _rebuild_table(cursor, 'opening_pair_debt', '''
+            CREATE TABLE opening_pair_debt_new (
+                person_id INTEGER NOT NULL,
+                other_id INTEGER NOT NULL,
+                amount INTEGER NOT NULL,
+                PRIMARY KEY (person_id, other_id),
+                FOREIGN KEY (person_id) REFERENCES person(id),
+                FOREIGN KEY (other_id) REFERENCES person(id)
+            ) WITHOUT ROWID
+        ''', 'SELECT person_id, other_id, CAST(round(amount * 100) AS INTEGER) FROM opening_pair_debt')
+        _rebuild_table(cursor, 'spending_rollup', '''
+            CREATE TABLE spending_rollup_new (
+                month TEXT NOT NULL,
+                category_id INTEGER NOT NULL,
+                paid_by INTEGER NOT NULL,
+                total INTEGER NOT NULL,
+                expenses INTEGER NOT NULL,
+                PRIMARY KEY (month, category_id, paid_by)
+            ) WITHOUT ROWID
+        ''', '''
+            SELECT month, category_id, paid_by, CAST(round(total * 100) AS INTEGER), expenses FROM spending_rollup
+        ''')
+        # Checkpoints are only a cache, so they are dropped rather than converted
+        cursor.execute('DELETE FROM balance_checkpoint_entry')
+        cursor.execute('DELETE FROM balance_checkpoint')
+        _rebuild_table(cursor, 'balance_checkpoint_entry', '''
+            CREATE TABLE balance_checkpoint_entry_new (
+                checkpoint_id INTEGER NOT NULL,
+                person_id INTEGER NOT NULL,
+                balance INTEGER NOT NULL,
+                PRIMARY KEY (checkpoint_id, person_id),
+                FOREIGN KEY (checkpoint_id) REFERENCES balance_checkpoint(id) ON DELETE CASCADE,
+                FOREIGN KEY (person_id) REFERENCES person(id)
+            ) WITHOUT ROWID
+        ''', 'SELECT checkpoint_id, person_id, balance FROM balance_checkpoint_entry')
+        _rebuild_table(cursor, 'person_balance', '''
+            CREATE TABLE person_balance_new (
+                person_id INTEGER PRIMARY KEY,
+                balance INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (person_id) REFERENCES person(id)
+            )
+        ''', '''
+            SELECT person_id, SUM(delta)
+            FROM (
+                SELECT paid_by AS person_id, base_amount AS delta FROM expense
+                UNION ALL
+                SELECT person_id, -amount FROM expense_share_base
+                UNION ALL
+                SELECT payer_id, amount FROM settlement_base
+                UNION ALL
+                SELECT payee_id, -amount FROM settlement_base
+                UNION ALL
+                SELECT person_id, balance FROM opening_balance
+            )
+            GROUP BY person_id
+        ''')
+        _rebuild_table(cursor, 'pair_debt', '''
+            CREATE TABLE pair_debt_new (
+                person_id INTEGER NOT NULL,
+                other_id INTEGER NOT NULL,
+                amount INTEGER NOT NULL,
+                PRIMARY KEY (person_id, other_id),
+                FOREIGN KEY (person_id) REFERENCES person(id),
+                FOREIGN KEY (other_id) REFERENCES person(id)
+            ) WITHOUT ROWID
+        ''', '''
+            SELECT person_id, other_id, SUM(amount)
+            FROM (
+                SELECT person_id, paid_by AS other_id, amount FROM expense_share_base
+                UNION ALL
+                SELECT paid_by, person_id, -amount FROM expense_share_base
+                UNION ALL
+                SELECT payer_id, payee_id, -amount FROM settlement_base
+                UNION ALL
+                SELECT payee_id, payer_id, amount FROM settlement_base
+                UNION ALL
+                SELECT person_id, other_id, amount FROM opening_pair_debt
+            )
+            WHERE person_id != other_id
+            GROUP BY person_id, other_id
+        ''')
+
+    # Applied in order; the position in this list is the schema version. Only ever append.
+    MIGRATIONS = (
+        _migrate_base_schema,
+        _migrate_balance_ledger,
+        _migrate_indexes,
+        _migrate_keyset_indexes,
+        _migrate_settlements,
+        _migrate_expense_search,
+        _migrate_archive,
+        _migrate_spending_rollup,
+        _migrate_pair_debts,
+        _migrate_recurring,
+        _migrate_minor_units,
+    )
+
+    # Queries issued by the app, with the tables each one is allowed to scan in full
+    QUERY_PLAN_CHECKS = {
+        "get_all_persons": ('SELECT id, name FROM person ORDER BY name', (), ()),
+        "get_all_expenses": ('''
+            SELECT e.id, e.description, e.amount, e.date, p.name, c.name, e.currency
+            FROM expense e
+            JOIN person p ON e.paid_by = p.id
+            LEFT JOIN category c ON e.category_id = c.id
+            ORDER BY e.date DESC
+        ''', (), ()),
+        "get_expenses_page": ('''
+            SELECT e.id, e.description, e.amount, e.date, p.name, c.name, e.currency
+            FROM expense e
+            JOIN person p ON e.paid_by = p.id
+            LEFT JOIN category c ON e.category_id = c.id
+            WHERE (e.date, e.id) < (?, ?)
+            ORDER BY e.date DESC, e.id DESC
+            LIMIT ?
+        ''', ("2024-01-01", 1, 50), ()),
+        "get_expenses_by_person": ('''
+            SELECT e.id, e.description, e.amount, e.date, p.name, c.name, e.currency
+            FROM expense e
+            JOIN person p ON e.paid_by = p.id
+            LEFT JOIN category c ON e.category_id = c.id
+            WHERE e.paid_by = ? AND (e.date, e.id) < (?, ?)
+            ORDER BY e.date DESC, e.id DESC
+            LIMIT ?
+        ''', (1, "2024-01-01", 1, 50), ()),
+        "get_expenses_by_category": ('''
+            SELECT e.id, e.description, e.amount, e.date, p.name, c.name, e.currency
+            FROM expense e
+            JOIN person p ON e.paid_by = p.id
+            LEFT JOIN category c ON e.category_id = c.id
+            WHERE e.category_id = ? AND e.date >= ? AND e.date <= ?
+            ORDER BY e.date DESC, e.id DESC
+            LIMIT ?
+        ''', (1, "2024-01-01", "2024-12-31", 50), ()),
+        "search_expenses_by_date": ('''
+            SELECT e.id, e.description, e.amount, e.date, p.name, c.name, e.currency
+            FROM expense e
+            JOIN person p ON e.paid_by = p.id
+            LEFT JOIN category c ON e.category_id = c.id
+            WHERE e.id IN (SELECT rowid FROM expense_fts WHERE expense_fts MATCH ?)
+            ORDER BY e.date DESC, e.id DESC
+            LIMIT ?
+        ''', ('"pizza"*', 50), ()),
+        "search_expenses_ranked": ('''
+            SELECT e.id, e.description, e.amount, e.date, p.name, c.name, e.currency
+            FROM expense_fts f
+            JOIN expense e ON e.id = f.rowid
+            JOIN person p ON e.paid_by = p.id
+            LEFT JOIN category c ON e.category_id = c.id
+            WHERE expense_fts MATCH ?
+            ORDER BY f.rank
+            LIMIT ?
+        ''', ('"pizza"*', 50), ()),
+        "calculate_balances": ('''
+            SELECT p.id, p.name, COALESCE(b.balance, 0)
+            FROM person p
+            LEFT JOIN person_balance b ON b.person_id = p.id
+        ''', (), ("p",)),
+        "delete_expense_splits": ('SELECT person_id, share_amount FROM expense_split WHERE expense_id = ?', (1,), ()),
+        "delete_expense": ('DELETE FROM expense_split WHERE expense_id = ?', (1,), ()),
+        "balances_since_checkpoint": (BALANCE_CHANGES_SQL, ("2024-01-01", "2024-12-31") * 4, ()),
+        "latest_checkpoint": ('SELECT id, as_of FROM balance_checkpoint WHERE as_of <= ? ORDER BY as_of DESC LIMIT 1', ("2024-12-31",), ()),
+        "archive_expense_splits": ('''
+            DELETE FROM expense_split
+            WHERE expense_id IN (SELECT id FROM expense WHERE date <= ?)
+        ''', ("2024-12-31",), ()),
+        "archive_settlements": ('DELETE FROM settlement WHERE date <= ?', ("2024-12-31",), ()),
+        "spending_rollup": ('''
+            SELECT r.month, COALESCE(c.name, 'Uncategorized'), p.name, r.total, r.expenses
+            FROM spending_rollup r
+            JOIN person p ON p.id = r.paid_by
+            LEFT JOIN category c ON c.id = r.category_id
+            WHERE r.month >= ? AND r.month <= ?
+            ORDER BY r.month
+        ''', ("2024-01", "2024-12"), ()),
+        "pair_debts": ('SELECT other_id, amount FROM pair_debt WHERE person_id = ?', (1,), ()),
+        "recurring_stored": (
+            'SELECT occurrence FROM recurring_occurrence WHERE recurring_id = ? AND occurrence <= ?', (1, 10), ()
+        ),
+        "expense_shares_base": (
+            'SELECT person_id, amount FROM expense_share_base WHERE expense_id = ?', (1,), ()
+        ),
+        "recurring_occurrence_expense": ('SELECT 1 FROM recurring_occurrence WHERE expense_id = ?', (1,), ()),
+        # Templates are few and all of them are needed at once
+        "recurring_expenses": ('SELECT * FROM recurring_expense', (), ("recurring_expense",)),
+    }
+
+    def check_query_plans(self):
+        """Run EXPLAIN QUERY PLAN on the app's queries and return (name, plan lines, uses_index) for each."""
+        cursor = self.conn.cursor()
+        results = []
+        for name, (sql, params, full_scans_allowed) in self.QUERY_PLAN_CHECKS.items():
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = [row[3] for row in cursor.fetchall()]
+            uses_index = True
+            for detail in plan:
+                # FTS5 reports a MATCH lookup as "SCAN ... VIRTUAL TABLE INDEX", which is an index read
+                if detail.startswith("SCAN ") and "USING" not in detail and "VIRTUAL TABLE INDEX" not in detail:
+                    # A bare SCAN reads every row of the table; scanning a subquery's result is fine
+                    table = detail.split()[1]
+                    if not table.startswith("(") and table not in full_scans_allowed:
+                        uses_index = False
+            results.append((name, plan, uses_index))
+        return results
+
+    def insert_expense(self, cursor, description, amount, date, paid_by, category_id, splits,
+                       currency=currencies.BASE_CURRENCY, rate=None, base_amount=None):
+        """Insert an expense and its splits and update the ledgers to match. The caller commits.
+
+        `amount` and the shares in `splits` are integer minor units of `currency`.
+        The expense keeps `rate`, by default today's rate, for good. The payer
+        is owed `base_amount` in base minor units, by default the sum of the
+        converted shares.
+        """
+        self.check_not_archived(cursor, date)
+        if rate is None:
+            rate = self.current_rate(currency)
+        base_splits = currencies.convert_shares(splits, rate)
+        if base_amount is None:
+            base_amount = sum(base_splits.values())
+
+        # Add expense
+        cursor.execute('''
+            INSERT INTO expense (description, amount, currency, rate, base_amount, date, paid_by, category_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (description, amount, currency, rate, base_amount, date, paid_by, category_id))
+        
+        expense_id = cursor.lastrowid
+        
+        # Add splits
+        for person_id, share_amount in splits.items():
+            cursor.execute('''
+                INSERT INTO expense_split (expense_id, person_id, share_amount)
+                VALUES (?, ?, ?)
+            ''', (expense_id, person_id, share_amount))
+
+        # Update the ledgers in base minor units, converted the same way as the SQL views convert
+        self.apply_balance_deltas(cursor, expense_balance_deltas(paid_by, base_amount, base_splits))
+        self.apply_pair_deltas(cursor, expense_pair_deltas(paid_by, base_splits))
+        self.apply_rollup_deltas(cursor, expense_rollup_deltas(date, category_id, paid_by, base_amount))
+        self.invalidate_checkpoints(cursor, date)
+        return expense_id
+
+    def rates(self):
+        """Return currency -> integer exchange rate (see currencies.RATE_SCALE) for new rows, cached until the next write."""
+        def load():
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT currency, rate FROM currency_rate')
+            return dict(cursor.fetchall())
+        return self.cached(("rates",), load)
+
+    def current_rate(self, currency):
+        """Return the rate a new row in `currency` is written at, or raise ValueError if there is none."""
+        rate = self.rates().get(currency)
+        if rate is None:
+            raise ValueError(f"no exchange rate for {currency}")
+        return rate
+
+    def sync_rates(self, rates):
+        """Store changed exchange rates for the rows written from now on.
+
+        Rows already written keep the rate they were written at, so a new
+        rate never changes a balance or reopens a settled debt.
+        """
+        current = self.rates()
+        changed = {code: rate for code, rate in rates.items() if current.get(code) != rate}
+        if not changed:
+            return False
+        cursor = self.conn.cursor()
+        try:
+            cursor.executemany('''
+                INSERT INTO currency_rate (currency, rate) VALUES (?, ?)
+                ON CONFLICT(currency) DO UPDATE SET rate = excluded.rate
+            ''', list(changed.items()))
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        self.bump_data_version()
+        return True
+
+    def apply_balance_deltas(self, cursor, deltas):
+        """Add per-person balance deltas to the ledger. The caller commits."""
+        cursor.executemany('''
+            INSERT INTO person_balance (person_id, balance) VALUES (?, ?)
+            ON CONFLICT(person_id) DO UPDATE SET balance = balance + excluded.balance
+        ''', [(person_id, delta) for person_id, delta in deltas.items() if delta])
+
+    def compute_balances_from_history(self):
+        """Recompute every person's balance, in base minor units, from the raw history and the opening balances."""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT person_id, SUM(delta)
+            FROM (
+                SELECT paid_by AS person_id, base_amount AS delta FROM expense
+                UNION ALL
+                SELECT person_id, -amount AS delta FROM expense_share_base
+                UNION ALL
+                SELECT payer_id AS person_id, amount AS delta FROM settlement_base
+                UNION ALL
+                SELECT payee_id AS person_id, -amount AS delta FROM settlement_base
+                UNION ALL
+                SELECT person_id, balance AS delta FROM opening_balance
+            )
+            GROUP BY person_id
+        ''')
+        return dict(cursor.fetchall())
+
+    def latest_checkpoint(self, as_of):
+        """Return (id, as_of) of the newest balance checkpoint on or before a date, or None."""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT id, as_of FROM balance_checkpoint WHERE as_of <= ? ORDER BY as_of DESC LIMIT 1', (as_of,))
+        return cursor.fetchone()
+
+    def balances_as_of(self, as_of):
+        """Return person_id -> balance at the end of a date, from the latest checkpoint plus the rows after it.
+
+        Without a checkpoint the opening balances of archived history are the starting point,
+        so dates before the last archive cutoff can no longer be answered.
+        """
+        archived_through = self.archived_through()
+        if archived_through and as_of < archived_through:
+            raise ValueError(f"history up to {archived_through} has been archived")
+        
+        cursor = self.conn.cursor()
+        since = ""
+        checkpoint = self.latest_checkpoint(as_of)
+        if checkpoint:
+            checkpoint_id, since = checkpoint
+            cursor.execute('SELECT person_id, balance FROM balance_checkpoint_entry WHERE checkpoint_id = ?', (checkpoint_id,))
+        else:
+            cursor.execute('SELECT person_id, balance FROM opening_balance')
+        balances = dict(cursor.fetchall())
+        
+        cursor.execute(BALANCE_CHANGES_SQL, (since, as_of) * 4)
+        for person_id, delta in cursor.fetchall():
+            balances[person_id] = balances.get(person_id, 0) + delta
+        return balances
+
+    def create_checkpoint(self, as_of):
+        """Snapshot every balance at the end of a date so later as-of queries start from there.
+
+        Runs on the writer thread, so no write can land between reading the
+        balances and storing them. Raises ValueError if `as_of` is not a
+        YYYY-MM-DD date or is after today.
+        """
+        self.writer.submit(self._insert_checkpoint, past_date(as_of)).result()
+
+    def _insert_checkpoint(self, cursor, as_of):
+        # The writer's own connection, so the balances are read inside the transaction that stores them
+        balances = self.balances_as_of(as_of)
+        self.invalidate_checkpoints(cursor, as_of)
+        cursor.execute('INSERT INTO balance_checkpoint (as_of) VALUES (?)', (as_of,))
+        checkpoint_id = cursor.lastrowid
+        cursor.executemany('''
+            INSERT INTO balance_checkpoint_entry (checkpoint_id, person_id, balance) VALUES (?, ?, ?)
+        ''', [(checkpoint_id, person_id, balance) for person_id, balance in balances.items() if balance])
+
+    def invalidate_checkpoints(self, cursor, date):
+        """Drop checkpoints a change dated `date` would make stale. The caller commits."""
+        cursor.execute('''
+            DELETE FROM balance_checkpoint_entry
+            WHERE checkpoint_id IN (SELECT id FROM balance_checkpoint WHERE as_of >= ?)
+        ''', (date,))
+        cursor.execute('DELETE FROM balance_checkpoint WHERE as_of >= ?', (date,))
+
+    def checkpoint_if_due(self, today):
+        """Checkpoint the end of last month unless a checkpoint within CHECKPOINT_INTERVAL_DAYS exists
+        or that day has been archived."""
+        return self.writer.submit(self._checkpoint_if_due, today).result()
+
+    def _checkpoint_if_due(self, cursor, today):
+        as_of = (today.replace(day=1) - timedelta(days=1)).strftime("%Y-%m-%d")
+        archived_through = self.archived_through()
+        if archived_through and as_of < archived_through:
+            return False
+        checkpoint = self.latest_checkpoint(as_of)
+        if checkpoint:
+            last = datetime.strptime(checkpoint[1], "%Y-%m-%d").date()
+            if (today - last).days <= CHECKPOINT_INTERVAL_DAYS:
+                return False
+        self._insert_checkpoint(cursor, as_of)
+        return True
+
+    def archived_through(self):
+        """Return the latest date whose history was moved to an archive, or None."""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT MAX(archived_through) FROM archive_run')
+        return cursor.fetchone()[0]
+
+    def check_not_archived(self, cursor, date):
+        """Raise ValueError if `date` falls in archived history, which is already folded into the opening balances."""
+        cursor.execute('SELECT MAX(archived_through) FROM archive_run')
+        archived_through = cursor.fetchone()[0]
+        if archived_through and date <= archived_through:
+            raise ValueError(f"history up to {archived_through} has been archived")
+
+    def last_settled_date(self):
+        """Return the latest date at whose end every balance was exactly zero, or None if there never was one."""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT date, person_id, SUM(delta)
+            FROM (
+                SELECT date, paid_by AS person_id, base_amount AS delta FROM expense
+                UNION ALL
+                SELECT date, person_id, -amount AS delta FROM expense_share_base
+                UNION ALL
+                SELECT date, payer_id AS person_id, amount AS delta FROM settlement_base
+                UNION ALL
+                SELECT date, payee_id AS person_id, -amount AS delta FROM settlement_base
+            )
+            GROUP BY date, person_id
+            ORDER BY date
+        ''')
+        daily_rows = cursor.fetchall()
+        
+        # Recurring occurrences due so far count on their own dates even when they are not stored
+        for template in self.load_recurring_expenses(cursor):
+            due = recurring.occurrence_count(template['start'], template['cadence'], date.today(), template['end'])
+            stored = self.stored_occurrences(cursor, template['id'], due - 1)
+            base_splits = currencies.convert_shares(template['splits'], template['rate'])
+            deltas = expense_balance_deltas(template['paid_by'], template['base_amount'], base_splits)
+            for occurrence in range(due):
+                if occurrence not in stored:
+                    day = recurring.occurrence_date(template['start'], template['cadence'], occurrence).isoformat()
+                    daily_rows.extend((day, person_id, delta) for person_id, delta in deltas.items())
+        daily_rows.sort(key=lambda row: row[0])
+        
+        # Walk the days in order, tracking how many people are not square at the end of each
+        cursor.execute('SELECT person_id, balance FROM opening_balance')
+        balances = dict(cursor.fetchall())
+        unsettled = sum(1 for balance in balances.values() if balance)
+        settled_date = None
+        for i, (day, person_id, delta) in enumerate(daily_rows):
+            before = balances.get(person_id, 0)
+            balances[person_id] = before + delta
+            unsettled += (balances[person_id] != 0) - (before != 0)
+            last_of_day = i + 1 == len(daily_rows) or daily_rows[i + 1][0] != day
+            if last_of_day and unsettled == 0:
+                settled_date = day
+        return settled_date
+
+    def archive(self, archive_file, through):
+        """Move expenses, splits and settlements dated on or before `through` into an archive database.
+
+        Recurring occurrences due by then are stored as expenses first. The net
+        effect of everything moved stays behind as opening balances, so every
+        balance is unchanged. The freed pages are then returned to the file system.
+        Returns the number of expenses and settlements moved. Raises ValueError
+        if `through` is not a YYYY-MM-DD date or is after today, since future
+        recurring occurrences would be stored and archived.
+        """
+        # Cutoffs are compared with the stored dates as strings, so they must be in the same form
+        through = past_date(through)
+        cursor = self.conn.cursor()
+        cursor.execute('ATTACH DATABASE ? AS archive', (archive_file,))
+        try:
+            cursor.execute('PRAGMA archive.table_info(expense)')
+            columns = [row[1] for row in cursor.fetchall()]
+            if columns and 'base_amount' not in columns:
+                raise ValueError(f"{archive_file} holds amounts in rupees from before minor units; archive into a new file")
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                # Same columns as the live tables; ids are kept so archived rows can be traced back
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS archive.expense (
+                        id INTEGER PRIMARY KEY,
+                        description TEXT NOT NULL,
+                        amount INTEGER NOT NULL,
+                        currency TEXT NOT NULL,
+                        rate INTEGER NOT NULL,
+                        base_amount INTEGER NOT NULL,
+                        date TEXT NOT NULL,
+                        paid_by INTEGER NOT NULL,
+                        category_id INTEGER
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS archive.expense_split (
+                        id INTEGER PRIMARY KEY,
+                        expense_id INTEGER NOT NULL,
+                        person_id INTEGER NOT NULL,
+                        share_amount INTEGER NOT NULL
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS archive.settlement (
+                        id INTEGER PRIMARY KEY,
+                        payer_id INTEGER NOT NULL,
+                        payee_id INTEGER NOT NULL,
+                        amount INTEGER NOT NULL,
+                        currency TEXT NOT NULL,
+                        rate INTEGER NOT NULL,
+                        date TEXT NOT NULL
+                    )
+                ''')
+                
+                # Recurring occurrences due by the cutoff become real rows so they are archived too
+                self.materialize_recurring(cursor, through)
+                
+                # Net effect of everything being moved, carried forward as opening balances
+                cursor.execute(BALANCE_CHANGES_SQL, ("", through) * 4)
+                cursor.executemany('''
+                    INSERT INTO opening_balance (person_id, balance) VALUES (?, ?)
+                    ON CONFLICT(person_id) DO UPDATE SET balance = balance + excluded.balance
+                ''', cursor.fetchall())
+                cursor.execute(PAIR_DEBT_CHANGES_SQL, ("", through) * 4)
+                cursor.executemany('''
+                    INSERT INTO opening_pair_debt (person_id, other_id, amount) VALUES (?, ?, ?)
+                    ON CONFLICT(person_id, other_id) DO UPDATE SET amount = amount + excluded.amount
+                ''', cursor.fetchall())
+                
+                # OR REPLACE makes a rerun safe if an earlier run committed the archive but not the main file
+                cursor.execute('''
+                    INSERT OR REPLACE INTO archive.expense_split (id, expense_id, person_id, share_amount)
+                    SELECT s.id, s.expense_id, s.person_id, s.share_amount
+                    FROM expense e
+                    JOIN expense_split s ON s.expense_id = e.id
+                    WHERE e.date <= ?
+                ''', (through,))
+                cursor.execute('''
+                    INSERT OR REPLACE INTO archive.expense (id, description, amount, currency, rate, base_amount, date,
+                                                            paid_by, category_id)
+                    SELECT id, description, amount, currency, rate, base_amount, date, paid_by, category_id
+                    FROM expense WHERE date <= ?
+                ''', (through,))
+                expenses = cursor.rowcount
+                cursor.execute('''
+                    INSERT OR REPLACE INTO archive.settlement (id, payer_id, payee_id, amount, currency, rate, date)
+                    SELECT id, payer_id, payee_id, amount, currency, rate, date FROM settlement WHERE date <= ?
+                ''', (through,))
+                settlements = cursor.rowcount
+                
+                cursor.execute('''
+                    DELETE FROM expense_split
+                    WHERE expense_id IN (SELECT id FROM expense WHERE date <= ?)
+                ''', (through,))
+                cursor.execute('DELETE FROM expense WHERE date <= ?', (through,))
+                cursor.execute('DELETE FROM settlement WHERE date <= ?', (through,))
+                # Earlier snapshots can't be extended any more; later ones are still correct
+                cursor.execute('''
+                    DELETE FROM balance_checkpoint_entry
+                    WHERE checkpoint_id IN (SELECT id FROM balance_checkpoint WHERE as_of < ?)
+                ''', (through,))
+                cursor.execute('DELETE FROM balance_checkpoint WHERE as_of < ?', (through,))
+                
+                cursor.execute('''
+                    INSERT INTO archive_run (archived_through, archive_file, expenses, settlements, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (through, os.path.abspath(archive_file), expenses, settlements, datetime.now().isoformat(timespec="seconds")))
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()
+                raise
+        finally:
+            cursor.execute('DETACH DATABASE archive')
+        
+        self.bump_data_version()
+        self.compact()
+        return {"expenses": expenses, "settlements": settlements}
+
+    def compact(self):
+        """Give free pages back to the file system with an incremental vacuum.
+
+        Databases created before auto_vacuum was enabled need one full VACUUM to switch it on.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('PRAGMA auto_vacuum')
+        if cursor.fetchone()[0] != 2:
+            cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            cursor.execute('VACUUM')
+        else:
+            # It frees one page per step; executescript steps it until every free page is gone
+            self.conn.executescript('PRAGMA incremental_vacuum')
+        # Fold the WAL back in so the main file shrinks now rather than at the next checkpoint
+        cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        cursor.fetchall()
+
+    def verify_balances(self, tolerance=0):
+        """Compare the ledger with the raw history and return (person_id, ledger, actual) for each drift."""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT person_id, balance FROM person_balance')
+        ledger = dict(cursor.fetchall())
+        actual = self.compute_balances_from_history()
+
+        drifts = []
+        for person_id in sorted(set(ledger) | set(actual)):
+            ledger_balance = ledger.get(person_id, 0)
+            actual_balance = actual.get(person_id, 0)
+            if abs(ledger_balance - actual_balance) > tolerance:
+                drifts.append((person_id, ledger_balance, actual_balance))
+        return drifts
+
+    def rebuild_balances(self):
+        """Rebuild the ledger from the raw history and return the drifts that were corrected."""
+        drifts = self.verify_balances()
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute('DELETE FROM person_balance')
+            self.apply_balance_deltas(cursor, self.compute_balances_from_history())
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        return drifts
+
+    def apply_pair_deltas(self, cursor, deltas):
+        """Add (person_id, other_id) -> change in what person owes other to the pair debts. The caller commits."""
+        cursor.executemany('''
+            INSERT INTO pair_debt (person_id, other_id, amount) VALUES (?, ?, ?)
+            ON CONFLICT(person_id, other_id) DO UPDATE SET amount = amount + excluded.amount
+        ''', [key + (delta,) for key, delta in deltas.items() if delta])
+
+    def compute_pair_debts_from_history(self):
+        """Recompute every pair debt from the raw expense, split and settlement tables and the archived pairs."""
+        cursor = self.conn.cursor()
+        cursor.execute(PAIR_DEBT_CHANGES_SQL, ("", "9999-12-31") * 4)
+        pairs = {(person_id, other_id): amount for person_id, other_id, amount in cursor.fetchall()}
+        cursor.execute('SELECT person_id, other_id, amount FROM opening_pair_debt')
+        for person_id, other_id, amount in cursor.fetchall():
+            pairs[person_id, other_id] = pairs.get((person_id, other_id), 0) + amount
+        return pairs
+
+    def verify_pair_debts(self, tolerance=0):
+        """Compare the pair debts with the raw history and return (person_id, other_id, stored, actual) for each drift."""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT person_id, other_id, amount FROM pair_debt')
+        stored = {(person_id, other_id): amount for person_id, other_id, amount in cursor.fetchall()}
+        actual = self.compute_pair_debts_from_history()
+
+        drifts = []
+        for pair in sorted(set(stored) | set(actual)):
+            if abs(stored.get(pair, 0) - actual.get(pair, 0)) > tolerance:
+                drifts.append(pair + (stored.get(pair, 0), actual.get(pair, 0)))
+        return drifts
+
+    def rebuild_pair_debts(self):
+        """Rebuild the pair debts from the raw history and return the drifts that were corrected."""
+        drifts = self.verify_pair_debts()
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute('DELETE FROM pair_debt')
+            self.apply_pair_deltas(cursor, self.compute_pair_debts_from_history())
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        return drifts
+
+    def apply_rollup_deltas(self, cursor, deltas):
+        """Add (month, category_id, paid_by) -> (total, expenses) changes to the spending rollup. The caller commits."""
+        cursor.executemany('''
+            INSERT INTO spending_rollup (month, category_id, paid_by, total, expenses) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(month, category_id, paid_by) DO UPDATE SET
+                total = total + excluded.total,
+                expenses = expenses + excluded.expenses
+        ''', [key + change for key, change in deltas.items()])
+        # Groups whose last expense was removed disappear instead of lingering at zero
+        cursor.executemany('''
+            DELETE FROM spending_rollup WHERE month = ? AND category_id = ? AND paid_by = ? AND expenses <= 0
+        ''', [key for key, (_, expenses) in deltas.items() if expenses < 0])
+
+    def rebuild_spending_rollup(self):
+        """Regenerate the spending rollup from the expense table.
+
+        Expenses moved to an archive are included as long as its file is still on disk.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT DISTINCT archive_file FROM archive_run')
+        archive_files = [path for (path,) in cursor.fetchall() if os.path.exists(path)]
+        
+        # One row per expense with its total in base minor units
+        sources = ['SELECT date, category_id, paid_by, base_amount AS amount FROM expense']
+        for i, path in enumerate(archive_files):
+            cursor.execute(f'ATTACH DATABASE ? AS archive{i}', (path,))
+            cursor.execute(f'PRAGMA archive{i}.table_info(expense)')
+            if 'base_amount' in [row[1] for row in cursor.fetchall()]:
+                sources.append(f'SELECT date, category_id, paid_by, base_amount AS amount FROM archive{i}.expense')
+            else:
+                # Archived before amounts were stored in minor units: rupees
+                sources.append(
+                    f'SELECT date, category_id, paid_by, CAST(round(amount * 100) AS INTEGER) AS amount FROM archive{i}.expense'
+                )
+        try:
+            cursor.execute('DELETE FROM spending_rollup')
+            cursor.execute(f'''
+                INSERT INTO spending_rollup (month, category_id, paid_by, total, expenses)
+                SELECT substr(date, 1, 7), COALESCE(category_id, 0), paid_by, SUM(amount), COUNT(*)
+                FROM ({' UNION ALL '.join(sources)})
+                GROUP BY 1, 2, 3
+            ''')
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        finally:
+            for i in range(len(archive_files)):
+                cursor.execute(f'DETACH DATABASE archive{i}')
+        self.bump_data_version()
+
+    def load_recurring_expenses(self, cursor, recurring_id=None):
+        """Read every recurring expense template, or only one, as dicts with its splits and dates parsed."""
+        condition, split_condition = ('WHERE id = ?', 'WHERE recurring_id = ?') if recurring_id is not None else ('', '')
+        cursor.execute(f'''
+            SELECT id, description, amount, currency, rate, base_amount, paid_by, category_id, cadence, start_date,
+                   end_date
+            FROM recurring_expense {condition}
+            ORDER BY id
+        ''', () if recurring_id is None else (recurring_id,))
+        templates = {}
+        for row in cursor.fetchall():
+            templates[row[0]] = {
+                'id': row[0], 'description': row[1], 'amount': row[2], 'currency': row[3], 'rate': row[4],
+                'base_amount': row[5], 'paid_by': row[6], 'category_id': row[7], 'cadence': row[8],
+                'start': date.fromisoformat(row[9]), 'end': date.fromisoformat(row[10]) if row[10] else None,
+                'splits': {},
+            }
+        cursor.execute(f'''
+            SELECT recurring_id, person_id, share_amount FROM recurring_split
+            {split_condition}
+        ''', () if recurring_id is None else (recurring_id,))
+        for template_id, person_id, share_amount in cursor.fetchall():
+            if template_id in templates:
+                templates[template_id]['splits'][person_id] = share_amount
+        return list(templates.values())
+
+    def recurring_expenses(self):
+        """Return every recurring expense template, cached until the next write."""
+        return self.cached(("recurring",), lambda: self.load_recurring_expenses(self.conn.cursor()))
+
+    def stored_occurrences(self, cursor, recurring_id, last):
+        """Return the set of a template's occurrences up to `last` that have a row, whether stored or skipped."""
+        cursor.execute('''
+            SELECT occurrence FROM recurring_occurrence WHERE recurring_id = ? AND occurrence <= ?
+        ''', (recurring_id, last))
+        return {row[0] for row in cursor.fetchall()}
+
+    def recurring_deltas(self, through):
+        """Return (balance deltas, pair debt deltas) of the recurring occurrences dated on or before `through`
+        that are not stored as expenses.
+
+        Each template adds its per-occurrence effect times the number of such
+        occurrences, which comes from a closed-form count, so the cost does not
+        grow with the number of occurrences.
+        """
+        through = date.fromisoformat(through)
+        cursor = self.conn.cursor()
+        balance_deltas = {}
+        pair_deltas = {}
+        for template in self.recurring_expenses():
+            due = recurring.occurrence_count(template['start'], template['cadence'], through, template['end'])
+            if not due:
+                continue
+            cursor.execute('''
+                SELECT COUNT(*) FROM recurring_occurrence WHERE recurring_id = ? AND occurrence < ?
+            ''', (template['id'], due))
+            count = due - cursor.fetchone()[0]
+            if not count:
+                continue
+            base_splits = currencies.convert_shares(template['splits'], template['rate'])
+            for person_id, delta in expense_balance_deltas(
+                template['paid_by'], template['base_amount'], base_splits, sign=count
+            ).items():
+                balance_deltas[person_id] = balance_deltas.get(person_id, 0) + delta
+            for pair, delta in expense_pair_deltas(template['paid_by'], base_splits, sign=count).items():
+                pair_deltas[pair] = pair_deltas.get(pair, 0) + delta
+        return balance_deltas, pair_deltas
+
+    def recurring_rollup_deltas(self, through):
+        """Return the spending rollup, as (month, category_id, paid_by) -> (total, expenses), of the recurring
+        occurrences dated on or before `through` that are not stored as expenses.
+
+        Like recurring_deltas it counts occurrences instead of listing them:
+        the cost grows with the months a template spans and the occurrences
+        stored or skipped, not with how often it repeats.
+        """
+        through = date.fromisoformat(through)
+        cursor = self.conn.cursor()
+        deltas = {}
+        for template in self.recurring_expenses():
+            counts = recurring.occurrences_by_month(template['start'], template['cadence'], through, template['end'])
+            if not counts:
+                continue
+            for occurrence in self.stored_occurrences(cursor, template['id'], sum(counts.values()) - 1):
+                month = recurring.occurrence_date(template['start'], template['cadence'], occurrence).isoformat()[:7]
+                counts[month] -= 1
+            for month, count in counts.items():
+                if count:
+                    key = (month, template['category_id'] or 0, template['paid_by'])
+                    total, expenses = deltas.get(key, (0, 0))
+                    deltas[key] = (total + count * template['base_amount'], expenses + count)
+        return deltas
+
+    def materialize_occurrence(self, cursor, recurring_id, occurrence, amount=None, splits=None):
+        """Store one occurrence of a recurring expense as a real expense and return its id. The caller commits.
+
+        `amount` and `splits`, in the template's currency, replace the template's for this occurrence only.
+        The occurrence is converted at the template's rate, like the occurrences that are not stored.
+        """
+        templates = self.load_recurring_expenses(cursor, recurring_id)
+        if not templates:
+            raise ValueError(f"no recurring expense with id {recurring_id}")
+        template = templates[0]
+        occurrence_date = recurring.occurrence_date(template['start'], template['cadence'], occurrence)
+        if template['end'] is not None and occurrence_date > template['end']:
+            raise ValueError("the recurring expense has ended by then")
+        expense_id = self.insert_expense(
+            cursor, template['description'], template['amount'] if amount is None else amount,
+            occurrence_date.isoformat(), template['paid_by'], template['category_id'],
+            template['splits'] if splits is None else splits, template['currency'], template['rate'],
+            template['base_amount'] if amount is None and splits is None else None,
+        )
+        # Fails with IntegrityError if the occurrence is already stored or skipped
+        cursor.execute('''
+            INSERT INTO recurring_occurrence (recurring_id, occurrence, expense_id) VALUES (?, ?, ?)
+        ''', (recurring_id, occurrence, expense_id))
+        return expense_id
+
+    def materialize_recurring(self, cursor, through):
+        """Store every occurrence dated on or before `through` that is not stored yet. The caller commits."""
+        stored = 0
+        for template in self.load_recurring_expenses(cursor):
+            due = recurring.occurrence_count(template['start'], template['cadence'], date.fromisoformat(through),
+                                             template['end'])
+            existing = self.stored_occurrences(cursor, template['id'], due - 1)
+            for occurrence in range(due):
+                if occurrence not in existing:
+                    self.materialize_occurrence(cursor, template['id'], occurrence)
+                    stored += 1
+        return stored
+
+    def cached(self, key, loader):
+        """Return the cached result of `loader` for `key`, calling it only if there was a write since.
+
+        Writes committed by other processes on the same file count too.
+        """
+        with self._lock:
+            self._check_file_version()
+            version = self.data_version
+            if key in self._read_cache:
+                self._read_cache.move_to_end(key)
+                return self._read_cache[key]
+        
+        value = loader()
+        
+        with self._lock:
+            # Don't keep a result that a concurrent write may already have made stale
+            if self.data_version == version:
+                self._read_cache[key] = value
+                if len(self._read_cache) > READ_CACHE_SIZE:
+                    self._read_cache.popitem(last=False)
+        return value
+    
+    def _check_file_version(self):
+        """Empty the cache if any connection committed to the file since the last check. Hold self._lock."""
+        if self._watch is None:
+            self._watch = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False)
+        file_version = self._watch.execute('PRAGMA data_version').fetchone()[0]
+        if file_version != self._file_version:
+            if self._file_version is not None:
+                self.data_version += 1
+                self._read_cache.clear()
+            self._file_version = file_version
+
+    def bump_data_version(self):
+        """Record that the data changed, invalidating every cached read."""
+        with self._lock:
+            self.data_version += 1
+            self._read_cache.clear()
+    
+    @property
+    def writer(self):
+        """Return the queue whose single thread performs every interactive write."""
+        with self._lock:
+            if self._writer is None:
+                self._writer = WriteQueue(self)
+            return self._writer
+
+    def close(self):
+        """Finish queued writes, then close every connection opened by this manager."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        with self._lock:
+            for conn in list(self._owners.values()) + self._idle:
+                conn.close()
+            self._owners = {}
+            self._idle = []
+            if self._watch is not None:
+                self._watch.close()
+                self._watch = None
+                self._file_version = None
+            self._read_cache.clear()
+        self._local = threading.local()
+
+
+def past_date(text):
+    """Return `text` as YYYY-MM-DD, raising ValueError if it is not an ISO date or is after today."""
+    try:
+        day = date.fromisoformat(text)
+    except (TypeError, ValueError):
+        raise ValueError(f"{text!r} is not a date as YYYY-MM-DD")
+    if day > date.today():
+        raise ValueError(f"{day.isoformat()} is in the future")
+    return day.isoformat()
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query that prefix-matches every word, or None if there are no words."""
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def expense_rollup_deltas(date, category_id, paid_by, amount, sign=1):
+    """Return the spending rollup change of adding (sign=1) or removing (sign=-1) an expense."""
+    return {(date[:7], category_id or 0, paid_by): (sign * amount, sign)}
+
+
+def expense_pair_deltas(paid_by, splits, sign=1):
+    """Return the pair debt change of adding (sign=1) or removing (sign=-1) an expense: each share is owed to the payer."""
+    deltas = {}
+    for person_id, share_amount in splits.items():
+        if person_id != paid_by:
+            deltas[person_id, paid_by] = deltas.get((person_id, paid_by), 0) + sign * share_amount
+            deltas[paid_by, person_id] = deltas.get((paid_by, person_id), 0) - sign * share_amount
+    return deltas
+
+
+def settlement_pair_deltas(payer_id, payee_id, amount):
+    """Return the pair debt change of a payment: the payer now owes the payee that much less."""
+    return {(payer_id, payee_id): -amount, (payee_id, payer_id): amount}
+
+
+def expense_balance_deltas(paid_by, amount, splits, sign=1):
+    """Return the per-person balance change of adding (sign=1) or removing (sign=-1) an expense."""
+    deltas = {paid_by: sign * amount}
+    for person_id, share_amount in splits.items():
+        deltas[person_id] = deltas.get(person_id, 0) - sign * share_amount
+    return deltas
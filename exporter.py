@@ -0,0 +1,131 @@
+import csv
+import io
+import itertools
+import os
+from datetime import date
+
+import recurring
+
+# Rows fetched from SQLite, and written as one Parquet row group, at a time
+EXPORT_CHUNK_SIZE = 10000
+
+# amount and share_amount are integer minor units of the expense's currency, as stored
+EXPORT_COLUMNS = [
+    "expense_id", "date", "description", "category", "paid_by", "amount", "currency", "split_with", "share_amount",
+]
+
+# One row per split, in expense order so each expense's splits come out together.
+# Recurring occurrences that are not stored follow, with their negative listing ids.
+EXPORT_SQL = '''
+    SELECT e.id, e.date, e.description, c.name, payer.name, e.amount, e.currency, p.name, s.share_amount
+    FROM expense e
+    JOIN person payer ON e.paid_by = payer.id
+    LEFT JOIN category c ON e.category_id = c.id
+    LEFT JOIN expense_split s ON s.expense_id = e.id
+    LEFT JOIN person p ON s.person_id = p.id
+    ORDER BY e.id, s.id
+'''
+
+EXPORT_FORMATS = ["csv", "parquet"]
+
+
+def iter_occurrence_rows(db, through):
+    """Yield export rows, one per split, for the recurring occurrences due by `through` that are not stored."""
+    cursor = db.conn.cursor()
+    cursor.execute('SELECT id, name FROM person')
+    person_names = dict(cursor.fetchall())
+    cursor.execute('SELECT id, name FROM category')
+    category_names = dict(cursor.fetchall())
+    for template in db.recurring_expenses():
+        due = recurring.occurrence_count(template['start'], template['cadence'], through, template['end'])
+        stored = db.stored_occurrences(cursor, template['id'], due - 1)
+        for occurrence in range(due):
+            if occurrence in stored:
+                continue
+            expense = (
+                recurring.occurrence_id(template['id'], occurrence),
+                recurring.occurrence_date(template['start'], template['cadence'], occurrence).isoformat(),
+                template['description'], category_names.get(template['category_id']),
+                person_names[template['paid_by']], template['amount'], template['currency'],
+            )
+            for person_id, share in template['splits'].items():
+                yield expense + (person_names[person_id], share)
+
+
+def iter_export_chunks(db, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield expense rows joined with their splits, then the due recurring occurrences, `chunk_size` rows at a time."""
+    cursor = db.conn.cursor()
+    cursor.execute(EXPORT_SQL)
+    rows = itertools.chain(cursor, iter_occurrence_rows(db, date.today()))
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        yield chunk
+
+
+def export_csv(db, out, chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream every expense and split to a text file object as CSV and return the row count."""
+    writer = csv.writer(out)
+    writer.writerow(EXPORT_COLUMNS)
+    count = 0
+    for rows in iter_export_chunks(db, chunk_size):
+        writer.writerows(rows)
+        count += len(rows)
+    return count
+
+
+def export_parquet(db, out, chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream every expense and split to a path or binary file as Parquet, one row group per chunk."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+
+    schema = pa.schema([
+        ("expense_id", pa.int64()),
+        ("date", pa.string()),
+        ("description", pa.string()),
+        ("category", pa.string()),
+        ("paid_by", pa.string()),
+        ("amount", pa.int64()),
+        ("currency", pa.string()),
+        ("split_with", pa.string()),
+        ("share_amount", pa.int64()),
+    ])
+    count = 0
+    with pq.ParquetWriter(out, schema) as writer:
+        for rows in iter_export_chunks(db, chunk_size):
+            columns = list(zip(*rows))
+            writer.write_table(pa.table(
+                {name: columns[i] for i, name in enumerate(EXPORT_COLUMNS)}, schema=schema
+            ))
+            count += len(rows)
+        if count == 0:
+            writer.write_table(schema.empty_table())
+    return count
+
+
+def export_expenses(db, path, fmt=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Export to `path` in `fmt` (guessed from the extension if None) and return the row count."""
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt == "csv":
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            return export_csv(db, f, chunk_size)
+    if fmt == "parquet":
+        return export_parquet(db, path, chunk_size)
+    raise ValueError(f"unknown export format '{fmt}', expected one of {', '.join(EXPORT_FORMATS)}")
+
+
+def export_to_file(db, fmt, out, chunk_size=EXPORT_CHUNK_SIZE):
+    """Export into an open binary file object, such as a temporary file, and rewind it."""
+    if fmt == "csv":
+        text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+        export_csv(db, text, chunk_size)
+        # Keep `out` open for the caller
+        text.detach()
+    else:
+        export_parquet(db, out, chunk_size)
+    out.seek(0)
+    return out
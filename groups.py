@@ -0,0 +1,176 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+from database import Database
+
+# Small database listing every group and the shard file holding its data
+CATALOG_FILE = "expense_groups.db"
+
+# Directory new group shards are created in
+SHARD_DIR = "groups"
+
+# The group that keeps using the original single-ledger database
+DEFAULT_GROUP = "Everyone"
+DEFAULT_DB_FILE = "expense_splitter.db"
+
+# Most group databases kept open at once; the least recently used one nobody holds is closed first
+MAX_OPEN_GROUPS = 16
+
+
+class GroupCatalog:
+    def __init__(self, catalog_file=CATALOG_FILE, shard_dir=SHARD_DIR, default_db_file=DEFAULT_DB_FILE,
+                 max_open=MAX_OPEN_GROUPS, instrumentation=None):
+        """Open the catalog, registering the original database as the default group on first use."""
+        self.shard_dir = shard_dir
+        self.max_open = max_open
+        self.instrumentation = instrumentation
+        self._lock = threading.Lock()
+        # group id -> Database, least recently used first
+        self._open = OrderedDict()
+        # group id -> number of lease() blocks holding that shard open
+        self._leases = {}
+
+        # The catalog is tiny and rarely written, so one connection behind a lock is enough
+        self.conn = sqlite3.connect(catalog_file, timeout=30, check_same_thread=False)
+        with self._lock:
+            self.conn.execute('PRAGMA journal_mode = WAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS expense_group (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL UNIQUE,
+                    db_file TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            ''')
+            self.conn.execute('''
+                INSERT INTO expense_group (name, db_file, created_at)
+                SELECT ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM expense_group)
+            ''', (DEFAULT_GROUP, default_db_file, datetime.now().isoformat(timespec="seconds")))
+            self.conn.commit()
+
+    def list_groups(self):
+        """Return (id, name) of every group, oldest first."""
+        with self._lock:
+            return self.conn.execute('SELECT id, name FROM expense_group ORDER BY id').fetchall()
+
+    def group_id(self, name):
+        """Return the id of the group called `name`, or None."""
+        with self._lock:
+            row = self.conn.execute('SELECT id FROM expense_group WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def db_file(self, group_id):
+        """Return the path of a group's shard file."""
+        with self._lock:
+            row = self.conn.execute('SELECT db_file FROM expense_group WHERE id = ?', (group_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"no group with id {group_id}")
+        return row[0]
+
+    def create_group(self, name):
+        """Register a new group with its own shard file and return its id.
+
+        Raises sqlite3.IntegrityError if the name is taken.
+        """
+        os.makedirs(self.shard_dir, exist_ok=True)
+        with self._lock:
+            try:
+                cursor = self.conn.execute('''
+                    INSERT INTO expense_group (name, db_file, created_at) VALUES (?, '', ?)
+                ''', (name, datetime.now().isoformat(timespec="seconds")))
+                group_id = cursor.lastrowid
+                # Shards are named by id so renaming a group never moves files
+                self.conn.execute(
+                    'UPDATE expense_group SET db_file = ? WHERE id = ?',
+                    (os.path.join(self.shard_dir, f"group_{group_id}.db"), group_id),
+                )
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()
+                raise
+        # Creating the Database lays out the shard's schema
+        self.database(group_id)
+        return group_id
+
+    def database(self, group_id):
+        """Return the Database of a group, opening its shard on first use.
+
+        The shard may be closed again once more than max_open are open; hold
+        it with lease() for as long as it is in use.
+        """
+        return self._acquire(group_id, leased=False)
+
+    @contextmanager
+    def lease(self, group_id):
+        """Hold a group's Database open for the duration of a with block.
+
+        Past max_open shards, the least recently used one that no block holds
+        is closed, after its queued writes are committed. A shard in use is
+        never closed under a thread, so each shard has a single Database.
+        """
+        db = self._acquire(group_id, leased=True)
+        try:
+            yield db
+        finally:
+            with self._lock:
+                self._leases[group_id] -= 1
+                if not self._leases[group_id]:
+                    del self._leases[group_id]
+                evicted = self._evict_idle()
+            for old in evicted:
+                old.close()
+
+    def _acquire(self, group_id, leased):
+        """Return a group's open Database, opening it if needed and taking a lease on it if `leased`."""
+        with self._lock:
+            db = self._open.get(group_id)
+            if db is not None:
+                self._open.move_to_end(group_id)
+                if leased:
+                    self._leases[group_id] = self._leases.get(group_id, 0) + 1
+                return db
+
+        db = Database(self.db_file(group_id), self.instrumentation)
+        evicted = []
+        with self._lock:
+            # Another thread may have opened the same shard meanwhile; keep the first one
+            if group_id in self._open:
+                evicted.append(db)
+                db = self._open[group_id]
+                self._open.move_to_end(group_id)
+            else:
+                self._open[group_id] = db
+            if leased:
+                self._leases[group_id] = self._leases.get(group_id, 0) + 1
+            evicted.extend(self._evict_idle(keep=group_id))
+        for old in evicted:
+            old.close()
+        return db
+
+    def _evict_idle(self, keep=None):
+        """Take the least recently used unleased shards out of the open set until at most max_open remain.
+
+        Returns them for the caller to close outside the lock. Leased shards,
+        and `keep`, stay open even past max_open.
+        """
+        evicted = []
+        for group_id in list(self._open):
+            if len(self._open) <= self.max_open:
+                break
+            if group_id != keep and not self._leases.get(group_id):
+                evicted.append(self._open.pop(group_id))
+        return evicted
+
+    def close(self):
+        """Close every open shard and the catalog."""
+        with self._lock:
+            open_dbs = list(self._open.values())
+            self._open.clear()
+            self._leases.clear()
+        for db in open_dbs:
+            db.close()
+        self.conn.close()
@@ -0,0 +1,274 @@
+import csv
+import json
+import math
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import currencies
+from database import expense_balance_deltas, expense_pair_deltas, expense_rollup_deltas
+from splits import split_minor
+
+# Category used for rows that do not name one
+DEFAULT_CATEGORY = "Other"
+
+# Largest amount or share in minor units; beyond 2**53 floats stop counting every unit
+MAX_MINOR = 2 ** 53
+
+
+def read_rows(path):
+    """Stream (line number, row dict) pairs from a CSV or JSONL file.
+
+    CSV files need description, amount, date and paid_by columns, plus optional
+    category, currency and splits columns. JSONL rows use the same keys.
+    """
+    if os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, ValueError(f"invalid JSON: {e}")
+    else:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            # Line 1 is the header
+            for line_number, row in enumerate(csv.DictReader(f), start=2):
+                yield line_number, row
+
+
+def parse_amount(value, currency=currencies.BASE_CURRENCY):
+    """Convert an amount in major units, as read from a file, to minor units of `currency`."""
+    major = float(value)
+    if not math.isfinite(major) or abs(major) * 10 ** currencies.minor_digits(currency) > MAX_MINOR:
+        raise ValueError(f"amount {value} is out of range")
+    return currencies.to_minor(major, currency)
+
+
+def parse_splits(value, amount, currency=currencies.BASE_CURRENCY):
+    """Turn a splits field into a list of (name, share in minor units) pairs.
+
+    Accepts a dict of name -> share, a list of names to split equally, or a
+    string of "name:share" / "name" entries separated by semicolons. `amount`
+    is in minor units; shares in the field are in major units of `currency`.
+    """
+    if isinstance(value, dict):
+        entries = [(name, share) for name, share in value.items()]
+    else:
+        if isinstance(value, str):
+            value = [item for item in value.split(";") if item.strip()]
+        entries = []
+        for item in value or []:
+            name, _, share = str(item).partition(":")
+            entries.append((name, share or None))
+
+    if not entries:
+        raise ValueError("no one to split with")
+
+    if all(share is None for _, share in entries):
+        # Whole minor units, with the leftover ones going to the first few people
+        shares = split_minor(amount, count=len(entries))
+        return [(name.strip(), share) for (name, _), share in zip(entries, shares.tolist())]
+    if any(share is None for _, share in entries):
+        raise ValueError("either every split needs an amount or none does")
+
+    splits = [(name.strip(), parse_amount(share, currency)) for name, share in entries]
+    if any(share < 0 for _, share in splits):
+        raise ValueError("split amounts can't be negative")
+    if sum(share for _, share in splits) != amount:
+        raise ValueError("split amounts do not add up to the expense amount")
+    return splits
+
+
+class ExpenseImporter:
+    def __init__(self, db, batch_size=1000, create_persons=False):
+        """Prepare an importer that writes into `db` in transactions of `batch_size` expenses."""
+        self.db = db
+        self.batch_size = batch_size
+        self.create_persons = create_persons
+
+        # Name -> id maps, loaded once so rows never need a lookup query
+        cursor = self.db.conn.cursor()
+        cursor.execute('SELECT name, id FROM person')
+        self.person_ids = dict(cursor.fetchall())
+        cursor.execute('SELECT name, id FROM category')
+        self.category_ids = dict(cursor.fetchall())
+        self.rates = self.db.rates()
+        self.archived_through = self.db.archived_through()
+
+    def resolve_person(self, cursor, name):
+        """Return the id of a person, creating them if allowed."""
+        person_id = self.person_ids.get(name)
+        if person_id is None:
+            if not self.create_persons:
+                raise ValueError(f"unknown person '{name}'")
+            cursor.execute('INSERT INTO person (name) VALUES (?)', (name,))
+            person_id = self.person_ids[name] = cursor.lastrowid
+        return person_id
+
+    def parse_row(self, row):
+        """Validate a raw row and return (description, amount, date, payer name, category id, splits, currency).
+
+        The amount and shares come back in minor units of the currency.
+        """
+        if isinstance(row, Exception):
+            raise row
+
+        description = (row.get("description") or "").strip()
+        if not description:
+            raise ValueError("missing description")
+
+        currency = (row.get("currency") or "").strip().upper() or currencies.BASE_CURRENCY
+        if currency not in self.rates:
+            raise ValueError(f"no exchange rate for {currency}")
+
+        amount = parse_amount(row.get("amount") or 0, currency)
+        if amount <= 0:
+            raise ValueError("amount must be greater than zero")
+
+        date = datetime.strptime(str(row.get("date") or "").strip(), "%Y-%m-%d").strftime("%Y-%m-%d")
+        if self.archived_through and date <= self.archived_through:
+            raise ValueError(f"history up to {self.archived_through} has been archived")
+
+        paid_by = (row.get("paid_by") or "").strip()
+        if not paid_by:
+            raise ValueError("missing paid_by")
+
+        category = (row.get("category") or "").strip() or DEFAULT_CATEGORY
+        category_id = self.category_ids.get(category)
+        if category_id is None:
+            raise ValueError(f"unknown category '{category}'")
+
+        splits = parse_splits(row.get("splits"), amount, currency)
+        if not self.create_persons:
+            for name in [paid_by] + [name for name, _ in splits]:
+                if name not in self.person_ids:
+                    raise ValueError(f"unknown person '{name}'")
+        return description, amount, date, paid_by, category_id, splits, currency
+
+    def write_batch(self, batch):
+        """Insert a batch of parsed rows with executemany in a single transaction."""
+        cursor = self.db.conn.cursor()
+        # Take the write lock up front so the ids handed out below stay ours
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM expense')
+            next_id = cursor.fetchone()[0]
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'expense'")
+            sequence = cursor.fetchone()
+            if sequence:
+                next_id = max(next_id, sequence[0])
+
+            expenses = []
+            expense_splits = []
+            deltas = {}
+            rollup_deltas = {}
+            pair_deltas = {}
+            for description, amount, date, paid_by, category_id, splits, currency in batch:
+                next_id += 1
+                payer_id = self.resolve_person(cursor, paid_by)
+                shares = {}
+                for name, share in splits:
+                    person_id = self.resolve_person(cursor, name)
+                    shares[person_id] = shares.get(person_id, 0) + share
+
+                # Rows keep the rate they are written at; the ledgers are kept in the base currency
+                rate = self.rates[currency]
+                base_shares = currencies.convert_shares(shares, rate)
+                base_amount = sum(base_shares.values())
+                expenses.append((next_id, description, amount, currency, rate, base_amount, date, payer_id, category_id))
+                expense_splits.extend((next_id, person_id, share) for person_id, share in shares.items())
+                for person_id, delta in expense_balance_deltas(payer_id, base_amount, base_shares).items():
+                    deltas[person_id] = deltas.get(person_id, 0) + delta
+                for pair, delta in expense_pair_deltas(payer_id, base_shares).items():
+                    pair_deltas[pair] = pair_deltas.get(pair, 0) + delta
+                for key, (total, count) in expense_rollup_deltas(date, category_id, payer_id, base_amount).items():
+                    before = rollup_deltas.get(key, (0, 0))
+                    rollup_deltas[key] = (before[0] + total, before[1] + count)
+
+            cursor.executemany('''
+                INSERT INTO expense (id, description, amount, currency, rate, base_amount, date, paid_by, category_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', expenses)
+            cursor.executemany('''
+                INSERT INTO expense_split (expense_id, person_id, share_amount)
+                VALUES (?, ?, ?)
+            ''', expense_splits)
+            self.db.apply_balance_deltas(cursor, deltas)
+            self.db.apply_pair_deltas(cursor, pair_deltas)
+            self.db.apply_rollup_deltas(cursor, rollup_deltas)
+            self.db.invalidate_checkpoints(cursor, min(expense[6] for expense in expenses))
+
+            self.db.conn.commit()
+            self.db.bump_data_version()
+        except (sqlite3.Error, ValueError, OverflowError):
+            self.db.conn.rollback()
+            # Persons created during the failed batch were rolled back too
+            cursor.execute('SELECT name, id FROM person')
+            self.person_ids = dict(cursor.fetchall())
+            raise
+
+    def flush(self, batch, reject):
+        """Write a batch, falling back to one row at a time to isolate the rows that fail."""
+        try:
+            self.write_batch([parsed for _, _, parsed in batch])
+            return len(batch)
+        except (sqlite3.Error, ValueError, OverflowError):
+            if len(batch) == 1:
+                line_number, row, _ = batch[0]
+                reject(line_number, row, "could not be written to the database")
+                return 0
+
+        imported = 0
+        for item in batch:
+            try:
+                self.write_batch([item[2]])
+                imported += 1
+            except (sqlite3.Error, ValueError, OverflowError) as e:
+                reject(item[0], item[1], str(e))
+        return imported
+
+    def run(self, path, reject_path=None):
+        """Import every row of `path` and return a summary of the run.
+
+        Rows that fail validation are written to `reject_path` as JSON lines
+        (or dropped if it is None) and the import carries on.
+        """
+        imported = 0
+        rejected = 0
+        started = time.perf_counter()
+        reject_file = open(reject_path, "w", encoding="utf-8") if reject_path else None
+
+        def reject(line_number, row, error):
+            nonlocal rejected
+            rejected += 1
+            if reject_file:
+                raw = None if isinstance(row, Exception) else row
+                reject_file.write(json.dumps({"line": line_number, "error": error, "row": raw}) + "\n")
+
+        try:
+            batch = []
+            for line_number, row in read_rows(path):
+                try:
+                    batch.append((line_number, row, self.parse_row(row)))
+                except (ValueError, TypeError, AttributeError, OverflowError) as e:
+                    reject(line_number, row, str(e))
+                    continue
+                if len(batch) >= self.batch_size:
+                    imported += self.flush(batch, reject)
+                    batch = []
+            if batch:
+                imported += self.flush(batch, reject)
+        finally:
+            if reject_file:
+                reject_file.close()
+
+        seconds = time.perf_counter() - started
+        return {
+            "imported": imported,
+            "rejected": rejected,
+            "seconds": seconds,
+            "rows_per_sec": imported / seconds if seconds > 0 else 0.0,
+        }
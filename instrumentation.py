@@ -0,0 +1,194 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Progress handler granularity, in SQLite virtual machine instructions
+PROGRESS_STEPS = 1000
+
+# Records kept in memory; older ones are dropped first
+MAX_RECORDS = 10000
+
+
+def normalize_sql(sql):
+    """Collapse whitespace so the same statement always groups under one key."""
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+class Instrumentation:
+    def __init__(self, max_records=MAX_RECORDS):
+        """Collect query and render timings in memory."""
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.records = deque(maxlen=max_records)
+
+    def attach(self, conn):
+        """Hook the trace and progress callbacks of a connection made with InstrumentedConnection."""
+        conn.instrumentation = self
+        conn.set_trace_callback(self._on_trace)
+        conn.set_progress_handler(self._on_progress, PROGRESS_STEPS)
+
+    def _on_trace(self, statement):
+        """Count every statement SQLite runs, including ones issued by triggers and commits."""
+        record = getattr(self._local, "query", None)
+        if record is not None:
+            record["statements"] += 1
+
+    def _on_progress(self, *args):
+        """Count virtual machine work for the running query. Returning 0 lets it continue."""
+        record = getattr(self._local, "query", None)
+        if record is not None:
+            record["vm_steps"] += PROGRESS_STEPS
+        return 0
+
+    def start_query(self, sql, many=False):
+        """Start a record for a statement executed on the calling thread."""
+        record = {
+            "type": "query",
+            "sql": normalize_sql(sql),
+            "many": many,
+            "started_at": time.time(),
+            "ms": 0.0,
+            "rows": 0,
+            "statements": 0,
+            "vm_steps": 0,
+            "page": getattr(self._local, "page", None),
+            "thread": threading.current_thread().name,
+        }
+        self._local.query = record
+        if record["page"] is not None:
+            self._local.page_queries += 1
+        with self._lock:
+            self.records.append(record)
+        return record
+
+    def end_query(self, record, seconds, rows=0):
+        """Add time spent executing or fetching, and rows fetched, to a query record."""
+        record["ms"] += seconds * 1000
+        record["rows"] += rows
+
+    @contextmanager
+    def span(self, page):
+        """Time a page handler and attribute the queries it runs to it."""
+        self._local.page = page
+        self._local.page_queries = 0
+        record = {"type": "render", "page": page, "started_at": time.time(), "ms": 0.0, "queries": 0}
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["ms"] = (time.perf_counter() - started) * 1000
+            record["queries"] = self._local.page_queries
+            self._local.page = None
+            with self._lock:
+                self.records.append(record)
+
+    def slowest_statements(self, n=10):
+        """Return the n statements with the highest total time, grouped by SQL text."""
+        totals = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            if record["type"] != "query":
+                continue
+            total = totals.setdefault(record["sql"], {"sql": record["sql"], "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0})
+            total["calls"] += 1
+            total["total_ms"] += record["ms"]
+            total["max_ms"] = max(total["max_ms"], record["ms"])
+            total["rows"] += record["rows"]
+        return sorted(totals.values(), key=lambda t: t["total_ms"], reverse=True)[:n]
+
+    def page_timings(self):
+        """Return count, mean and max render time of each page."""
+        timings = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            if record["type"] != "render":
+                continue
+            timing = timings.setdefault(record["page"], {"page": record["page"], "renders": 0, "total_ms": 0.0, "max_ms": 0.0})
+            timing["renders"] += 1
+            timing["total_ms"] += record["ms"]
+            timing["max_ms"] = max(timing["max_ms"], record["ms"])
+        for timing in timings.values():
+            timing["mean_ms"] = timing["total_ms"] / timing["renders"]
+        return sorted(timings.values(), key=lambda t: t["mean_ms"], reverse=True)
+
+    def to_jsonl(self):
+        """Return every record as JSON lines."""
+        with self._lock:
+            records = list(self.records)
+        return "".join(json.dumps(record) + "\n" for record in records)
+
+    def export_jsonl(self, path):
+        """Append every record to a JSON lines file for offline analysis."""
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(self.to_jsonl())
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self.records.clear()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times statements and counts the rows fetched from them."""
+
+    def _measure(self, method, sql, args, many=False):
+        instrumentation = self.connection.instrumentation
+        self._record = instrumentation.start_query(sql, many)
+        started = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            instrumentation.end_query(self._record, time.perf_counter() - started)
+
+    def execute(self, sql, *args):
+        return self._measure(super().execute, sql, args)
+
+    def executemany(self, sql, *args):
+        return self._measure(super().executemany, sql, args, many=True)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        rows = method(*args)
+        record = getattr(self, "_record", None)
+        if record is not None:
+            count = 1 if rows is not None and not isinstance(rows, list) else len(rows or [])
+            self.connection.instrumentation.end_query(record, time.perf_counter() - started, count)
+        return rows
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, *args):
+        return self._fetch(super().fetchmany, *args)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors and commits are recorded by an Instrumentation."""
+
+    instrumentation = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+    def commit(self):
+        record = self.instrumentation.start_query("COMMIT")
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            self.instrumentation.end_query(record, time.perf_counter() - started)
@@ -0,0 +1,259 @@
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+import currencies
+from database import Database, past_date
+from groups import CATALOG_FILE, GroupCatalog
+
+
+def cutoff_date(text):
+    """Parse a YYYY-MM-DD argument that may not be after today."""
+    try:
+        return past_date(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def verify_balances(args):
+    """Check the balance ledger against the raw history and optionally rebuild it."""
+    db = Database(args.db)
+    try:
+        drifts = db.rebuild_balances() if args.rebuild else db.verify_balances()
+        for person_id, ledger_balance, actual_balance in drifts:
+            print(
+                f"person {person_id}: ledger {currencies.format_amount(ledger_balance)} "
+                f"!= history {currencies.format_amount(actual_balance)}"
+            )
+        pair_drifts = db.rebuild_pair_debts() if args.rebuild else db.verify_pair_debts()
+        for person_id, other_id, stored, actual in pair_drifts:
+            print(
+                f"person {person_id} owes {other_id}: stored {currencies.format_amount(stored)} "
+                f"!= history {currencies.format_amount(actual)}"
+            )
+        if not drifts and not pair_drifts:
+            print("Balance ledger and pair debts match the expense history.")
+        elif args.rebuild:
+            print(f"Rebuilt balance ledger and pair debts, corrected {len(drifts)} balance(s) and {len(pair_drifts)} pair(s).")
+        else:
+            print(f"Found {len(drifts)} drifted balance(s) and {len(pair_drifts)} pair(s). Run with --rebuild to fix them.")
+        return 1 if (drifts or pair_drifts) and not args.rebuild else 0
+    finally:
+        db.close()
+
+
+def rebuild_rollups(args):
+    """Regenerate the monthly spending rollups behind the Insights page."""
+    db = Database(args.db)
+    try:
+        db.rebuild_spending_rollup()
+        cursor = db.conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM spending_rollup')
+        print(f"Rebuilt spending rollups: {cursor.fetchone()[0]} month/category/payer total(s).")
+        return 0
+    finally:
+        db.close()
+
+
+def migrate(args):
+    """Apply pending schema migrations and report the schema version."""
+    db = Database(args.db)
+    try:
+        print(f"Schema is at version {db.schema_version()} of {len(Database.MIGRATIONS)}.")
+        return 0
+    finally:
+        db.close()
+
+
+def explain(args):
+    """Print the query plan of every app query and fail if one does not use an index."""
+    db = Database(args.db)
+    try:
+        failures = 0
+        for name, plan, uses_index in db.check_query_plans():
+            print(f"{'ok  ' if uses_index else 'SCAN'} {name}")
+            for detail in plan:
+                print(f"       {detail}")
+            if not uses_index:
+                failures += 1
+        if failures:
+            print(f"{failures} query(ies) scan a table without an index.")
+        return 1 if failures else 0
+    finally:
+        db.close()
+
+
+def import_expenses(args):
+    """Stream expenses from a CSV or JSONL file into the database."""
+    from importer import ExpenseImporter
+
+    db = Database(args.db)
+    try:
+        importer = ExpenseImporter(db, batch_size=args.batch_size, create_persons=args.create_persons)
+        summary = importer.run(args.path, reject_path=args.reject_file)
+        print(
+            f"Imported {summary['imported']} expense(s), rejected {summary['rejected']} "
+            f"in {summary['seconds']:.2f}s ({summary['rows_per_sec']:.0f} rows/sec)."
+        )
+        return 0
+    finally:
+        db.close()
+
+
+def checkpoint(args):
+    """Snapshot every balance at the end of a date."""
+    db = Database(args.db)
+    try:
+        as_of = args.as_of or (date.today() - timedelta(days=1)).strftime("%Y-%m-%d")
+        db.create_checkpoint(as_of)
+        print(f"Checkpointed balances as of {as_of}.")
+        return 0
+    finally:
+        db.close()
+
+
+def export(args):
+    """Stream every expense and split to a CSV or Parquet file."""
+    from exporter import export_expenses
+
+    db = Database(args.db)
+    try:
+        count = export_expenses(db, args.path, fmt=args.format, chunk_size=args.chunk_size)
+        print(f"Exported {count} row(s) to {args.path}.")
+        return 0
+    finally:
+        db.close()
+
+
+def archive(args):
+    """Move old or fully settled history into an archive database and compact the main file."""
+    db = Database(args.db)
+    try:
+        through = db.last_settled_date() if args.settled else args.through
+        if through is None:
+            print("Balances have never all been settled; nothing to archive.")
+            return 0
+        size_before = os.path.getsize(args.db)
+        summary = db.archive(args.archive, through)
+        print(
+            f"Archived {summary['expenses']} expense(s) and {summary['settlements']} settlement(s) "
+            f"dated on or before {through} to {args.archive}."
+        )
+        print(f"Main database shrank from {size_before / 1e6:.1f} MB to {os.path.getsize(args.db) / 1e6:.1f} MB.")
+        return 0
+    finally:
+        db.close()
+
+
+def rates(args):
+    """Sync exchange rates from the local rates file and print them."""
+    db = Database(args.db, rates_file=args.rates_file)
+    try:
+        for code, rate in sorted(db.rates().items()):
+            one = 10 ** currencies.minor_digits(code)
+            print(f"1 {code} = {currencies.format_amount(currencies.convert(one, rate))}")
+        return 0
+    finally:
+        db.close()
+
+
+def list_groups(args):
+    """List every group with its shard file and size."""
+    catalog = GroupCatalog(args.catalog)
+    try:
+        for group_id, name in catalog.list_groups():
+            path = catalog.db_file(group_id)
+            size = os.path.getsize(path) / 1e6 if os.path.exists(path) else 0
+            print(f"{group_id:>4}  {name:<24} {path} ({size:.1f} MB)")
+        return 0
+    finally:
+        catalog.close()
+
+
+def create_group(args):
+    """Register a new group with its own shard file."""
+    catalog = GroupCatalog(args.catalog)
+    try:
+        group_id = catalog.create_group(args.name)
+        print(f"Created group {args.name} (id {group_id}) in {catalog.db_file(group_id)}.")
+        return 0
+    except sqlite3.IntegrityError:
+        print(f"A group called '{args.name}' already exists.")
+        return 1
+    finally:
+        catalog.close()
+
+
+def main(argv=None):
+    """Run maintenance commands against the expense database."""
+    parser = argparse.ArgumentParser(description="Expense Splitter maintenance commands")
+    parser.add_argument("--db", default="expense_splitter.db", help="path to the SQLite database")
+    parser.add_argument("--group", help="work on this group's shard instead of --db")
+    parser.add_argument("--catalog", default=CATALOG_FILE, help="path to the group catalog database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    verify_parser = subparsers.add_parser("verify-balances", help="compare the balance ledger and pair debts with the raw history")
+    verify_parser.add_argument("--rebuild", action="store_true", help="recompute the ledger from the raw history")
+    verify_parser.set_defaults(func=verify_balances)
+
+    rollup_parser = subparsers.add_parser("rebuild-rollups", help="regenerate the monthly spending rollups")
+    rollup_parser.set_defaults(func=rebuild_rollups)
+
+    migrate_parser = subparsers.add_parser("migrate", help="apply pending schema migrations")
+    migrate_parser.set_defaults(func=migrate)
+
+    explain_parser = subparsers.add_parser("explain", help="check that every app query uses an index")
+    explain_parser.set_defaults(func=explain)
+
+    import_parser = subparsers.add_parser("import", help="bulk import expenses from a CSV or JSONL file")
+    import_parser.add_argument("path", help="CSV or JSONL file to import")
+    import_parser.add_argument("--batch-size", type=int, default=1000, help="expenses per transaction")
+    import_parser.add_argument("--reject-file", help="where to write rejected rows as JSON lines")
+    import_parser.add_argument("--create-persons", action="store_true", help="add unknown payers and friends")
+    import_parser.set_defaults(func=import_expenses)
+
+    checkpoint_parser = subparsers.add_parser("checkpoint", help="snapshot balances for fast as-of queries")
+    checkpoint_parser.add_argument("--as-of", type=cutoff_date, help="YYYY-MM-DD to snapshot (default: yesterday)")
+    checkpoint_parser.set_defaults(func=checkpoint)
+
+    export_parser = subparsers.add_parser("export", help="export expenses and splits to CSV or Parquet")
+    export_parser.add_argument("path", help="output file, .csv or .parquet")
+    export_parser.add_argument("--format", choices=["csv", "parquet"], help="output format (default: from the extension)")
+    export_parser.add_argument("--chunk-size", type=int, default=10000, help="rows read and written at a time")
+    export_parser.set_defaults(func=export)
+
+    archive_parser = subparsers.add_parser("archive", help="move old history to an archive database")
+    archive_parser.add_argument("--archive", default="expense_splitter_archive.db", help="archive database to move rows into")
+    cutoff = archive_parser.add_mutually_exclusive_group(required=True)
+    cutoff.add_argument("--through", type=cutoff_date, help="archive everything dated on or before this YYYY-MM-DD")
+    cutoff.add_argument("--settled", action="store_true", help="archive up to the last day everyone was settled")
+    archive_parser.set_defaults(func=archive)
+
+    rates_parser = subparsers.add_parser("rates", help="sync exchange rates from the rates file and list them")
+    rates_parser.add_argument("--rates-file", default=currencies.RATES_FILE, help="CSV of currency,rate rows")
+    rates_parser.set_defaults(func=rates)
+
+    groups_parser = subparsers.add_parser("groups", help="list groups and their shard files")
+    groups_parser.set_defaults(func=list_groups)
+
+    create_group_parser = subparsers.add_parser("create-group", help="add a group with its own shard file")
+    create_group_parser.add_argument("name", help="name of the new group")
+    create_group_parser.set_defaults(func=create_group)
+
+    args = parser.parse_args(argv)
+    if args.group:
+        catalog = GroupCatalog(args.catalog)
+        try:
+            group_id = catalog.group_id(args.group)
+            if group_id is None:
+                parser.error(f"no group called '{args.group}'")
+            args.db = catalog.db_file(group_id)
+        finally:
+            catalog.close()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
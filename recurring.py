@@ -0,0 +1,73 @@
+import calendar
+import re
+from datetime import date, timedelta
+
+# How often a recurring expense repeats
+WEEKLY = "weekly"
+MONTHLY = "monthly"
+YEARLY = "yearly"
+CADENCES = [WEEKLY, MONTHLY, YEARLY]
+
+# Months between occurrences of the month-based cadences
+CADENCE_MONTHS = {MONTHLY: 1, YEARLY: 12}
+
+# Occurrences that are not stored get the negative id -(recurring id * OCCURRENCE_ID_SPAN + occurrence),
+# so they sort and page alongside stored expenses without ever clashing with a real id
+OCCURRENCE_ID_SPAN = 1_000_000
+
+
+def occurrence_date(start, cadence, n):
+    """Return the date of occurrence `n` (0 is `start`). Monthly dates past a month's end fall on its last day."""
+    if cadence == WEEKLY:
+        return start + timedelta(weeks=n)
+    months = start.month - 1 + n * CADENCE_MONTHS[cadence]
+    year, month = start.year + months // 12, months % 12 + 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def occurrence_count(start, cadence, through, end=None):
+    """Return how many occurrences fall on or before `through` (and `end`, if given), in O(1)."""
+    if end is not None and end < through:
+        through = end
+    if through < start:
+        return 0
+    if cadence == WEEKLY:
+        return (through - start).days // 7 + 1
+    months = (through.year - start.year) * 12 + through.month - start.month
+    n = months // CADENCE_MONTHS[cadence]
+    if occurrence_date(start, cadence, n) > through:
+        n -= 1
+    return n + 1
+
+
+def occurrences_by_month(start, cadence, through, end=None):
+    """Return "YYYY-MM" -> how many occurrences fall in that month, up to `through` (and `end`), in O(months)."""
+    counts = {}
+    before = 0
+    year, month = start.year, start.month
+    while (year, month) <= (through.year, through.month):
+        month_end = date(year, month, calendar.monthrange(year, month)[1])
+        upto = occurrence_count(start, cadence, min(month_end, through), end)
+        if upto > before:
+            counts[f"{year:04d}-{month:02d}"] = upto - before
+        before = upto
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return counts
+
+
+def occurrence_id(recurring_id, n):
+    """Return the negative id listings use for an occurrence that is not stored."""
+    return -(recurring_id * OCCURRENCE_ID_SPAN + n)
+
+
+def parse_occurrence_id(expense_id):
+    """Return (recurring id, occurrence) for an id from occurrence_id, or None for a stored expense's id."""
+    if expense_id >= 0:
+        return None
+    return divmod(-expense_id, OCCURRENCE_ID_SPAN)
+
+
+def matches_search(description, text):
+    """Tell whether every word of `text` starts a word of `description`, like the expense search does."""
+    words = [word.lower() for word in re.findall(r"\w+", description)]
+    return all(any(word.startswith(term.lower()) for word in words) for term in re.findall(r"\w+", text or ""))
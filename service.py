@@ -0,0 +1,571 @@
+import sqlite3
+from datetime import datetime
+
+import currencies
+import recurring
+import settlement
+from database import (
+    expense_balance_deltas, expense_pair_deltas, expense_rollup_deltas, fts_query, settlement_pair_deltas,
+)
+
+
+class ExpenseService:
+    def __init__(self, db):
+        """Wrap a Database with the app's data operations, free of any user interface.
+
+        The Streamlit app and the JSON API both work through this class.
+        """
+        self.db = db
+    
+    def report_error(self, message):
+        """Tell the user that a read or write failed. Headless callers only see the empty or False result."""
+    
+    def _submit_all(self, operation, args_list):
+        """Queue `operation` once per argument tuple and return each result, or the exception it raised.
+
+        Everything is queued before the first wait, so the writer commits the
+        operations together in as few transactions as it can.
+        """
+        futures = [self.db.writer.submit(operation, *args) for args in args_list]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except (sqlite3.Error, ValueError, OverflowError) as e:
+                results.append(e)
+        return results
+    
+    def add_person(self, name, wait=True):
+        """Add a new person to the database.
+
+        Like every write it goes through the writer queue; with wait=False the Future is returned instead.
+        """
+        future = self.db.writer.submit(self._insert_person, name)
+        if not wait:
+            return future
+        try:
+            future.result()
+            return True
+        except sqlite3.IntegrityError:
+            return False
+    
+    def _insert_person(self, cursor, name):
+        cursor.execute('INSERT INTO person (name) VALUES (?)', (name,))
+        return cursor.lastrowid
+    
+    def get_all_persons(self):
+        """Get all persons from the database, re-querying only after a write."""
+        def load():
+            cursor = self.db.conn.cursor()
+            cursor.execute('SELECT id, name FROM person ORDER BY name')
+            return cursor.fetchall()
+        return self.db.cached(("persons",), load)
+    
+    def get_all_categories(self):
+        """Get all categories from the database, re-querying only after a write."""
+        def load():
+            cursor = self.db.conn.cursor()
+            cursor.execute('SELECT id, name FROM category ORDER BY name')
+            return cursor.fetchall()
+        return self.db.cached(("categories",), load)
+    
+    def person_names(self):
+        """Get an id -> name dict of all persons for constant-time lookups."""
+        return self.db.cached(("person_names",), lambda: dict(self.get_all_persons()))
+    
+    def category_names(self):
+        """Get an id -> name dict of all categories for constant-time lookups."""
+        return self.db.cached(("category_names",), lambda: dict(self.get_all_categories()))
+    
+    def add_persons(self, names):
+        """Add many persons at once and return each one's id, or the exception that stopped it."""
+        return self._submit_all(self._insert_person, [(name,) for name in names])
+    
+    def add_expense(self, description, amount, date, paid_by, category_id, splits, currency=currencies.BASE_CURRENCY,
+                    wait=True):
+        """Add a new expense and its splits to the database, or return the Future of that if wait=False.
+
+        `amount` and the shares are integer minor units of `currency`, such as paise.
+        """
+        future = self.db.writer.submit(
+            self._insert_expense, description, amount, date, paid_by, category_id, splits, currency
+        )
+        if not wait:
+            return future
+        try:
+            future.result()
+            return True
+        except (sqlite3.Error, ValueError) as e:
+            self.report_error(f"Database error: {str(e)}")
+            return False
+    
+    def _insert_expense(self, cursor, description, amount, date, paid_by, category_id, splits,
+                        currency=currencies.BASE_CURRENCY):
+        return self.db.insert_expense(cursor, description, amount, date, paid_by, category_id, splits, currency)
+
+    def add_expenses(self, expenses):
+        """Add many expenses at once and return each one's id, or the exception that stopped it.
+
+        Each expense is a tuple of add_expense's arguments, from description
+        to currency. A failed expense does not affect the others.
+        """
+        return self._submit_all(self._insert_expense, expenses)
+
+    def add_recurring_expense(self, description, amount, start_date, paid_by, category_id, splits, cadence,
+                              end_date=None, currency=currencies.BASE_CURRENCY, wait=True):
+        """Add a template that repeats an expense every `cadence` from `start_date` until `end_date`, if given.
+
+        Nothing is stored per occurrence; listings and balances expand the template when they are read.
+        """
+        future = self.db.writer.submit(
+            self._insert_recurring, description, amount, start_date, paid_by, category_id, splits, cadence, end_date,
+            currency,
+        )
+        if not wait:
+            return future
+        try:
+            return future.result()
+        except (sqlite3.Error, ValueError):
+            return False
+
+    def _insert_recurring(self, cursor, description, amount, start_date, paid_by, category_id, splits, cadence,
+                          end_date, currency):
+        # Occurrences on or before the archive cutoff would land in archived history
+        self.db.check_not_archived(cursor, start_date)
+        # Every occurrence is converted at the rate of the day the template was added
+        rate = self.db.current_rate(currency)
+        base_amount = sum(currencies.convert_shares(splits, rate).values())
+        cursor.execute('''
+            INSERT INTO recurring_expense (description, amount, currency, rate, base_amount, paid_by, category_id,
+                                           cadence, start_date, end_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (description, amount, currency, rate, base_amount, paid_by, category_id, cadence, start_date, end_date))
+        recurring_id = cursor.lastrowid
+        cursor.executemany('''
+            INSERT INTO recurring_split (recurring_id, person_id, share_amount) VALUES (?, ?, ?)
+        ''', [(recurring_id, person_id, share_amount) for person_id, share_amount in splits.items()])
+        return recurring_id
+
+    def end_recurring_expense(self, recurring_id, end_date):
+        """Stop a recurring expense after `end_date`; occurrences up to then are kept."""
+        try:
+            self.db.writer.submit(self._end_recurring, recurring_id, end_date).result()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _end_recurring(self, cursor, recurring_id, end_date):
+        cursor.execute('UPDATE recurring_expense SET end_date = ? WHERE id = ?', (end_date, recurring_id))
+
+    def get_currencies(self):
+        """Get the codes of every currency with an exchange rate, the base currency first."""
+        return sorted(self.db.rates(), key=lambda code: (code != currencies.BASE_CURRENCY, code))
+
+    def get_recurring_expenses(self):
+        """Get every recurring expense template as a dict, oldest first."""
+        return self.db.recurring_expenses()
+
+    def edit_occurrence(self, expense_id, amount):
+        """Store a listed recurring occurrence as a real expense of `amount`, split in the template's proportions.
+
+        `amount` is in minor units of the template's currency. Returns the new
+        expense's id, or False if it could not be stored.
+        """
+        import splits
+
+        recurring_id, occurrence = recurring.parse_occurrence_id(expense_id)
+        template = next((t for t in self.get_recurring_expenses() if t['id'] == recurring_id), None)
+        if template is None:
+            return False
+        minor = splits.split_minor(amount, splits.SHARES, list(template['splits'].values()))
+        shares = dict(zip(template['splits'], minor.tolist()))
+        try:
+            return self.db.writer.submit(
+                self.db.materialize_occurrence, recurring_id, occurrence, amount, shares
+            ).result()
+        except (sqlite3.Error, ValueError):
+            return False
+
+    def _occurrence_rows(self, person_id, category_id, date_from, date_to, after, limit, search):
+        """Expand the recurring expenses into up to `limit` listing rows per template, newest first.
+
+        Only occurrences up to today that are not stored as expenses are
+        returned, each with the negative id from recurring.occurrence_id so it
+        pages with the stored expenses on the same (date, id) keyset.
+        """
+        through = datetime.now().strftime("%Y-%m-%d")
+        if date_to is not None:
+            through = min(through, date_to)
+        if after is not None:
+            through = min(through, after[0])
+        through = datetime.strptime(through, "%Y-%m-%d").date()
+
+        person_names = self.person_names()
+        category_names = self.category_names()
+        cursor = self.db.conn.cursor()
+        rows = []
+        for template in self.get_recurring_expenses():
+            if person_id is not None and template['paid_by'] != person_id:
+                continue
+            if category_id is not None and template['category_id'] != category_id:
+                continue
+            if search and not recurring.matches_search(template['description'], search):
+                continue
+
+            due = recurring.occurrence_count(template['start'], template['cadence'], through, template['end'])
+            stored = self.db.stored_occurrences(cursor, template['id'], due - 1)
+            found = 0
+            for occurrence in range(due - 1, -1, -1):
+                if found == limit:
+                    break
+                day = recurring.occurrence_date(template['start'], template['cadence'], occurrence).isoformat()
+                if date_from is not None and day < date_from:
+                    break
+                row_id = recurring.occurrence_id(template['id'], occurrence)
+                if occurrence in stored or (after is not None and (day, row_id) >= tuple(after)):
+                    continue
+                rows.append((row_id, template['description'], template['amount'], day,
+                             person_names[template['paid_by']], category_names.get(template['category_id']),
+                             template['currency']))
+                found += 1
+        return rows
+
+    def get_all_expenses(self):
+        """Get all expenses with their payer information."""
+        cursor = self.db.conn.cursor()
+        try:
+            cursor.execute('''
+                SELECT e.id, e.description, e.amount, e.date, p.name, c.name, e.currency
+                FROM expense e
+                JOIN person p ON e.paid_by = p.id
+                LEFT JOIN category c ON e.category_id = c.id
+                ORDER BY e.date DESC
+            ''')
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            self.report_error(f"Error fetching expenses: {str(e)}")
+            return []
+
+    def _expense_filters(self, person_id=None, category_id=None, date_from=None, date_to=None, search=None):
+        """Build the SQL conditions and parameters shared by the expense listing queries."""
+        conditions = []
+        params = []
+        if person_id is not None:
+            conditions.append('e.paid_by = ?')
+            params.append(person_id)
+        if category_id is not None:
+            conditions.append('e.category_id = ?')
+            params.append(category_id)
+        if date_from is not None:
+            conditions.append('e.date >= ?')
+            params.append(date_from)
+        if date_to is not None:
+            conditions.append('e.date <= ?')
+            params.append(date_to)
+        if search:
+            conditions.append('e.id IN (SELECT rowid FROM expense_fts WHERE expense_fts MATCH ?)')
+            params.append(search)
+        return conditions, params
+
+    def get_expenses(self, person_id=None, category_id=None, date_from=None, date_to=None, after=None, limit=50,
+                     search=None):
+        """Get one page of expenses, newest first, filtered in SQL.
+
+        `after` is the (date, id) of the last row of the previous page; only older rows are returned.
+        `search` is free text matched against descriptions by prefix. Recurring occurrences
+        due by today are merged in on the same order.
+        """
+        text = search
+        search = fts_query(search)
+        conditions, params = self._expense_filters(person_id, category_id, date_from, date_to, search)
+        if after is not None:
+            conditions.append('(e.date, e.id) < (?, ?)')
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        def load():
+            cursor = self.db.conn.cursor()
+            cursor.execute(f'''
+                SELECT e.id, e.description, e.amount, e.date, p.name, c.name, e.currency
+                FROM expense e
+                JOIN person p ON e.paid_by = p.id
+                LEFT JOIN category c ON e.category_id = c.id
+                {where}
+                ORDER BY e.date DESC, e.id DESC
+                LIMIT ?
+            ''', params + [limit])
+            rows = cursor.fetchall()
+            rows.extend(self._occurrence_rows(person_id, category_id, date_from, date_to, after, limit, text))
+            rows.sort(key=lambda row: (row[3], row[0]), reverse=True)
+            return rows[:limit]
+
+        try:
+            # Which occurrences are due depends on the day, not only on the data
+            key = ("expenses", person_id, category_id, date_from, date_to, tuple(after or ()), limit, search,
+                   datetime.now().strftime("%Y-%m-%d"))
+            return self.db.cached(key, load)
+        except sqlite3.Error as e:
+            self.report_error(f"Error fetching expenses: {str(e)}")
+            return []
+
+    def search_expenses(self, text, person_id=None, category_id=None, date_from=None, date_to=None, limit=50):
+        """Get the expenses whose description best matches `text`, most relevant first.
+
+        Only stored expenses are ranked: occurrences of recurring expenses that
+        are not stored have no full-text entry to score.
+        """
+        search = fts_query(text)
+        if not search:
+            return []
+        conditions, params = self._expense_filters(person_id, category_id, date_from, date_to)
+        conditions.insert(0, 'expense_fts MATCH ?')
+        params.insert(0, search)
+
+        def load():
+            cursor = self.db.conn.cursor()
+            cursor.execute(f'''
+                SELECT e.id, e.description, e.amount, e.date, p.name, c.name, e.currency
+                FROM expense_fts f
+                JOIN expense e ON e.id = f.rowid
+                JOIN person p ON e.paid_by = p.id
+                LEFT JOIN category c ON e.category_id = c.id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY f.rank
+                LIMIT ?
+            ''', params + [limit])
+            return cursor.fetchall()
+
+        try:
+            key = ("search", search, person_id, category_id, date_from, date_to, limit)
+            return self.db.cached(key, load)
+        except sqlite3.Error as e:
+            self.report_error(f"Error searching expenses: {str(e)}")
+            return []
+
+    def delete_expense(self, expense_id, wait=True):
+        """Delete an expense from the database, or return the Future of that if wait=False.
+
+        Deleting a recurring occurrence skips it, leaving the rest of the series alone.
+        """
+        future = self.db.writer.submit(self._remove_expense, expense_id)
+        if not wait:
+            return future
+        try:
+            return future.result()
+        except sqlite3.Error:
+            return False
+
+    def delete_expenses(self, expense_ids):
+        """Delete many expenses at once and return, for each, whether it existed or the exception it raised."""
+        return self._submit_all(self._remove_expense, [(expense_id,) for expense_id in expense_ids])
+
+    def _remove_expense(self, cursor, expense_id):
+        occurrence = recurring.parse_occurrence_id(expense_id)
+        if occurrence is not None:
+            # Only a listed occurrence can be skipped: one of an existing template, due by today, with no row yet
+            recurring_id, n = occurrence
+            templates = self.db.load_recurring_expenses(cursor, recurring_id)
+            if not templates:
+                return False
+            template = templates[0]
+            due = recurring.occurrence_count(template['start'], template['cadence'], datetime.now().date(), template['end'])
+            if n >= due or n in self.db.stored_occurrences(cursor, recurring_id, n):
+                return False
+            # A row with no expense keeps the occurrence out of listings and balances
+            cursor.execute('''
+                INSERT INTO recurring_occurrence (recurring_id, occurrence, expense_id) VALUES (?, ?, NULL)
+            ''', occurrence)
+            return True
+
+        cursor.execute('SELECT paid_by, date, category_id, base_amount FROM expense WHERE id = ?', (expense_id,))
+        expense = cursor.fetchone()
+        if expense is None:
+            return False
+        paid_by, date, category_id, amount = expense
+
+        # The shares exactly as the ledgers counted them, already in base minor units
+        cursor.execute('SELECT person_id, amount FROM expense_share_base WHERE expense_id = ?', (expense_id,))
+        splits = {}
+        for person_id, share_amount in cursor.fetchall():
+            splits[person_id] = splits.get(person_id, 0) + share_amount
+
+        cursor.execute('DELETE FROM expense_split WHERE expense_id = ?', (expense_id,))
+        cursor.execute('DELETE FROM expense WHERE id = ?', (expense_id,))
+        # A deleted occurrence of a recurring expense stays skipped instead of coming back
+        cursor.execute('UPDATE recurring_occurrence SET expense_id = NULL WHERE expense_id = ?', (expense_id,))
+
+        # Reverse the expense's effect on the balance ledger in the same transaction
+        self.db.apply_balance_deltas(cursor, expense_balance_deltas(paid_by, amount, splits, sign=-1))
+        self.db.apply_pair_deltas(cursor, expense_pair_deltas(paid_by, splits, sign=-1))
+        self.db.apply_rollup_deltas(cursor, expense_rollup_deltas(date, category_id, paid_by, amount, sign=-1))
+        self.db.invalidate_checkpoints(cursor, date)
+        return True
+
+    def record_settlements(self, payments, date, currency=currencies.BASE_CURRENCY):
+        """Record (payer_id, payee_id, amount in minor units of `currency`) payments as append-only settlement rows."""
+        try:
+            self.db.writer.submit(self._insert_settlements, payments, date, currency).result()
+        except (sqlite3.Error, ValueError):
+            return False
+        
+        self.db.checkpoint_if_due(datetime.strptime(date, "%Y-%m-%d").date())
+        return True
+    
+    def _insert_settlements(self, cursor, payments, date, currency=currencies.BASE_CURRENCY):
+        self.db.check_not_archived(cursor, date)
+        rate = self.db.current_rate(currency)
+        deltas = {}
+        pair_deltas = {}
+        for payer_id, payee_id, amount in payments:
+            cursor.execute('''
+                INSERT INTO settlement (payer_id, payee_id, amount, currency, rate, date)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (payer_id, payee_id, amount, currency, rate, date))
+            amount = currencies.convert(amount, rate)
+            # Paying off a debt raises the payer's balance and lowers the payee's
+            deltas[payer_id] = deltas.get(payer_id, 0) + amount
+            deltas[payee_id] = deltas.get(payee_id, 0) - amount
+            for pair, delta in settlement_pair_deltas(payer_id, payee_id, amount).items():
+                pair_deltas[pair] = pair_deltas.get(pair, 0) + delta
+        
+        self.db.apply_balance_deltas(cursor, deltas)
+        self.db.apply_pair_deltas(cursor, pair_deltas)
+        self.db.invalidate_checkpoints(cursor, date)
+    
+    def mark_person_settled(self, person_id, date, mode=settlement.AUTO):
+        """Record the payments from the `mode` settlement plan that bring one person's balance to zero."""
+        balances = {pid: data['balance'] for pid, data in self.calculate_balances().items()}
+        pair_debts = self.get_all_pair_debts() if mode == settlement.PAIRWISE else None
+        payments = [
+            (debtor_id, creditor_id, amount)
+            for debtor_id, creditor_id, amount in settlement.settle(balances, mode, pair_debts)
+            if person_id in (debtor_id, creditor_id)
+        ]
+        if not payments:
+            return True
+        return self.record_settlements(payments, date)
+    
+    def get_recent_settlements(self, limit=20):
+        """Get the latest recorded settlement payments, newest first."""
+        def load():
+            cursor = self.db.conn.cursor()
+            cursor.execute('''
+                SELECT s.date, payer.name, payee.name, s.amount, s.currency
+                FROM settlement s
+                JOIN person payer ON s.payer_id = payer.id
+                JOIN person payee ON s.payee_id = payee.id
+                ORDER BY s.date DESC, s.id DESC
+                LIMIT ?
+            ''', (limit,))
+            return cursor.fetchall()
+        return self.db.cached(("settlements", limit), load)
+    
+    def calculate_balances(self, as_of=None):
+        """Read every person's current balance from the ledger, or their balance at the end of `as_of`.
+
+        Balances are integer minor units of the base currency. Recurring
+        occurrences due by then are added in closed form.
+        """
+        if as_of is not None:
+            def load_as_of():
+                history = self.db.balances_as_of(as_of)
+                for person_id, delta in self.db.recurring_deltas(as_of)[0].items():
+                    history[person_id] = history.get(person_id, 0) + delta
+                return {
+                    person_id: {'name': name, 'balance': history.get(person_id, 0)}
+                    for person_id, name in self.person_names().items()
+                }
+            return self.db.cached(("balances", as_of), load_as_of)
+        
+        def load():
+            cursor = self.db.conn.cursor()
+            cursor.execute('''
+                SELECT p.id, p.name, COALESCE(b.balance, 0)
+                FROM person p
+                LEFT JOIN person_balance b ON b.person_id = p.id
+            ''')
+
+            balances = {}
+            for person_id, person_name, balance in cursor.fetchall():
+                balances[person_id] = {'name': person_name, 'balance': balance}
+
+            # Recurring occurrences due by today that are not stored as expenses
+            for person_id, delta in self.db.recurring_deltas(today)[0].items():
+                if person_id in balances:
+                    balances[person_id]['balance'] += delta
+            return balances
+        today = datetime.now().strftime("%Y-%m-%d")
+        return self.db.cached(("balances", today), load)
+    
+    def get_spending_rollup(self, month_from="0000-00", month_to="9999-99"):
+        """Get (month, category, payer, total in base minor units, expenses) spending totals for the months in a range.
+
+        Recurring occurrences due by today that are not stored as expenses are counted in.
+        """
+        today = datetime.now().strftime("%Y-%m-%d")
+
+        def load():
+            cursor = self.db.conn.cursor()
+            cursor.execute('''
+                SELECT r.month, COALESCE(c.name, 'Uncategorized'), p.name, r.total, r.expenses
+                FROM spending_rollup r
+                JOIN person p ON p.id = r.paid_by
+                LEFT JOIN category c ON c.id = r.category_id
+                WHERE r.month >= ? AND r.month <= ?
+                ORDER BY r.month
+            ''', (month_from, month_to))
+            totals = {row[:3]: row[3:] for row in cursor.fetchall()}
+
+            person_names = self.person_names()
+            category_names = self.category_names()
+            for (month, category_id, paid_by), (total, expenses) in self.db.recurring_rollup_deltas(today).items():
+                if month_from <= month <= month_to:
+                    key = (month, category_names.get(category_id, 'Uncategorized'), person_names[paid_by])
+                    before = totals.get(key, (0, 0))
+                    totals[key] = (before[0] + total, before[1] + expenses)
+            return sorted(key + change for key, change in totals.items())
+        return self.db.cached(("spending_rollup", month_from, month_to, today), load)
+    
+    def get_pair_debts(self, person_id):
+        """Get (friend id, friend name, amount) for everyone `person_id` owes (amount > 0) or is owed by (amount < 0).
+
+        Reads one primary key range of the pair debt table, so the cost
+        depends on how many friends the person shares expenses with, not on
+        the length of the history. Recurring occurrences due by today are added.
+        """
+        def load():
+            cursor = self.db.conn.cursor()
+            cursor.execute('SELECT other_id, amount FROM pair_debt WHERE person_id = ?', (person_id,))
+            debts = dict(cursor.fetchall())
+            for (debtor_id, other_id), delta in self.db.recurring_deltas(today)[1].items():
+                if debtor_id == person_id:
+                    debts[other_id] = debts.get(other_id, 0) + delta
+            person_names = self.person_names()
+            rows = [(other_id, person_names[other_id], amount) for other_id, amount in debts.items() if amount]
+            return sorted(rows, key=lambda row: row[2], reverse=True)
+        today = datetime.now().strftime("%Y-%m-%d")
+        return self.db.cached(("pair_debts", person_id, today), load)
+    
+    def get_all_pair_debts(self):
+        """Get {(debtor id, creditor id): amount} for every pair where one person still owes the other."""
+        def load():
+            cursor = self.db.conn.cursor()
+            cursor.execute('SELECT person_id, other_id, amount FROM pair_debt')
+            debts = {(person_id, other_id): amount for person_id, other_id, amount in cursor.fetchall()}
+            for pair, delta in self.db.recurring_deltas(today)[1].items():
+                debts[pair] = debts.get(pair, 0) + delta
+            return {pair: amount for pair, amount in debts.items() if amount > 0}
+        today = datetime.now().strftime("%Y-%m-%d")
+        return self.db.cached(("pair_debts", today), load)
+    
+    def calculate_settlements(self, balances, mode=settlement.AUTO):
+        """Calculate (debtor, creditor, amount in base minor units) transactions using the chosen settlement algorithm."""
+        # Balances are already integer minor units, so no floating point threshold is needed
+        minor_balances = {person_id: data['balance'] for person_id, data in balances.items()}
+        pair_debts = self.get_all_pair_debts() if mode == settlement.PAIRWISE else None
+        
+        transactions = []
+        for debtor_id, creditor_id, amount in settlement.settle(minor_balances, mode, pair_debts):
+            transactions.append((balances[debtor_id]['name'], balances[creditor_id]['name'], amount))
+        
+        return transactions
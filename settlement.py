@@ -0,0 +1,229 @@
+import heapq
+
+# Settlement algorithms
+GREEDY = "greedy"
+EXACT = "exact"
+HEURISTIC = "heuristic"
+AUTO = "auto"
+PAIRWISE = "pairwise"
+SETTLEMENT_MODES = [AUTO, GREEDY, EXACT, HEURISTIC, PAIRWISE]
+
+# Largest group the exact algorithm accepts; its cost grows as 2^n
+EXACT_MAX_PEOPLE = 15
+
+
+def split_balances(balances):
+    """Split id -> minor-unit balances into creditor and debtor dicts of positive amounts."""
+    creditors = {}
+    debtors = {}
+    for person_id, balance in balances.items():
+        if balance > 0:
+            creditors[person_id] = balance
+        elif balance < 0:
+            debtors[person_id] = -balance
+    return creditors, debtors
+
+
+def settle_greedy(balances):
+    """Match the largest creditors with the largest debtors in a single sorted pass."""
+    creditors, debtors = split_balances(balances)
+    creditors = sorted(creditors.items(), key=lambda x: x[1], reverse=True)
+    debtors = sorted(debtors.items(), key=lambda x: x[1], reverse=True)
+
+    transfers = []
+    i, j = 0, 0
+    while i < len(creditors) and j < len(debtors):
+        creditor_id, amount_to_receive = creditors[i]
+        debtor_id, amount_to_pay = debtors[j]
+
+        amount = min(amount_to_receive, amount_to_pay)
+        transfers.append((debtor_id, creditor_id, amount))
+
+        creditors[i] = (creditor_id, amount_to_receive - amount)
+        debtors[j] = (debtor_id, amount_to_pay - amount)
+
+        if creditors[i][1] == 0:
+            i += 1
+        if debtors[j][1] == 0:
+            j += 1
+
+    return transfers
+
+
+def settle_exact(balances):
+    """Return the minimum number of transfers by splitting people into the most zero-sum subgroups.
+
+    A zero-sum subgroup of k people always settles in k - 1 transfers, so the
+    fewest transfers overall comes from the partition with the most subgroups.
+    """
+    people = [(person_id, balance) for person_id, balance in balances.items() if balance != 0]
+    n = len(people)
+    if n > EXACT_MAX_PEOPLE:
+        raise ValueError(f"exact settlement supports at most {EXACT_MAX_PEOPLE} people with a balance, got {n}")
+
+    full = (1 << n) - 1
+    sums = [0] * (full + 1)
+    # groups[mask]: most zero-sum prefixes reachable when adding the people in mask one by one
+    groups = [0] * (full + 1)
+    last_added = [0] * (full + 1)
+    for mask in range(1, full + 1):
+        lowest = (mask & -mask).bit_length() - 1
+        sums[mask] = sums[mask & (mask - 1)] + people[lowest][1]
+
+        best, best_i = -1, 0
+        rest = mask
+        while rest:
+            i = (rest & -rest).bit_length() - 1
+            rest &= rest - 1
+            if groups[mask ^ (1 << i)] > best:
+                best, best_i = groups[mask ^ (1 << i)], i
+        groups[mask] = best + (1 if sums[mask] == 0 else 0)
+        last_added[mask] = best_i
+
+    # Replay the best order backwards and cut it wherever the remaining people sum to zero
+    subgroups = []
+    current = {}
+    mask = full
+    while mask:
+        i = last_added[mask]
+        person_id, balance = people[i]
+        current[person_id] = balance
+        mask ^= 1 << i
+        if sums[mask] == 0:
+            subgroups.append(current)
+            current = {}
+
+    transfers = []
+    for subgroup in subgroups:
+        transfers.extend(settle_greedy(subgroup))
+    return transfers
+
+
+def settle_heuristic(balances):
+    """Settle large groups in O(n log n): cancel exactly matching pairs, then match largest-first.
+
+    After every partial transfer the leftover amount is checked against the
+    other side, so exact matches created along the way are used straight away.
+    """
+    creditors, debtors = split_balances(balances)
+    transfers = []
+
+    # People waiting for a transfer, indexed by the amount they still need
+    creditors_by_amount = {}
+    for person_id, amount in creditors.items():
+        creditors_by_amount.setdefault(amount, set()).add(person_id)
+    debtors_by_amount = {}
+    for person_id, amount in debtors.items():
+        debtors_by_amount.setdefault(amount, set()).add(person_id)
+
+    def take(by_amount, amount):
+        ids = by_amount.get(amount)
+        if not ids:
+            return None
+        person_id = ids.pop()
+        if not ids:
+            del by_amount[amount]
+        return person_id
+
+    def discard(by_amount, amount, person_id):
+        ids = by_amount[amount]
+        ids.discard(person_id)
+        if not ids:
+            del by_amount[amount]
+
+    # Pairs that cancel out exactly need one transfer each
+    for debtor_id, amount in list(debtors.items()):
+        creditor_id = take(creditors_by_amount, amount)
+        if creditor_id is not None:
+            transfers.append((debtor_id, creditor_id, amount))
+            del creditors[creditor_id]
+            del debtors[debtor_id]
+            discard(debtors_by_amount, amount, debtor_id)
+
+    # Max-heaps with lazy deletion: entries whose amount is stale are skipped
+    creditor_heap = [(-amount, person_id) for person_id, amount in creditors.items()]
+    debtor_heap = [(-amount, person_id) for person_id, amount in debtors.items()]
+    heapq.heapify(creditor_heap)
+    heapq.heapify(debtor_heap)
+
+    def pop_largest(heap, remaining):
+        while heap:
+            amount, person_id = heapq.heappop(heap)
+            if remaining.get(person_id) == -amount:
+                return person_id
+        return None
+
+    while True:
+        creditor_id = pop_largest(creditor_heap, creditors)
+        debtor_id = pop_largest(debtor_heap, debtors)
+        if creditor_id is None or debtor_id is None:
+            break
+
+        to_receive = creditors.pop(creditor_id)
+        to_pay = debtors.pop(debtor_id)
+        discard(creditors_by_amount, to_receive, creditor_id)
+        discard(debtors_by_amount, to_pay, debtor_id)
+        amount = min(to_receive, to_pay)
+        transfers.append((debtor_id, creditor_id, amount))
+
+        if to_receive > to_pay:
+            left = to_receive - to_pay
+            match = take(debtors_by_amount, left)
+            if match is not None:
+                transfers.append((match, creditor_id, left))
+                del debtors[match]
+            else:
+                creditors[creditor_id] = left
+                creditors_by_amount.setdefault(left, set()).add(creditor_id)
+                heapq.heappush(creditor_heap, (-left, creditor_id))
+        elif to_pay > to_receive:
+            left = to_pay - to_receive
+            match = take(creditors_by_amount, left)
+            if match is not None:
+                transfers.append((debtor_id, match, left))
+                del creditors[match]
+            else:
+                debtors[debtor_id] = left
+                debtors_by_amount.setdefault(left, set()).add(debtor_id)
+                heapq.heappush(debtor_heap, (-left, debtor_id))
+
+    return transfers
+
+
+def settle_pairwise(pair_debts):
+    """Pay back every (debtor_id, creditor_id) -> minor-unit debt directly, largest first.
+
+    Nobody ends up paying someone they never shared an expense with, at the
+    cost of more transfers than netting the balances would need.
+    """
+    transfers = [
+        (debtor_id, creditor_id, amount)
+        for (debtor_id, creditor_id), amount in pair_debts.items()
+        if amount > 0
+    ]
+    transfers.sort(key=lambda transfer: transfer[2], reverse=True)
+    return transfers
+
+
+SETTLEMENT_ALGORITHMS = {
+    GREEDY: settle_greedy,
+    EXACT: settle_exact,
+    HEURISTIC: settle_heuristic,
+}
+
+
+def settle(balances, mode=AUTO, pair_debts=None):
+    """Return (debtor_id, creditor_id, amount) transfers for id -> minor-unit balances.
+
+    AUTO uses the exact algorithm when it is small enough and the heuristic otherwise.
+    PAIRWISE ignores the balances and settles the (debtor_id, creditor_id) -> minor-unit
+    `pair_debts` instead.
+    """
+    if mode == PAIRWISE:
+        if pair_debts is None:
+            raise ValueError("pairwise settlement needs the pair debts")
+        return settle_pairwise(pair_debts)
+    if mode == AUTO:
+        people_with_balance = sum(1 for balance in balances.values() if balance != 0)
+        mode = EXACT if people_with_balance <= EXACT_MAX_PEOPLE else HEURISTIC
+    return SETTLEMENT_ALGORITHMS[mode](balances)
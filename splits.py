@@ -0,0 +1,88 @@
+import numpy as np
+
+import currencies
+
+# Ways of dividing an expense between the people involved
+EQUAL = "equal"
+PERCENTAGE = "percentage"
+SHARES = "shares"
+EXACT = "exact"
+SPLIT_METHODS = [EQUAL, PERCENTAGE, SHARES, EXACT]
+
+# Slack allowed when percentages are checked against 100
+PERCENT_TOLERANCE = 0.01
+
+
+def allocate(total_minor, weights):
+    """Divide integer minor units in proportion to weights, handing leftover units to the largest remainders.
+
+    The result always sums to exactly `total_minor`. Ties go to the earlier person.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(weights) == 0:
+        raise ValueError("no one to split with")
+    if (weights < 0).any() or not np.isfinite(weights).all():
+        raise ValueError("split values can't be negative")
+    weight_total = weights.sum()
+    if weight_total <= 0:
+        raise ValueError("split values must add up to more than zero")
+
+    exact = total_minor * weights / weight_total
+    minor = np.floor(exact).astype(np.int64)
+    leftover = int(total_minor - minor.sum())
+    if leftover > 0:
+        order = np.argsort(minor - exact, kind="stable")
+        minor[order[:leftover]] += 1
+    return minor
+
+
+def split_minor(total_minor, method=EQUAL, values=None, count=None):
+    """Return each person's share in minor units, in one vectorized pass.
+
+    `values` holds one number per person: a percentage, a weight or an exact
+    amount in minor units, depending on `method`; None means `count` blanks.
+    NaN marks a blank value: blank weights count as 1, and blank percentages
+    or amounts share whatever the filled-in ones leave over equally.
+    """
+    values = np.full(count, np.nan) if values is None else np.asarray(values, dtype=np.float64)
+    if method == EQUAL:
+        return allocate(total_minor, np.ones(len(values)))
+
+    blank = np.isnan(values)
+    if (values[~blank] < 0).any():
+        raise ValueError("split values can't be negative")
+
+    if method == SHARES:
+        return allocate(total_minor, np.where(blank, 1.0, values))
+
+    if method == PERCENTAGE:
+        remaining = 100 - values[~blank].sum()
+        if remaining < -PERCENT_TOLERANCE or (not blank.any() and abs(remaining) > PERCENT_TOLERANCE):
+            raise ValueError(f"percentages add up to {100 - remaining:g}%, not 100%")
+        if blank.any():
+            values = np.where(blank, max(remaining, 0) / blank.sum(), values)
+        return allocate(total_minor, values)
+
+    if method == EXACT:
+        minor = np.zeros(len(values), dtype=np.int64)
+        minor[~blank] = np.round(values[~blank]).astype(np.int64)
+        remaining = total_minor - minor.sum()
+        if remaining < 0 or (not blank.any() and remaining != 0):
+            raise ValueError(f"split amounts add up to {int(minor.sum())} minor units, not {total_minor}")
+        if blank.any():
+            minor[blank] = allocate(remaining, np.ones(blank.sum())) if remaining else 0
+        return minor
+
+    raise ValueError(f"unknown split method '{method}'")
+
+
+def compute_splits(amount, person_ids, method=EQUAL, values=None, currency=currencies.BASE_CURRENCY):
+    """Return person_id -> share of an expense in integer minor units of `currency`, adding up exactly.
+
+    `amount` is in major units, such as rupees, and so are the `values` of EXACT splits.
+    """
+    person_ids = list(person_ids)
+    if values is not None and method == EXACT:
+        values = np.asarray(values, dtype=np.float64) * 10 ** currencies.minor_digits(currency)
+    minor = split_minor(currencies.to_minor(amount, currency), method, values, count=len(person_ids))
+    return dict(zip(person_ids, minor.tolist()))
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+from service import ExpenseService  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """An empty group database, closed after the test."""
+    db = Database(str(tmp_path / "group.db"))
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def service(db):
+    return ExpenseService(db)
+
+
+@pytest.fixture
+def ann_bob(service):
+    """The ids of two friends, Ann and Bob."""
+    return service.add_persons(["Ann", "Bob"])
+
+
+def balances(service):
+    """Return person_id -> current balance in base minor units."""
+    return {person_id: data["balance"] for person_id, data in service.calculate_balances().items()}
@@ -0,0 +1,136 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from api import MAX_EXPENSES_PAGE_SIZE, ExpenseApiHandler, ExpenseApiServer
+from groups import GroupCatalog
+
+
+@pytest.fixture
+def api(tmp_path):
+    """Serve a fresh catalog on a free port and return a function making (status, body) requests."""
+    catalog = GroupCatalog(
+        str(tmp_path / "catalog.db"), shard_dir=str(tmp_path / "groups"), default_db_file=str(tmp_path / "default.db"),
+    )
+    server = ExpenseApiServer(("127.0.0.1", 0), catalog)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def request(path, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        try:
+            with urllib.request.urlopen(urllib.request.Request(base + path, data=data), timeout=10) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    status, body = request("/persons", {"names": ["Ann", "Bob"]})
+    assert status == 200
+    ann, bob = (result["id"] for result in body["results"])
+    expenses = [
+        {"description": f"Lunch {day}", "amount": 1000, "date": f"2024-05-{day:02d}", "paid_by": ann, "splits": [ann, bob]}
+        for day in range(1, 4)
+    ]
+    assert request("/expenses", {"expenses": expenses})[0] == 200
+    yield request
+    server.shutdown()
+    server.server_close()
+    catalog.close()
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_list_expenses_rejects_limits_below_one(api, limit):
+    status, body = api(f"/expenses?limit={limit}")
+    assert status == 400
+    assert "limit" in body["error"]
+
+
+def test_list_expenses_pages(api):
+    status, body = api("/expenses?limit=2")
+    assert status == 200
+    assert [expense["date"] for expense in body["expenses"]] == ["2024-05-03", "2024-05-02"]
+    status, body = api(f"/expenses?limit=2&after_date={body['next']['after_date']}&after_id={body['next']['after_id']}")
+    assert [expense["date"] for expense in body["expenses"]] == ["2024-05-01"]
+    assert body["next"] is None
+
+    status, body = api(f"/expenses?limit={MAX_EXPENSES_PAGE_SIZE * 10}")
+    assert status == 200
+    assert len(body["expenses"]) == 3
+
+
+@pytest.mark.parametrize("path", [
+    "/balances?as_of=yesterday",
+    "/balances?as_of=2024-02-30",
+    "/expenses?date_from=May",
+    "/expenses?date_to=2024-5-1x",
+    "/expenses?after_date=soon&after_id=1",
+])
+def test_bad_dates_are_rejected(api, path):
+    status, body = api(path)
+    assert status == 400
+    assert "YYYY-MM-DD" in body["error"]
+
+
+def test_balances_as_of(api):
+    status, body = api("/balances?as_of=2024-05-01")
+    assert status == 200
+    assert sorted(entry["balance"] for entry in body["balances"]) == [-500, 500]
+
+
+@pytest.mark.parametrize("path", [
+    "/expenses?person_id=99999999999999999999999",
+    "/expenses?limit=-99999999999999999999999",
+    "/expenses?after_date=2024-05-01&after_id=99999999999999999999999",
+])
+def test_out_of_range_query_integers_are_rejected(api, path):
+    status, body = api(path)
+    assert status == 400
+    assert "between" in body["error"]
+
+
+def test_out_of_range_amounts_and_shares_fail_their_item_only(api):
+    status, body = api("/persons")
+    ann, bob = (person["id"] for person in body["persons"])
+    expenses = [
+        {"description": "Huge", "amount": 10 ** 30, "date": "2024-05-04", "paid_by": ann, "splits": [ann, bob]},
+        {"description": "Huge share", "amount": 1000, "date": "2024-05-04", "paid_by": ann,
+         "splits": {str(ann): 10 ** 30, str(bob): 1000 - 10 ** 30}},
+        {"description": "Fine", "amount": 1000, "date": "2024-05-04", "paid_by": ann, "splits": [ann, bob]},
+    ]
+    status, body = api("/expenses", {"expenses": expenses})
+    assert status == 200
+    assert "at most" in body["results"][0]["error"]
+    assert "error" in body["results"][1]
+    assert "id" in body["results"][2]
+
+
+def test_out_of_range_ids_are_rejected(api):
+    status, body = api("/expenses/delete", {"ids": [10 ** 30]})
+    assert status == 400
+    assert "between" in body["error"]
+
+
+def test_unexpected_errors_are_answered_with_json(api, monkeypatch):
+    def fail(self):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(ExpenseApiHandler, "balances", fail)
+    status, body = api("/balances")
+    assert status == 500
+    assert "boom" in body["error"]
+    # The server keeps answering
+    assert api("/persons")[0] == 200
+
+
+def test_batches_report_overflowing_items_instead_of_raising(service, ann_bob):
+    ann, bob = ann_bob
+    results = service.add_expenses([
+        ("Huge", 10 ** 30, "2024-05-01", ann, None, {ann: 10 ** 30}),
+        ("Fine", 1000, "2024-05-01", ann, None, {ann: 500, bob: 500}),
+    ])
+    assert isinstance(results[0], OverflowError)
+    assert isinstance(results[1], int)
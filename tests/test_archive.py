@@ -0,0 +1,76 @@
+from datetime import date
+
+import pytest
+
+import manage
+from conftest import balances
+
+
+@pytest.fixture
+def archived(tmp_path, db, service, ann_bob):
+    """A group with one expense archived through 2024-04-05 and one after it."""
+    ann, bob = ann_bob
+    assert service.add_expense("Rent", 1000, "2024-03-01", ann, None, {ann: 500, bob: 500})
+    assert service.add_expense("Food", 1000, "2024-04-10", ann, None, {ann: 500, bob: 500})
+    db.archive(str(tmp_path / "archive.db"), "2024-04-05")
+    return db, service, ann, bob
+
+
+def test_archive_keeps_balances(archived):
+    db, service, ann, bob = archived
+    assert balances(service) == {ann: 1000, bob: -1000}
+    assert db.verify_balances() == []
+    assert db.verify_pair_debts() == []
+
+
+@pytest.mark.parametrize("day", ["2024-03-15", "2024-04-05"])
+def test_backdated_payment_is_rejected_before_it_is_stored(archived, day):
+    db, service, ann, bob = archived
+    assert service.record_settlements([(bob, ann, 100)], day) is False
+    assert db.conn.execute('SELECT COUNT(*) FROM settlement').fetchone()[0] == 0
+    assert balances(service) == {ann: 1000, bob: -1000}
+
+
+def test_payment_in_the_month_after_the_cutoff_is_recorded(archived):
+    db, service, ann, bob = archived
+    # The end of last month, 2024-03-31, is archived, so no checkpoint is due
+    assert service.record_settlements([(bob, ann, 100)], "2024-04-20")
+    assert balances(service) == {ann: 900, bob: -900}
+    assert db.checkpoint_if_due(date(2024, 4, 20)) is False
+
+
+def test_backdated_expense_is_rejected(archived):
+    db, service, ann, bob = archived
+    assert service.add_expense("Taxi", 1000, "2024-04-01", ann, None, {ann: 500, bob: 500}) is False
+    assert service.add_recurring_expense("Gym", 1000, "2024-01-01", ann, None, {ann: 500, bob: 500}, "monthly") is False
+    assert db.verify_balances() == []
+
+
+
+@pytest.mark.parametrize("through", ["2024-6-30", "June", "2999-01-01"])
+def test_archive_rejects_cutoffs_that_are_not_past_iso_dates(tmp_path, db, service, ann_bob, through):
+    ann, bob = ann_bob
+    assert service.add_expense("Rent", 1000, "2024-03-01", ann, None, {ann: 500, bob: 500})
+    with pytest.raises(ValueError):
+        db.archive(str(tmp_path / "archive.db"), through)
+    assert db.archived_through() is None
+    assert service.add_expense("Food", 1000, "2024-12-01", ann, None, {ann: 500, bob: 500})
+
+
+def test_checkpoint_rejects_bad_dates(db):
+    for as_of in ["2024-2-29", "2999-01-01"]:
+        with pytest.raises(ValueError):
+            db.create_checkpoint(as_of)
+    assert db.conn.execute('SELECT COUNT(*) FROM balance_checkpoint').fetchone()[0] == 0
+
+
+@pytest.mark.parametrize("command", [
+    ["archive", "--through", "2024-6-30"],
+    ["checkpoint", "--as-of", "2999-01-01"],
+])
+def test_manage_rejects_bad_cutoffs(tmp_path, command, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        manage.main(["--db", str(tmp_path / "group.db")] + command)
+    assert exit_info.value.code == 2
+    err = capsys.readouterr().err
+    assert "YYYY-MM-DD" in err or "in the future" in err
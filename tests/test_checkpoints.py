@@ -0,0 +1,34 @@
+import threading
+from datetime import date
+
+from database import BALANCE_CHANGES_SQL
+
+
+def history_balances(db, as_of):
+    """Balances at the end of `as_of` straight from the rows, ignoring every checkpoint."""
+    return {person_id: delta for person_id, delta in db.conn.execute(BALANCE_CHANGES_SQL, ("", as_of) * 4) if delta}
+
+
+def test_checkpoints_match_history_under_concurrent_writes(db, service, ann_bob):
+    ann, bob = ann_bob
+
+    def add_expenses():
+        for i in range(50):
+            service.add_expense("Coffee", 100 + i, f"2024-0{1 + i % 3}-15", ann, None, {bob: 100 + i})
+
+    writers = [threading.Thread(target=add_expenses) for _ in range(3)]
+    for thread in writers:
+        thread.start()
+    for month in range(30):
+        db.create_checkpoint("2024-02-29")
+        db.checkpoint_if_due(date(2024, 3, 1 + month % 28))
+    for thread in writers:
+        thread.join()
+
+    checkpoints = db.conn.execute('SELECT id, as_of FROM balance_checkpoint').fetchall()
+    for checkpoint_id, as_of in checkpoints:
+        entries = dict(db.conn.execute(
+            'SELECT person_id, balance FROM balance_checkpoint_entry WHERE checkpoint_id = ?', (checkpoint_id,)
+        ).fetchall())
+        assert entries == history_balances(db, as_of)
+    assert db.balances_as_of("2024-02-29") == history_balances(db, "2024-02-29")
@@ -0,0 +1,77 @@
+import csv
+
+import pytest
+
+from exporter import EXPORT_COLUMNS, export_expenses
+
+
+@pytest.fixture
+def expenses(db, service, ann_bob):
+    """Five expenses split between Ann and Bob, then one with no splits."""
+    ann, bob = ann_bob
+    ids = service.add_expenses([
+        (f"Lunch {day}", 1000 + day, f"2024-05-{day:02d}", ann, None, {ann: 500, bob: 500 + day})
+        for day in range(1, 6)
+    ])
+    # The app always stores splits; an expense without any comes out with empty split columns
+    cursor = db.conn.cursor()
+    cursor.execute('''
+        INSERT INTO expense (description, amount, currency, rate, base_amount, date, paid_by)
+        SELECT 'Gift', 700, currency, rate, 700, '2024-05-06', paid_by FROM expense LIMIT 1
+    ''')
+    db.conn.commit()
+    return ids + [cursor.lastrowid]
+
+
+def expected_rows(ids):
+    rows = []
+    for day, expense_id in enumerate(ids[:5], start=1):
+        for name, share in [("Ann", 500), ("Bob", 500 + day)]:
+            rows.append([expense_id, f"2024-05-{day:02d}", f"Lunch {day}", None, "Ann", 1000 + day, "INR", name, share])
+    rows.append([ids[5], "2024-05-06", "Gift", None, "Ann", 700, "INR", None, None])
+    return rows
+
+
+def test_csv_round_trip(tmp_path, db, expenses):
+    path = str(tmp_path / "expenses.csv")
+    assert export_expenses(db, path, chunk_size=3) == 11
+
+    with open(path, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        assert next(reader) == EXPORT_COLUMNS
+        rows = list(reader)
+    # CSV has no types or nulls: numbers come back as text and nulls as empty strings
+    assert rows == [["" if value is None else str(value) for value in row] for row in expected_rows(expenses)]
+
+
+def test_parquet_round_trip(tmp_path, db, expenses):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "expenses.parquet")
+    assert export_expenses(db, path, chunk_size=3) == 11
+
+    parquet = pq.ParquetFile(path)
+    assert parquet.schema_arrow.names == EXPORT_COLUMNS
+    assert parquet.metadata.num_rows == 11
+    # One row group per chunk of rows read from SQLite
+    assert [parquet.metadata.row_group(i).num_rows for i in range(parquet.num_row_groups)] == [3, 3, 3, 2]
+    table = parquet.read()
+    assert [list(row.values()) for row in table.to_pylist()] == expected_rows(expenses)
+
+
+@pytest.mark.parametrize("extension", ["csv", "parquet"])
+def test_empty_export_has_only_the_header(tmp_path, db, extension):
+    if extension == "parquet":
+        pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / f"expenses.{extension}")
+    assert export_expenses(db, path) == 0
+    if extension == "parquet":
+        assert pq.read_table(path).column_names == EXPORT_COLUMNS
+        assert pq.read_table(path).num_rows == 0
+    else:
+        with open(path, encoding="utf-8") as f:
+            assert f.read().splitlines() == [",".join(EXPORT_COLUMNS)]
+
+
+def test_unknown_format_is_rejected(tmp_path, db):
+    with pytest.raises(ValueError, match="unknown export format"):
+        export_expenses(db, str(tmp_path / "expenses.xlsx"))
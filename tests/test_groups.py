@@ -0,0 +1,49 @@
+import threading
+
+from groups import GroupCatalog
+from service import ExpenseService
+
+
+def make_catalog(tmp_path, max_open):
+    return GroupCatalog(
+        str(tmp_path / "catalog.db"), shard_dir=str(tmp_path / "groups"),
+        default_db_file=str(tmp_path / "default.db"), max_open=max_open,
+    )
+
+
+def test_leased_shard_is_not_closed_under_its_thread(tmp_path):
+    catalog = make_catalog(tmp_path, max_open=1)
+    try:
+        first = catalog.create_group("Trip")
+        others = [catalog.create_group(f"Flat {i}") for i in range(3)]
+        leased = threading.Event()
+        done = threading.Event()
+        errors = []
+
+        def use_first():
+            try:
+                with catalog.lease(first) as db:
+                    service = ExpenseService(db)
+                    ann, bob = service.add_persons(["Ann", "Bob"])
+                    leased.set()
+                    done.wait(10)
+                    # Still the same open connection after the other shards came and went
+                    assert service.add_expense("Taxi", 1000, "2024-05-01", ann, None, {ann: 500, bob: 500})
+                    assert catalog.database(first) is db
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=use_first)
+        thread.start()
+        assert leased.wait(10)
+        for group_id in others:
+            with catalog.lease(group_id) as db:
+                ExpenseService(db).get_all_persons()
+        done.set()
+        thread.join(10)
+        assert errors == []
+
+        # Released, the idle shards are closed down to max_open again
+        assert len(catalog._open) == 1
+    finally:
+        catalog.close()
@@ -0,0 +1,85 @@
+import csv
+import json
+
+import pytest
+
+from conftest import balances
+from importer import ExpenseImporter, parse_amount
+
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["description", "amount", "date", "paid_by", "splits"])
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+def read_rejects(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def row(description, amount="10.00", splits="Ann;Bob", paid_by="Ann"):
+    return {"description": description, "amount": amount, "date": "2024-05-01", "paid_by": paid_by, "splits": splits}
+
+
+@pytest.mark.parametrize("value", ["inf", "-inf", "nan", "1e20", "1e300", "1e400"])
+def test_parse_amount_rejects_values_that_do_not_fit(value):
+    with pytest.raises(ValueError, match="out of range"):
+        parse_amount(value)
+
+
+def test_bad_rows_go_to_the_reject_file_and_the_rest_are_imported(tmp_path, db, service, ann_bob):
+    ann, bob = ann_bob
+    path = write_csv(tmp_path / "expenses.csv", [
+        row("Lunch"),
+        row("Infinite", amount="inf"),
+        row("Huge", amount="1e20"),
+        row("Huge share", splits="Ann:1e20;Bob:-1e20"),
+        row("Negative share", splits="Ann:20;Bob:-10"),
+        row("Stranger", splits="Ann;Cat"),
+        row("Dinner", amount="30.00", splits="Ann:10;Bob:20"),
+    ])
+    reject_path = str(tmp_path / "rejects.jsonl")
+
+    summary = ExpenseImporter(db).run(path, reject_path=reject_path)
+
+    assert (summary["imported"], summary["rejected"]) == (2, 5)
+    rejects = read_rejects(reject_path)
+    assert [reject["line"] for reject in rejects] == [3, 4, 5, 6, 7]
+    assert [reject["row"]["description"] for reject in rejects] == [
+        "Infinite", "Huge", "Huge share", "Negative share", "Stranger",
+    ]
+    assert "unknown person 'Cat'" in rejects[-1]["error"]
+    assert balances(service) == {ann: 2500, bob: -2500}
+
+
+def test_a_failing_batch_is_retried_row_by_row(tmp_path, db, service, ann_bob):
+    ann, bob = ann_bob
+    db.conn.execute('''
+        CREATE TRIGGER refuse_broken BEFORE INSERT ON expense WHEN NEW.description = 'Broken'
+        BEGIN SELECT RAISE(ABORT, 'broken row'); END
+    ''')
+    path = write_csv(tmp_path / "expenses.csv", [row(f"Lunch {i}") for i in range(5)] + [row("Broken")])
+    reject_path = str(tmp_path / "rejects.jsonl")
+
+    summary = ExpenseImporter(db, batch_size=10).run(path, reject_path=reject_path)
+
+    assert (summary["imported"], summary["rejected"]) == (5, 1)
+    assert [(reject["line"], reject["error"]) for reject in read_rejects(reject_path)] == [(7, "broken row")]
+    assert balances(service) == {ann: 2500, bob: -2500}
+
+
+def test_unknown_people_are_created_only_when_asked(tmp_path, db, service, ann_bob):
+    path = write_csv(tmp_path / "expenses.csv", [row("Lunch", splits="Ann;Cat"), row("Taxi", paid_by="Dan")])
+
+    summary = ExpenseImporter(db).run(path)
+    assert (summary["imported"], summary["rejected"]) == (0, 2)
+    assert [name for _, name in service.get_all_persons()] == ["Ann", "Bob"]
+
+    summary = ExpenseImporter(db, create_persons=True).run(path)
+    assert (summary["imported"], summary["rejected"]) == (2, 0)
+    ids = {name: person_id for person_id, name in service.get_all_persons()}
+    assert sorted(ids) == ["Ann", "Bob", "Cat", "Dan"]
+    assert balances(service) == {ids["Ann"]: 0, ids["Bob"]: -500, ids["Cat"]: -500, ids["Dan"]: 1000}
@@ -0,0 +1,116 @@
+import random
+
+import pytest
+
+from conftest import balances
+from splits import split_minor
+
+# Seeds of the random histories the tests replay
+SEEDS = range(5)
+
+
+def assert_ledgers_match_history(db):
+    assert db.verify_balances() == []
+    assert db.verify_pair_debts() == []
+    kept = rollup(db)
+    db.rebuild_spending_rollup()
+    assert rollup(db) == kept
+
+
+def rollup(db):
+    return sorted(db.conn.execute('SELECT month, category_id, paid_by, total, expenses FROM spending_rollup').fetchall())
+
+
+def random_day(rng, first_month=1):
+    return f"2024-{rng.randint(first_month, 12):02d}-{rng.randint(1, 28):02d}"
+
+
+def add_random_expense(service, rng, person_ids, day, currencies=("INR",)):
+    """Queue an expense of a random amount split equally between a random subset; returns its Future."""
+    amount = rng.randint(1, 500000)
+    involved = rng.sample(person_ids, rng.randint(1, len(person_ids)))
+    shares = dict(zip(involved, split_minor(amount, count=len(involved)).tolist()))
+    category_id = rng.choice([category_id for category_id, _ in service.get_all_categories()])
+    return service.add_expense(
+        "Shared", amount, day, rng.choice(person_ids), category_id, shares, rng.choice(currencies), wait=False,
+    )
+
+
+def random_history(service, rng, currencies=("INR",), expenses=200, settlements=10):
+    """Add random expenses and payments dated in 2024 for six friends; returns (person ids, expense ids)."""
+    person_ids = service.add_persons([f"Friend {i}" for i in range(6)])
+    futures = [add_random_expense(service, rng, person_ids, random_day(rng), currencies) for _ in range(expenses)]
+    expense_ids = [future.result() for future in futures]
+    for _ in range(settlements):
+        payer_id, payee_id = rng.sample(person_ids, 2)
+        assert service.record_settlements(
+            [(payer_id, payee_id, rng.randint(1, 100000))], random_day(rng), rng.choice(currencies)
+        )
+    return person_ids, expense_ids
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_balance_ledger_follows_adds_and_deletes(db, service, seed):
+    rng = random.Random(seed)
+    _, expense_ids = random_history(service, rng)
+    assert db.verify_balances() == []
+
+    assert service.delete_expenses(rng.sample(expense_ids, 50)) == [True] * 50
+    assert db.verify_balances() == []
+    assert sum(balances(service).values()) == 0
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_pair_debts_follow_adds_payments_and_deletes(db, service, seed):
+    rng = random.Random(seed)
+    _, expense_ids = random_history(service, rng)
+    assert db.verify_pair_debts() == []
+
+    service.delete_expenses(rng.sample(expense_ids, 50))
+    assert db.verify_pair_debts() == []
+    # Paying back every pair debt directly settles every balance too
+    left = balances(service)
+    for (debtor_id, creditor_id), amount in service.get_all_pair_debts().items():
+        left[debtor_id] += amount
+        left[creditor_id] -= amount
+    assert set(left.values()) == {0}
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_spending_rollup_follows_adds_and_deletes(db, service, seed):
+    rng = random.Random(seed)
+    _, expense_ids = random_history(service, rng)
+    service.delete_expenses(rng.sample(expense_ids, 50))
+
+    kept = rollup(db)
+    assert sum(row[4] for row in kept) == 150
+    db.rebuild_spending_rollup()
+    assert rollup(db) == kept
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_ledgers_in_base_units_add_up_across_currencies(db, service, seed):
+    rng = random.Random(seed)
+    _, expense_ids = random_history(service, rng, currencies=("INR", "USD", "JPY"))
+    assert_ledgers_match_history(db)
+    # Payers are owed the converted shares, so conversion never creates or loses a paisa
+    assert sum(balances(service).values()) == 0
+
+    service.delete_expenses(rng.sample(expense_ids, 50))
+    assert_ledgers_match_history(db)
+    assert sum(balances(service).values()) == 0
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_ledgers_survive_archiving(tmp_path, db, service, seed):
+    rng = random.Random(seed)
+    person_ids, _ = random_history(service, rng, currencies=("INR", "USD"))
+    before = balances(service)
+    db.archive(str(tmp_path / "archive.db"), "2024-06-30")
+    assert balances(service) == before
+    assert_ledgers_match_history(db)
+
+    # Writes after the cutoff keep the ledgers in step with the archived history behind them
+    for _ in range(20):
+        assert add_random_expense(service, rng, person_ids, random_day(rng, first_month=7)).result()
+    assert_ledgers_match_history(db)
@@ -0,0 +1,78 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from conftest import balances
+from database import Database
+from service import ExpenseService
+
+SHIPPED_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "expense_splitter.db")
+
+
+def rupee_balances(db_file):
+    """Balances as the app computed them before minor units: the payer is owed the amount, each share is owed back."""
+    conn = sqlite3.connect(db_file)
+    try:
+        balances = {person_id: 0.0 for (person_id,) in conn.execute('SELECT id FROM person')}
+        for paid_by, amount in conn.execute('SELECT paid_by, amount FROM expense'):
+            balances[paid_by] += amount
+        for person_id, share_amount in conn.execute('SELECT person_id, share_amount FROM expense_split'):
+            balances[person_id] -= share_amount
+        totals = conn.execute('SELECT COALESCE(SUM(amount), 0) FROM expense').fetchone()[0]
+    finally:
+        conn.close()
+    return balances, totals
+
+
+@pytest.fixture
+def shipped_copy(tmp_path):
+    if not os.path.exists(SHIPPED_DB):
+        pytest.skip("no shipped database")
+    path = str(tmp_path / "expense_splitter.db")
+    shutil.copy(SHIPPED_DB, path)
+    conn = sqlite3.connect(path)
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    conn.close()
+    if version >= 11:
+        pytest.skip("the shipped database already has minor units")
+    return path
+
+
+def test_minor_units_keep_shipped_balances(shipped_copy):
+    expected, total = rupee_balances(shipped_copy)
+    db = Database(shipped_copy)
+    try:
+        service = ExpenseService(db)
+        assert balances(service) == {person_id: round(balance * 100) for person_id, balance in expected.items()}
+        assert db.verify_balances() == []
+        assert db.verify_pair_debts() == []
+
+        rollup_total = sum(row[0] for row in db.conn.execute('SELECT total FROM spending_rollup'))
+        assert rollup_total == round(total * 100)
+    finally:
+        db.close()
+
+
+def test_deleting_migrated_expense_reverses_it(shipped_copy):
+    db = Database(shipped_copy)
+    try:
+        service = ExpenseService(db)
+        before = balances(service)
+        expense_id, paid_by, base_amount = db.conn.execute(
+            'SELECT id, paid_by, base_amount FROM expense ORDER BY base_amount DESC LIMIT 1'
+        ).fetchone()
+        shares = dict(db.conn.execute(
+            'SELECT person_id, amount FROM expense_share_base WHERE expense_id = ?', (expense_id,)
+        ).fetchall())
+        assert service.delete_expense(expense_id)
+
+        expected = dict(before)
+        expected[paid_by] -= base_amount
+        for person_id, share in shares.items():
+            expected[person_id] += share
+        assert balances(service) == expected
+        assert db.verify_balances() == []
+    finally:
+        db.close()
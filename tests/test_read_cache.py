@@ -0,0 +1,34 @@
+from conftest import balances
+from database import Database
+from service import ExpenseService
+
+
+def test_cached_reads_see_writes_from_another_database_on_the_file(tmp_path, db, service):
+    # Fill the cache first, as a running app would have
+    assert service.get_all_persons() == []
+    assert balances(service) == {}
+
+    other = Database(str(tmp_path / "group.db"))
+    try:
+        writer = ExpenseService(other)
+        ann, bob = writer.add_persons(["Ann", "Bob"])
+        assert writer.add_expense("Taxi", 1000, "2024-05-01", ann, None, {ann: 500, bob: 500})
+    finally:
+        other.close()
+
+    assert service.get_all_persons() == [(ann, "Ann"), (bob, "Bob")]
+    assert balances(service) == {ann: 500, bob: -500}
+
+
+def test_cached_reads_are_reused_until_a_write(db, service, ann_bob):
+    calls = []
+
+    def load():
+        calls.append(1)
+        return len(calls)
+
+    assert db.cached(("probe",), load) == 1
+    assert db.cached(("probe",), load) == 1
+    ann, bob = ann_bob
+    assert service.add_expense("Taxi", 1000, "2024-05-01", ann, None, {bob: 1000})
+    assert db.cached(("probe",), load) == 2
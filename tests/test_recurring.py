@@ -0,0 +1,86 @@
+import csv
+from datetime import date, timedelta
+
+import pytest
+
+import recurring
+from conftest import balances
+from exporter import export_expenses
+
+
+@pytest.fixture
+def series(db, service, ann_bob):
+    """A monthly rent that started three months ago and ends in a week."""
+    ann, bob = ann_bob
+    start = (date.today().replace(day=1) - timedelta(days=70)).replace(day=1)
+    recurring_id = service.add_recurring_expense(
+        "Rent", 1000, start.isoformat(), ann, None, {ann: 500, bob: 500}, recurring.MONTHLY,
+        (date.today() + timedelta(days=7)).isoformat(),
+    )
+    assert recurring_id
+    return db, service, recurring_id, ann, bob
+
+
+def test_skipping_a_due_occurrence(series):
+    db, service, recurring_id, ann, bob = series
+    before = balances(service)
+    assert service.delete_expense(recurring.occurrence_id(recurring_id, 0))
+    assert balances(service) == {ann: before[ann] - 500, bob: before[bob] + 500}
+    # Already skipped
+    assert service.delete_expense(recurring.occurrence_id(recurring_id, 0)) is False
+
+
+@pytest.mark.parametrize("occurrence", [5, 1000])
+def test_occurrences_not_due_cannot_be_skipped(series, occurrence):
+    db, service, recurring_id, ann, bob = series
+    assert service.delete_expense(recurring.occurrence_id(recurring_id, occurrence)) is False
+    assert db.conn.execute('SELECT COUNT(*) FROM recurring_occurrence').fetchone()[0] == 0
+
+
+def test_unknown_template_cannot_be_skipped(series):
+    db, service, recurring_id, ann, bob = series
+    assert service.delete_expense(recurring.occurrence_id(recurring_id + 1, 0)) is False
+    assert db.conn.execute('SELECT COUNT(*) FROM recurring_occurrence').fetchone()[0] == 0
+
+
+def due_months(service):
+    """The months of the occurrences due by today that are not stored, oldest first."""
+    rows = service.get_expenses(limit=100)
+    return sorted(row[3][:7] for row in rows if recurring.parse_occurrence_id(row[0]) is not None)
+
+
+def test_spending_rollup_counts_due_occurrences(series):
+    db, service, recurring_id, ann, bob = series
+    months = due_months(service)
+    assert len(months) == 4
+    assert service.get_spending_rollup() == [(month, "Uncategorized", "Ann", 1000, 1) for month in months]
+
+    # A skipped occurrence is not spent, and a stored one is counted once, from the expense table
+    assert service.delete_expense(recurring.occurrence_id(recurring_id, 0))
+    assert service.edit_occurrence(recurring.occurrence_id(recurring_id, 1), 1000)
+    assert service.get_spending_rollup() == [(month, "Uncategorized", "Ann", 1000, 1) for month in months[1:]]
+    assert service.get_spending_rollup(months[1], months[2]) == [
+        (month, "Uncategorized", "Ann", 1000, 1) for month in months[1:3]
+    ]
+
+
+def test_weekly_occurrences_are_rolled_up_by_month():
+    counts = recurring.occurrences_by_month(date(2024, 1, 29), recurring.WEEKLY, date(2024, 3, 5))
+    assert counts == {"2024-01": 1, "2024-02": 4, "2024-03": 1}
+    assert sum(counts.values()) == recurring.occurrence_count(date(2024, 1, 29), recurring.WEEKLY, date(2024, 3, 5))
+    assert recurring.occurrences_by_month(date(2024, 1, 29), recurring.WEEKLY, date(2024, 2, 10), date(2024, 2, 1)) == {
+        "2024-01": 1,
+    }
+
+
+def test_export_includes_due_occurrences(series, tmp_path):
+    db, service, recurring_id, ann, bob = series
+    assert service.delete_expense(recurring.occurrence_id(recurring_id, 0))
+    path = str(tmp_path / "expenses.csv")
+    assert export_expenses(db, path, chunk_size=4) == 6
+    with open(path, encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [int(row["expense_id"]) for row in rows] == [
+        recurring.occurrence_id(recurring_id, n) for n in (1, 1, 2, 2, 3, 3)
+    ]
+    assert {(row["split_with"], row["share_amount"]) for row in rows} == {("Ann", "500"), ("Bob", "500")}
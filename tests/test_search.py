@@ -0,0 +1,83 @@
+import pytest
+
+
+@pytest.fixture
+def expenses(service, ann_bob):
+    """A few expenses with overlapping words, paid by Ann or Bob in different categories and months."""
+    ann, bob = ann_bob
+    categories = {name: category_id for category_id, name in service.get_all_categories()}
+    rows = [
+        ("Coffee", "2024-05-01", ann, "Food"),
+        ("Coffee and cake at the station cafe with everyone", "2024-05-02", ann, "Food"),
+        ("Coffee beans for the office", "2024-06-01", bob, "Other"),
+        ("Café crème", "2024-06-02", bob, "Food"),
+        ("Taxi to the airport", "2024-06-03", ann, "Travel"),
+    ]
+    results = service.add_expenses([
+        (description, 1000, date, paid_by, categories[category], {ann: 500, bob: 500})
+        for description, date, paid_by, category in rows
+    ])
+    ids = dict(zip((row[0] for row in rows), results))
+    return service, ids, ann, bob, categories
+
+
+def descriptions(rows):
+    return [row[1] for row in rows]
+
+
+@pytest.mark.parametrize("text", ["cof", "COFFEE", "co be"])
+def test_words_match_by_prefix(expenses, text):
+    service, ids, ann, bob, categories = expenses
+    found = set(descriptions(service.search_expenses(text)))
+    assert "Coffee beans for the office" in found
+    assert "Taxi to the airport" not in found
+
+
+def test_every_word_has_to_match(expenses):
+    service, ids, ann, bob, categories = expenses
+    assert descriptions(service.search_expenses("coffee office")) == ["Coffee beans for the office"]
+    assert service.search_expenses("coffee airport") == []
+    assert service.search_expenses("  ?! ") == []
+
+
+def test_accents_are_ignored(expenses):
+    service, ids, ann, bob, categories = expenses
+    assert descriptions(service.search_expenses("cafe creme")) == ["Café crème"]
+
+
+def test_best_matches_come_first(expenses):
+    service, ids, ann, bob, categories = expenses
+    assert descriptions(service.search_expenses("coffee")) == [
+        "Coffee", "Coffee beans for the office", "Coffee and cake at the station cafe with everyone",
+    ]
+    assert descriptions(service.search_expenses("coffee", limit=1)) == ["Coffee"]
+
+
+def test_search_combines_with_filters(expenses):
+    service, ids, ann, bob, categories = expenses
+    assert descriptions(service.search_expenses("coffee", person_id=bob)) == ["Coffee beans for the office"]
+    assert descriptions(service.search_expenses("coffee", category_id=categories["Food"])) == [
+        "Coffee", "Coffee and cake at the station cafe with everyone",
+    ]
+    assert descriptions(service.search_expenses("coffee", date_from="2024-05-02", date_to="2024-05-31")) == [
+        "Coffee and cake at the station cafe with everyone",
+    ]
+    # The paged listing applies the same search
+    assert descriptions(service.get_expenses(search="coffee", person_id=ann)) == [
+        "Coffee and cake at the station cafe with everyone", "Coffee",
+    ]
+
+
+def test_index_follows_updates_and_deletes(db, expenses):
+    service, ids, ann, bob, categories = expenses
+    assert db.conn.execute('UPDATE expense SET description = ? WHERE id = ?', ("Espresso", ids["Coffee"])).rowcount == 1
+    db.conn.commit()
+    db.bump_data_version()
+    assert descriptions(service.search_expenses("espresso")) == ["Espresso"]
+    assert "Coffee" not in descriptions(service.search_expenses("coffee"))
+
+    assert service.delete_expense(ids["Coffee beans for the office"])
+    assert descriptions(service.search_expenses("coffee")) == ["Coffee and cake at the station cafe with everyone"]
+    assert service.search_expenses("beans") == []
+    # Raises if the index no longer matches the expense table
+    db.conn.execute("INSERT INTO expense_fts (expense_fts) VALUES ('integrity-check')")
@@ -0,0 +1,34 @@
+import pytest
+
+import settlement
+from conftest import balances
+
+
+@pytest.fixture
+def chain(db, service):
+    """Bob owes Ann 1000 and Cy owes Bob 1000, so only Cy and Ann have a balance."""
+    ann, bob, cy = service.add_persons(["Ann", "Bob", "Cy"])
+    assert service.add_expense("Cinema", 1000, "2024-05-01", ann, None, {bob: 1000})
+    assert service.add_expense("Snacks", 1000, "2024-05-02", bob, None, {cy: 1000})
+    return db, service, ann, bob, cy
+
+
+def recorded(db):
+    return sorted(db.conn.execute('SELECT payer_id, payee_id, amount FROM settlement').fetchall())
+
+
+def test_mark_settled_follows_the_balances_plan(chain):
+    db, service, ann, bob, cy = chain
+    # Bob has no balance, so the fewest-transfers plan has nothing for him
+    assert service.mark_person_settled(bob, "2024-05-03")
+    assert recorded(db) == []
+    assert service.mark_person_settled(cy, "2024-05-03")
+    assert recorded(db) == [(cy, ann, 1000)]
+
+
+def test_mark_settled_follows_the_pairwise_plan(chain):
+    db, service, ann, bob, cy = chain
+    assert service.mark_person_settled(bob, "2024-05-03", settlement.PAIRWISE)
+    assert recorded(db) == sorted([(bob, ann, 1000), (cy, bob, 1000)])
+    assert service.get_all_pair_debts() == {}
+    assert set(balances(service).values()) == {0}
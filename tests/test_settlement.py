@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+import settlement
+
+
+def random_balances(rng, people, scale=50000):
+    """Random id -> minor-unit balances that add up to zero, with some people already square."""
+    balances = {person_id: rng.choice([0, rng.randint(-scale, scale)]) for person_id in range(1, people)}
+    balances[people] = -sum(balances.values())
+    return balances
+
+
+def apply(balances, transfers):
+    """Return the balances left after every transfer is paid."""
+    left = dict(balances)
+    for debtor_id, creditor_id, amount in transfers:
+        assert amount > 0
+        assert debtor_id != creditor_id
+        left[debtor_id] += amount
+        left[creditor_id] -= amount
+    return left
+
+
+@pytest.mark.parametrize("seed", range(40))
+@pytest.mark.parametrize("mode", [settlement.AUTO, settlement.GREEDY, settlement.EXACT, settlement.HEURISTIC])
+def test_every_plan_settles_every_balance(seed, mode):
+    rng = random.Random(seed)
+    balances = random_balances(rng, rng.randint(2, 12))
+    assert set(apply(balances, settlement.settle(balances, mode)).values()) == {0}
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_exact_needs_no_more_transfers_than_the_others(seed):
+    rng = random.Random(seed)
+    # Small amounts make zero-sum subgroups, where the exact plan wins, more likely
+    balances = random_balances(rng, rng.randint(2, 10), scale=rng.choice([5, 50000]))
+    exact = settlement.settle(balances, settlement.EXACT)
+    assert len(exact) <= len(settlement.settle(balances, settlement.GREEDY))
+    assert len(exact) <= len(settlement.settle(balances, settlement.HEURISTIC))
+
+
+def test_heuristic_handles_large_groups():
+    rng = random.Random(7)
+    balances = random_balances(rng, 2000)
+    transfers = settlement.settle(balances, settlement.HEURISTIC)
+    assert set(apply(balances, transfers).values()) == {0}
+    assert len(transfers) < sum(1 for balance in balances.values() if balance)
+
+
+def test_pairwise_pays_back_each_debt_directly():
+    pair_debts = {(1, 2): 500, (3, 2): 250, (1, 3): 0}
+    transfers = settlement.settle({}, settlement.PAIRWISE, pair_debts)
+    assert transfers == [(1, 2, 500), (3, 2, 250)]
+    with pytest.raises(ValueError):
+        settlement.settle({1: -1, 2: 1}, settlement.PAIRWISE)
@@ -0,0 +1,50 @@
+import math
+import random
+
+import pytest
+
+import splits
+
+
+@pytest.mark.parametrize("seed", range(50))
+@pytest.mark.parametrize("method", [splits.EQUAL, splits.SHARES, splits.PERCENTAGE, splits.EXACT])
+def test_split_minor_always_adds_up_to_the_total(seed, method):
+    rng = random.Random(seed)
+    total = rng.randint(1, 10 ** 9)
+    count = rng.randint(1, 12)
+    if method == splits.EQUAL:
+        values = None
+    elif method == splits.SHARES:
+        values = [rng.choice([math.nan, rng.uniform(0.1, 5)]) for _ in range(count)]
+    elif method == splits.PERCENTAGE:
+        # Leave at least one blank to take whatever the typed percentages leave over
+        values = [rng.uniform(0, 100 / count) for _ in range(count - 1)] + [math.nan]
+    else:
+        values = [rng.randint(0, total // count) for _ in range(count - 1)] + [math.nan]
+
+    minor = splits.split_minor(total, method, values, count=count)
+    assert len(minor) == count
+    assert int(minor.sum()) == total
+    assert (minor >= 0).all()
+
+
+@pytest.mark.parametrize("total, count", [(1, 3), (100, 3), (10 ** 12 + 1, 7)])
+def test_equal_split_differs_by_at_most_one_unit(total, count):
+    minor = splits.split_minor(total, count=count)
+    assert int(minor.sum()) == total
+    assert int(minor.max() - minor.min()) <= 1
+
+
+def test_compute_splits_uses_the_currency_minor_unit():
+    assert splits.compute_splits(10, [1, 2, 3]) == {1: 334, 2: 333, 3: 333}
+    assert sum(splits.compute_splits(1000, [1, 2, 3], currency="JPY").values()) == 1000
+
+
+@pytest.mark.parametrize("method, values", [
+    (splits.PERCENTAGE, [60, 60]),
+    (splits.EXACT, [80, 30]),
+    (splits.SHARES, [-1, 2]),
+])
+def test_invalid_splits_are_rejected(method, values):
+    with pytest.raises(ValueError):
+        splits.split_minor(100, method, values)
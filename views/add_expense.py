@@ -0,0 +1,145 @@
+import streamlit as st
+import numpy as np
+import pandas as pd
+
+import currencies
+import recurring
+import splits
+
+# Labels for the split methods offered on the Add Expense page
+SPLIT_METHOD_LABELS = {
+    splits.EQUAL: "Equal split 💕",
+    splits.PERCENTAGE: "By percent 📊",
+    splits.SHARES: "By shares ⚖️",
+    splits.EXACT: "Exact amounts ✨",
+}
+
+# Labels for how often an expense repeats; None is a one-off expense
+REPEAT_LABELS = {
+    None: "Just once",
+    recurring.WEEKLY: "Every week 🗓️",
+    recurring.MONTHLY: "Every month 🏠",
+    recurring.YEARLY: "Every year 🎂",
+}
+
+
+def render(app):
+    """Show the add expense form."""
+    st.header("💸 Add New Expense")
+    st.markdown("##### Track your shopping sprees and brunches!")
+    persons = app.get_all_persons()
+    categories = app.get_all_categories()
+    person_names = app.person_names()
+    category_names = app.category_names()
+    
+    if not persons:
+        st.warning("⚠️ Please add some friends first!")
+        return
+    
+    with st.form("add_expense_form"):
+        description = st.text_input("What did you buy?")
+        
+        col1, col2, col3 = st.columns([2, 1, 2])
+        with col1:
+            amount = st.number_input("Amount", min_value=0.01, value=100.00, step=10.0)
+        with col2:
+            # Shares are kept in this currency and converted to rupees when balances are read
+            currency = st.selectbox("Currency", options=app.get_currencies())
+        with col3:
+            date = st.date_input("Date")
+        
+        paid_by = st.selectbox(
+            "Who paid? 💳",
+            options=[p[0] for p in persons],
+            format_func=person_names.get
+        )
+        
+        category = st.selectbox(
+            "Category 🛍️",
+            options=[c[0] for c in categories],
+            format_func=category_names.get
+        )
+        
+        # Rent and subscriptions are entered once; each occurrence shows up on its date
+        col1, col2 = st.columns(2)
+        with col1:
+            cadence = st.selectbox("Repeats 🔁", options=list(REPEAT_LABELS), format_func=REPEAT_LABELS.get)
+        with col2:
+            end_date = st.date_input("Repeat until (optional)", value=None)
+        
+        st.subheader("Split between 👭")
+        
+        # Default to equal split
+        split_method = st.radio(
+            "Split method",
+            options=splits.SPLIT_METHODS,
+            format_func=lambda x: SPLIT_METHOD_LABELS[x],
+            horizontal=True,
+        )
+        
+        # One grid for everyone instead of a widget per person, so big groups render as fast as small ones
+        grid = st.data_editor(
+            pd.DataFrame(
+                {"Friend": [p[1] for p in persons], "Split with": True, "Value": np.nan},
+                index=[p[0] for p in persons],
+            ),
+            column_config={
+                "Split with": st.column_config.CheckboxColumn("Split with? 👭"),
+                "Value": st.column_config.NumberColumn(
+                    "Value",
+                    help="Percent, shares or an amount for each friend, depending on the split method. "
+                         "Blank values share whatever is left equally.",
+                    min_value=0.0,
+                    format="%.2f",
+                ),
+            },
+            disabled=["Friend"],
+            hide_index=True,
+            key="split_grid",
+        )
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            preview = st.form_submit_button("Preview split 👀")
+        with col2:
+            submitted = st.form_submit_button("Add Expense 💝")
+    
+    if preview or submitted:
+        involved = grid[grid["Split with"]]
+        try:
+            expense_splits = splits.compute_splits(
+                amount, involved.index, split_method, involved["Value"].to_numpy(dtype=float), currency
+            )
+        except ValueError as e:
+            st.error(f"🎀 {e}")
+            return
+        
+        if preview:
+            st.dataframe(
+                pd.DataFrame({
+                    "Friend": [person_names[person_id] for person_id in expense_splits],
+                    "Pays": [currencies.format_amount(share, currency) for share in expense_splits.values()],
+                }),
+                hide_index=True,
+            )
+        elif not description:
+            st.error("🎀 Please enter a description.")
+        elif amount <= 0:
+            st.error("🎀 Amount must be greater than zero.")
+        elif cadence is not None:
+            if end_date is not None and end_date < date:
+                st.error("🎀 The repeat end date is before the first date.")
+            elif app.add_recurring_expense(
+                description, currencies.to_minor(amount, currency), date.strftime("%Y-%m-%d"), paid_by, category,
+                expense_splits, cadence, end_date.strftime("%Y-%m-%d") if end_date else None, currency,
+            ):
+                st.success(f"🎉 Added {description}, repeating {REPEAT_LABELS[cadence].lower()}! So organized!")
+            else:
+                st.error("🎀 Failed to add the recurring expense.")
+        elif app.add_expense(
+            description, currencies.to_minor(amount, currency), date.strftime("%Y-%m-%d"), paid_by, category,
+            expense_splits, currency,
+        ):
+            st.success("🎉 Expense added successfully! You're amazing!")
+        else:
+            st.error("🎀 Failed to add expense.")
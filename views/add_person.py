@@ -0,0 +1,26 @@
+import streamlit as st
+import pandas as pd
+
+
+def render(app):
+    """Show the add person form."""
+    st.header("👯‍♀️ Add New Friend")
+    with st.form("add_person_form"):
+        name = st.text_input("Friend's Name")
+        if st.form_submit_button("Add Friend ✨"):
+            if name:
+                if app.add_person(name):
+                    st.success(f"🎉 Added {name} successfully! You're the best!")
+                else:
+                    st.error(f"🎀 Friend with name '{name}' already exists.")
+            else:
+                st.error("🎀 Please enter a name.")
+    
+    # Show existing people
+    st.subheader("Your Besties")
+    persons = app.get_all_persons()
+    if persons:
+        df = pd.DataFrame(persons, columns=["ID", "Name"])
+        st.dataframe(df)
+    else:
+        st.info("No friends added yet. Add your besties to get started! 💕")
@@ -0,0 +1,51 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+
+import currencies
+
+# Soft colours to match the rest of the app
+CHART_COLORS = px.colors.qualitative.Pastel
+
+
+def render(app):
+    """Show spending charts built from the monthly rollups, never from the raw expenses."""
+    st.header("📊 Spending Insights")
+    st.markdown("##### See where all the money goes! 💸")
+
+    rollup = app.get_spending_rollup()
+    if not rollup:
+        st.info("💝 No expenses yet. Add some fun spending to see your insights!")
+        return
+
+    months = sorted({row[0] for row in rollup})
+    if len(months) > 1:
+        month_from, month_to = st.select_slider("Months", options=months, value=(months[0], months[-1]))
+        rollup = app.get_spending_rollup(month_from, month_to)
+
+    df = pd.DataFrame(rollup, columns=["Month", "Category", "Paid By", "Total", "Expenses"])
+    total = int(df["Total"].sum())
+    # Charts plot rupees; the rollups are kept in paise
+    df["Total"] = currencies.from_minor(df["Total"])
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total spent", currencies.format_amount(total))
+    with col2:
+        st.metric("Expenses", f"{df['Expenses'].sum():,}")
+    with col3:
+        st.metric("Per month", currencies.format_amount(total // df['Month'].nunique()))
+
+    st.subheader("🗓️ Spending by month")
+    by_month = df.groupby(["Month", "Category"], as_index=False)["Total"].sum()
+    st.plotly_chart(px.bar(by_month, x="Month", y="Total", color="Category", color_discrete_sequence=CHART_COLORS))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("🛍️ By category")
+        by_category = df.groupby("Category", as_index=False)["Total"].sum()
+        st.plotly_chart(px.pie(by_category, names="Category", values="Total", hole=0.4, color_discrete_sequence=CHART_COLORS))
+    with col2:
+        st.subheader("💳 Who paid")
+        by_payer = df.groupby("Paid By", as_index=False)["Total"].sum().sort_values("Total", ascending=False)
+        st.plotly_chart(px.bar(by_payer, x="Paid By", y="Total", color_discrete_sequence=CHART_COLORS))
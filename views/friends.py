@@ -0,0 +1,44 @@
+import streamlit as st
+import pandas as pd
+
+import currencies
+
+
+def render(app):
+    """Show what one friend owes, and is owed by, each of the others."""
+    st.header("👭 Friend by Friend")
+    st.markdown("##### Who owes whom, one friendship at a time! 💞")
+
+    persons = app.get_all_persons()
+    if not persons:
+        st.info("No friends added yet. Add your besties to get started! 💕")
+        return
+
+    person_names = app.person_names()
+    person_id = st.selectbox("Show debts for", options=[p[0] for p in persons], format_func=person_names.get)
+    name = person_names[person_id]
+
+    debts = app.get_pair_debts(person_id)
+    if not debts:
+        st.success(f"✨ {name} is all square with everyone!")
+        return
+
+    owes = sum(amount for _, _, amount in debts if amount > 0)
+    owed = -sum(amount for _, _, amount in debts if amount < 0)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric(f"{name} owes", currencies.format_amount(owes))
+    with col2:
+        st.metric(f"{name} gets back", currencies.format_amount(owed))
+
+    df = pd.DataFrame(
+        [
+            {
+                "Friend": friend,
+                "Amount": currencies.format_amount(abs(amount)),
+                "Status": f"{name} owes 💸" if amount > 0 else f"Owes {name} 💝",
+            }
+            for _, friend, amount in debts
+        ]
+    )
+    st.dataframe(df)
@@ -0,0 +1,127 @@
+import streamlit as st
+import pandas as pd
+from datetime import datetime
+
+import currencies
+import settlement
+
+# Labels for the settlement algorithms offered on the Settle Up page
+SETTLEMENT_MODE_LABELS = {
+    settlement.AUTO: "Fewest transfers (auto) ✨",
+    settlement.GREEDY: "Quick match 💨",
+    settlement.EXACT: f"Exact minimum (up to {settlement.EXACT_MAX_PEOPLE} friends) 💎",
+    settlement.HEURISTIC: "Large groups 👯‍♀️",
+    settlement.PAIRWISE: "Only between friends who shared expenses 🤝",
+}
+
+
+def render(app):
+    """Show current balances and settlement options."""
+    st.header("💰 Settle Up With Friends")
+    st.markdown("##### Keep your friendships happy! 👯‍♀️")
+    
+    try:
+        balances = app.calculate_balances()
+        
+        if balances:
+            # Show current balances, or the balances at the end of a past date
+            st.subheader("💖 Current Balances")
+            as_of = None
+            if st.checkbox("Show balances as of a past date 📅"):
+                # History up to the last archive cutoff only survives as opening balances
+                archived_through = app.db.archived_through()
+                earliest = datetime.strptime(archived_through, "%Y-%m-%d").date() if archived_through else None
+                as_of = st.date_input("Balances at the end of", min_value=earliest).strftime("%Y-%m-%d")
+            shown_balances = balances if as_of is None else app.calculate_balances(as_of)
+            balance_data = []
+            for person_id, data in shown_balances.items():
+                balance_data.append({
+                    "Friend": data['name'],
+                    "Balance": data['balance'],
+                    "Status": "Gets back 💝" if data['balance'] > 0 else "Owes 💸" if data['balance'] < 0 else "Settled ✨"
+                })
+            
+            df_balances = pd.DataFrame(balance_data)
+            df_balances["Display Balance"] = df_balances["Balance"].apply(currencies.format_amount)
+            
+            # Display balance dataframe
+            st.dataframe(df_balances[["Friend", "Display Balance", "Status"]])
+            
+            # Calculate and show settlement plan
+            st.subheader("💕 Suggested Settlements")
+            settlement_mode = st.selectbox(
+                "Settlement method",
+                options=settlement.SETTLEMENT_MODES,
+                format_func=lambda x: SETTLEMENT_MODE_LABELS[x],
+            )
+            transactions = app.calculate_settlements(balances, settlement_mode)
+            
+            if transactions:
+                for debtor, creditor, amount in transactions:
+                    st.info(f"💸 {debtor} pays {creditor} {currencies.format_amount(amount)}")
+            else:
+                st.success("✨ Everyone is settled up! Best friends forever!")
+            
+            # Mark as settled option
+            st.subheader("🌸 Mark as Settled")
+            st.warning(
+                "💝 This records the selected friend's payments from the plan above. Your expense history stays untouched!"
+            )
+            
+            persons = app.get_all_persons()
+            person_names = app.person_names()
+            settle_person = st.selectbox(
+                "Select friend to mark as settled:",
+                options=[None] + [p[0] for p in persons],
+                format_func=lambda x: "Select a friend" if x is None else person_names[x]
+            )
+            
+            if settle_person and st.button("Mark as Settled 💖"):
+                if app.mark_person_settled(settle_person, datetime.now().strftime("%Y-%m-%d"), settlement_mode):
+                    st.success(f"Balance for {person_names[settle_person]} marked as settled! You're such a good friend!")
+                    st.rerun()
+                else:
+                    st.error("🎀 Failed to record the settlement.")
+            
+            # Record a single payment between two friends
+            st.subheader("💌 Record a Payment")
+            with st.form("record_payment_form"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    payer = st.selectbox("Who paid?", options=[p[0] for p in persons], format_func=person_names.get)
+                with col2:
+                    payee = st.selectbox("Who received it?", options=[p[0] for p in persons], format_func=person_names.get)
+                col1, col2, col3 = st.columns([2, 1, 2])
+                with col1:
+                    amount = st.number_input("Amount", min_value=0.01, value=100.00, step=10.0)
+                with col2:
+                    currency = st.selectbox("Currency", options=app.get_currencies())
+                with col3:
+                    date = st.date_input("Date")
+                
+                if st.form_submit_button("Record Payment 💸"):
+                    minor = currencies.to_minor(amount, currency)
+                    if payer == payee:
+                        st.error("🎀 Pick two different friends.")
+                    elif app.record_settlements([(payer, payee, minor)], date.strftime("%Y-%m-%d"), currency):
+                        st.success(
+                            f"🎉 Recorded {person_names[payer]} paying {person_names[payee]} "
+                            f"{currencies.format_amount(minor, currency)}!"
+                        )
+                    else:
+                        st.error("🎀 Failed to record the payment.")
+            
+            recent = app.get_recent_settlements()
+            if recent:
+                with st.expander("🧾 Recent payments"):
+                    df = pd.DataFrame(recent, columns=["Date", "From", "To", "Amount", "Currency"])
+                    df["Amount"] = [
+                        currencies.format_amount(amount, currency) for amount, currency in zip(df["Amount"], df["Currency"])
+                    ]
+                    df = df.drop(columns="Currency")
+                    st.dataframe(df)
+
+        else:
+            st.info("💝 No balances found. Add some shopping trips to get started!")
+    except Exception as e:
+        st.error(f"Error in settle up: {str(e)}")
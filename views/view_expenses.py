@@ -0,0 +1,178 @@
+import streamlit as st
+import tempfile
+import pandas as pd
+from datetime import datetime
+
+import currencies
+import exporter
+import recurring
+
+# Number of expenses shown per page on the View Expenses page
+EXPENSES_PAGE_SIZE = 50
+
+
+def render(app):
+    """Show expenses page by page with ability to filter and delete."""
+    st.header("🌸 All Expenses")
+    st.markdown("##### Track all your fun purchases!")
+    
+    try:
+        if app.get_expenses(limit=1):
+            # Add filter options
+            st.subheader("✨ Filter Expenses")
+            persons = app.get_all_persons()
+            categories = app.get_all_categories()
+            person_names = app.person_names()
+            category_names = app.category_names()
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                person_filter = st.selectbox(
+                    "Filter by friend",
+                    options=[None] + [p[0] for p in persons],
+                    format_func=lambda x: "All Friends" if x is None else person_names[x],
+                )
+            
+            with col2:
+                category_filter = st.selectbox(
+                    "Filter by category",
+                    options=[None] + [c[0] for c in categories],
+                    format_func=lambda x: "All Categories" if x is None else category_names[x],
+                )
+            
+            search = st.text_input("Search descriptions 🔎", placeholder="e.g. brunch, uber, concert")
+            by_relevance = bool(search) and st.checkbox(
+                "Best matches first",
+                help="Ranks stored expenses only; repeats of recurring expenses that are not stored yet are left out.",
+            )
+            
+            # Keyset cursors of the pages before the current one; reset whenever the group or filters change
+            filters = (app.db.db_file, person_filter, category_filter, search, by_relevance)
+            if st.session_state.get("expense_page_filters") != filters:
+                st.session_state["expense_page_filters"] = filters
+                st.session_state["expense_page_cursors"] = []
+            cursors = st.session_state["expense_page_cursors"]
+            
+            if by_relevance:
+                # Ranked results are a single page of the best matches
+                page = app.search_expenses(
+                    search,
+                    person_id=person_filter,
+                    category_id=category_filter,
+                    limit=EXPENSES_PAGE_SIZE,
+                )
+            else:
+                # Fetch one extra row to know whether there is a next page
+                page = app.get_expenses(
+                    person_id=person_filter,
+                    category_id=category_filter,
+                    after=cursors[-1] if cursors else None,
+                    limit=EXPENSES_PAGE_SIZE + 1,
+                    search=search,
+                )
+            has_next = len(page) > EXPENSES_PAGE_SIZE
+            page = page[:EXPENSES_PAGE_SIZE]
+            
+            if page:
+                df = pd.DataFrame(
+                    page,
+                    columns=["ID", "Description", "Amount", "Date", "Paid By", "Category", "Currency"]
+                )
+                df["Amount"] = [
+                    currencies.format_amount(amount, currency) for amount, currency in zip(df["Amount"], df["Currency"])
+                ]
+                df = df.drop(columns="Currency")
+                # Occurrences of recurring expenses that are not stored have negative ids
+                df.loc[df["ID"] < 0, "Description"] = "🔁 " + df.loc[df["ID"] < 0, "Description"]
+                st.dataframe(df)
+                
+                # Page navigation
+                col1, col2, col3 = st.columns([1, 2, 1])
+                with col1:
+                    if st.button("⬅️ Newer", disabled=not cursors):
+                        cursors.pop()
+                        st.rerun()
+                with col2:
+                    st.caption(f"Page {len(cursors) + 1}")
+                with col3:
+                    if st.button("Older ➡️", disabled=not has_next):
+                        last = page[-1]
+                        cursors.append((last[3], last[0]))
+                        st.rerun()
+                
+                # Delete expense option
+                page_by_id = {e[0]: e for e in page}
+                selected_expense = st.selectbox(
+                    "Select an expense to delete:",
+                    options=list(page_by_id),
+                    format_func=lambda x: (
+                        f"{page_by_id[x][1]} - {currencies.format_amount(page_by_id[x][2], page_by_id[x][6])} "
+                        f"({page_by_id[x][3]})"
+                    ),
+                )
+                
+                if st.button("Delete Selected Expense 🗑️"):
+                    if app.delete_expense(selected_expense):
+                        st.success("Expense deleted successfully! You're so organized!")
+                        st.rerun()
+                    else:
+                        st.error("Failed to delete expense.")
+                
+                # A recurring bill that came out different this time is stored with its own amount
+                if recurring.parse_occurrence_id(selected_expense) is not None:
+                    _, _, amount, _, _, _, currency = page_by_id[selected_expense]
+                    col1, col2 = st.columns([2, 1])
+                    with col1:
+                        new_amount = st.number_input(
+                            f"This time's amount ({currency})", min_value=0.01,
+                            value=currencies.from_minor(amount, currency),
+                        )
+                    with col2:
+                        if st.button("Save amount ✏️"):
+                            if app.edit_occurrence(selected_expense, currencies.to_minor(new_amount, currency)):
+                                st.success("Saved! Only this one changed. 💕")
+                                st.rerun()
+                            else:
+                                st.error("Failed to save the amount.")
+            else:
+                st.info("No expenses match your filters. Try something else! 💕")
+            
+            templates = app.get_recurring_expenses()
+            if templates:
+                with st.expander("🔁 Recurring expenses"):
+                    st.dataframe(pd.DataFrame(
+                        [
+                            {
+                                "Description": t['description'],
+                                "Amount": currencies.format_amount(t['amount'], t['currency']),
+                                "Repeats": t['cadence'],
+                                "Paid By": person_names[t['paid_by']],
+                                "From": t['start'].isoformat(),
+                                "Until": t['end'].isoformat() if t['end'] else "",
+                            }
+                            for t in templates
+                        ]
+                    ), hide_index=True)
+                    by_id = {t['id']: t for t in templates}
+                    stop = st.selectbox("Stop repeating", options=list(by_id), format_func=lambda x: by_id[x]['description'])
+                    if st.button("Stop after today 🛑"):
+                        if app.end_recurring_expense(stop, datetime.now().strftime("%Y-%m-%d")):
+                            st.success("Stopped! Past ones are kept. ✨")
+                            st.rerun()
+                        else:
+                            st.error("Failed to stop the recurring expense.")
+            
+            # Export everything; the file is only generated when the button is clicked.
+            # Rows stream through a temporary file, then Streamlit serves the finished bytes.
+            with st.expander("📦 Export all expenses"):
+                export_format = st.radio("Format", exporter.EXPORT_FORMATS, horizontal=True)
+                st.download_button(
+                    "Download ⬇️",
+                    data=lambda: exporter.export_to_file(app.db, export_format, tempfile.TemporaryFile()).read(),
+                    file_name=f"expenses.{export_format}",
+                    mime="text/csv" if export_format == "csv" else "application/octet-stream",
+                )
+        else:
+            st.info("💝 No expenses found. Add some fun spending to get started!")
+    except Exception as e:
+        st.error(f"Error viewing expenses: {str(e)}")
@@ -0,0 +1,104 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+# Extra seconds the writer waits for more operations after the first one arrives. With 0 a
+# batch is whatever queued up while the previous batch was committing, which is usually best.
+WRITE_BATCH_WINDOW = 0
+
+# Most operations committed together
+WRITE_BATCH_MAX = 200
+
+# Tells the writer thread to finish the queue and exit
+_STOP = object()
+
+
+class WriteQueue:
+    def __init__(self, db, window=WRITE_BATCH_WINDOW, max_batch=WRITE_BATCH_MAX):
+        """Start a writer thread that applies every write to `db` through one connection."""
+        self.db = db
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="expense-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, operation, *args):
+        """Queue `operation(cursor, *args)` and return a Future of its result.
+
+        The operation must not commit. It runs inside a savepoint, so if it
+        raises, only its own changes are rolled back and the exception is
+        set on its Future. The Future resolves once the batch has committed.
+        """
+        future = Future()
+        self._queue.put((operation, args, future))
+        return future
+
+    def close(self):
+        """Commit everything still queued and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _next_batch(self):
+        """Block for one operation, then collect more until the window closes or the batch is full."""
+        first = self._queue.get()
+        if first is _STOP:
+            return None, True
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if batch:
+                self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        """Apply a batch of operations in one transaction with a savepoint around each."""
+        conn = self.db.conn
+        cursor = conn.cursor()
+        done = []
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            for operation, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                cursor.execute('SAVEPOINT write_op')
+                try:
+                    result = operation(cursor, *args)
+                except Exception as e:
+                    # The caller gets the error; the rest of the batch carries on
+                    cursor.execute('ROLLBACK TO write_op')
+                    cursor.execute('RELEASE write_op')
+                    future.set_exception(e)
+                    continue
+                cursor.execute('RELEASE write_op')
+                done.append((future, result))
+            conn.commit()
+        except sqlite3.Error as e:
+            # The whole transaction is lost, so every operation not yet answered fails with it
+            conn.rollback()
+            for _, _, future in batch:
+                if not future.done():
+                    if future.running() or future.set_running_or_notify_cancel():
+                        future.set_exception(e)
+            return
+
+        if done:
+            self.db.bump_data_version()
+        for future, result in done:
+            future.set_result(result)